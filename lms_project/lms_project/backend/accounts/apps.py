@@ -3,3 +3,55 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core.signals import request_started
+
+        from . import signals  # noqa: F401
+
+        if getattr(settings, 'SWEEPER_ENABLED', True):
+            request_started.connect(_start_sweeper, dispatch_uid='accounts.start_sweeper')
+        if getattr(settings, 'PROGRESS_RECOMPUTE_ENABLED', True):
+            request_started.connect(_start_progress_job, dispatch_uid='accounts.start_progress_job')
+        if getattr(settings, 'BLOB_GC_ENABLED', True):
+            request_started.connect(_start_blob_gc, dispatch_uid='accounts.start_blob_gc')
+        if getattr(settings, 'SUBMISSION_INGEST_ENABLED', True):
+            request_started.connect(_start_ingestion, dispatch_uid='accounts.start_ingestion')
+
+
+def _start_sweeper(**kwargs):
+    # Started from the first request so management commands never spawn it
+    from django.core.signals import request_started
+
+    from .sweeper import sweeper
+
+    request_started.disconnect(dispatch_uid='accounts.start_sweeper')
+    sweeper.start()
+
+
+def _start_progress_job(**kwargs):
+    from django.core.signals import request_started
+
+    from .progress import progress_job
+
+    request_started.disconnect(dispatch_uid='accounts.start_progress_job')
+    progress_job.start()
+
+
+def _start_blob_gc(**kwargs):
+    from django.core.signals import request_started
+
+    from .storage import blob_gc
+
+    request_started.disconnect(dispatch_uid='accounts.start_blob_gc')
+    blob_gc.start()
+
+
+def _start_ingestion(**kwargs):
+    from django.core.signals import request_started
+
+    from .ingestion import workers
+
+    request_started.disconnect(dispatch_uid='accounts.start_ingestion')
+    workers.start()
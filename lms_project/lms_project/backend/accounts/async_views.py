@@ -0,0 +1,143 @@
+"""
+Async login and signup endpoints for ASGI deployments.
+
+Served natively by ``backend.asgi``; under WSGI Django still runs them through
+``async_to_sync``. Password hashing is offloaded to the bounded pool in
+``accounts.hashing`` so the event loop keeps serving other requests during a
+login storm. These views mirror LoginView and SignupView and return the same
+payloads. Like LoginView they only support Django's ModelBackend.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.authtoken.models import Token
+
+from .authentication import issue_login
+from .hashing import HashingBusy, run_hashing, schedule_rehash, verify_password
+from .models import Profile
+
+
+def _request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+def _busy_response():
+    response = JsonResponse(
+        {"error": "Too many requests in progress, please retry"}, status=503
+    )
+    response['Retry-After'] = '1'
+    return response
+
+
+def _login_candidate(username):
+    return User.objects.select_related('profile').filter(username=username).first()
+
+
+def _login_payload(request, user):
+    token, claims = issue_login(request, user)
+    return {
+        "token": token.key,
+        "username": user.username,
+        "role": claims.role,
+        "session_id": request.session.session_key,
+        "message": "Login successful"
+    }
+
+
+@csrf_exempt
+@require_POST
+async def login_async(request):
+    """Async variant of LoginView"""
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    username = data.get("username")
+    password = data.get("password")
+    if not username:
+        return JsonResponse({"error": "Username is required"}, status=400)
+    if not password:
+        return JsonResponse({"error": "Password is required"}, status=400)
+
+    user = await sync_to_async(_login_candidate)(username)
+    encoded = user.password if user else None
+    try:
+        is_valid, must_update = await run_hashing(verify_password, password, encoded)
+    except HashingBusy:
+        return _busy_response()
+
+    if not is_valid or not user.is_active:
+        return JsonResponse({"error": "Invalid credentials"}, status=401)
+
+    # Upgrade legacy hashes after responding rather than on the request path
+    if must_update:
+        schedule_rehash(user.pk, encoded, password)
+
+    payload = await sync_to_async(_login_payload)(request, user)
+    return JsonResponse(payload)
+
+
+def _signup_conflict(username, email):
+    if User.objects.filter(username=username).exists():
+        return "Username already exists"
+    if User.objects.filter(email=email).exists():
+        return "Email already registered"
+    return None
+
+
+def _create_student(username, email, encoded):
+    user = User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(email),
+        password=encoded,
+    )
+    user.save()
+    # default role = student
+    Profile.objects.create(user=user, role="student")
+    token, _ = Token.objects.get_or_create(user=user)
+    return token
+
+
+@csrf_exempt
+@require_POST
+async def signup_async(request):
+    """Async variant of SignupView"""
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    username = data.get("username")
+    email = data.get("email")
+    password = data.get("password")
+    if not username:
+        return JsonResponse({"error": "Username is required"}, status=400)
+    if not email:
+        return JsonResponse({"error": "Email is required"}, status=400)
+    if not password:
+        return JsonResponse({"error": "Password is required"}, status=400)
+
+    conflict = await sync_to_async(_signup_conflict)(username, email)
+    if conflict:
+        return JsonResponse({"error": conflict}, status=400)
+
+    try:
+        encoded = await run_hashing(make_password, password)
+    except HashingBusy:
+        return _busy_response()
+
+    try:
+        token = await sync_to_async(_create_student)(username, email, encoded)
+    except Exception as e:
+        return JsonResponse({"error": f"Error creating user: {str(e)}"}, status=400)
+    return JsonResponse({"token": token.key, "role": "student"}, status=201)
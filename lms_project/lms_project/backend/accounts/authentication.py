@@ -0,0 +1,305 @@
+"""
+Request authentication for the LMS API.
+
+Token lookups are served from an in-process LRU cache so that polling
+dashboards do not hit ``authtoken_token`` and ``accounts_profile`` on every
+request. The cache only stores claims (user id, role, active flag); the full
+User row is loaded lazily by the views that actually need it.
+
+LoginView stores the same claims in the session, so permission checks for
+both token and session callers read ``request.auth`` without a query. Role
+and active-flag changes bump a per-user claims epoch in the shared session
+cache; claims carrying an older epoch are re-resolved from the database.
+
+Tokens expire ``AUTH_TOKEN_TTL`` seconds after they were issued or last
+renewed. Renewal slides ``Token.created`` forward, but at most once every
+``AUTH_TOKEN_RENEW_AFTER`` seconds so active clients do not write per request.
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import Profile
+from .sweeper import token_ttl
+
+AuthClaims = namedtuple(
+    'AuthClaims', ['key', 'user_id', 'role', 'is_active', 'epoch', 'issued_at']
+)
+
+CLAIMS_EPOCH_PREFIX = 'accounts.claims_epoch.'
+
+
+class TokenCache:
+    """Thread-safe LRU cache with a TTL, mapping token keys to AuthClaims"""
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, expires_at = entry
+            if expires_at <= now:
+                self._discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def set(self, claims):
+        with self._lock:
+            self._discard(claims.key)
+            self._entries[claims.key] = (claims, time.monotonic() + self.ttl)
+            self._keys_by_user.setdefault(claims.user_id, set()).add(claims.key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[0].user_id
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+token_cache = TokenCache(
+    max_entries=getattr(settings, 'AUTH_TOKEN_CACHE_MAX_ENTRIES', 10000),
+    ttl=getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300),
+)
+
+
+def _epoch_cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def claims_epoch(user_id):
+    """Return the current claims epoch for ``user_id``"""
+    return _epoch_cache().get(CLAIMS_EPOCH_PREFIX + str(user_id), 0)
+
+
+def bump_claims_epoch(user_id):
+    """Mark every outstanding claim for ``user_id`` as stale"""
+    cache = _epoch_cache()
+    key = CLAIMS_EPOCH_PREFIX + str(user_id)
+    cache.add(key, 0, None)
+    cache.incr(key)
+
+
+def token_expired(issued_at, now=None):
+    return (now or timezone.now()) - issued_at > token_ttl()
+
+
+def claims_for_user(key, user, epoch=None, issued_at=None):
+    """Build the claims for ``user``, defaulting to the student role"""
+    try:
+        role = user.profile.role
+    except Profile.DoesNotExist:
+        role = 'student'
+    if epoch is None:
+        epoch = claims_epoch(user.id)
+    return AuthClaims(
+        key=key, user_id=user.id, role=role, is_active=user.is_active,
+        epoch=epoch, issued_at=issued_at,
+    )
+
+
+def establish_session(request, user, claims):
+    """Store the login claims in the session so later requests skip the DB"""
+    request.session['user_id'] = user.id
+    request.session['username'] = user.username
+    request.session['role'] = claims.role
+    request.session['is_active'] = claims.is_active
+    request.session['claims_epoch'] = claims.epoch
+    request.session['is_authenticated'] = True
+
+
+def issue_login(request, user):
+    """Ensure ``user`` has a profile and token, then cache and store its claims"""
+    if not hasattr(user, 'profile'):
+        Profile.objects.create(user=user, role="student")
+
+    token, created = Token.objects.get_or_create(user=user)
+    if not created and token_expired(token.created):
+        token.delete()
+        token = Token.objects.create(user=user)
+
+    # Resolve role and active flag once; later requests read these claims
+    claims = claims_for_user(token.key, user, issued_at=token.created)
+    token_cache.set(claims)
+
+    # Create session for web authentication and save it to get a session key
+    establish_session(request, user, claims)
+    request.session.save()
+    return token, claims
+
+
+def request_role(request):
+    """Role of the caller from its claims, falling back to the Profile row"""
+    if isinstance(request.auth, AuthClaims):
+        return request.auth.role
+    try:
+        return request.user.profile.role
+    except Profile.DoesNotExist:
+        return 'student'
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    Stand-in for ``request.user`` built from cached claims.
+
+    ``id``, ``pk``, ``is_active`` and ``is_authenticated`` are answered from
+    the claims; any other attribute loads the full User row on first access.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, claims):
+        super().__init__(
+            lambda: User.objects.select_related('profile').get(pk=claims.user_id)
+        )
+        self.__dict__['claims'] = claims
+
+    @property
+    def id(self):
+        return self.__dict__['claims'].user_id
+
+    @property
+    def pk(self):
+        return self.__dict__['claims'].user_id
+
+    @property
+    def is_active(self):
+        return self.__dict__['claims'].is_active
+
+    def __bool__(self):
+        # IsAuthenticated tests ``request.user`` for truth first
+        return True
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    ``Authorization: Token <key>`` authentication backed by ``token_cache``.
+
+    On a cache hit no query is issued; ``request.auth`` is the AuthClaims
+    tuple rather than the Token instance.
+    """
+
+    def authenticate_credentials(self, key):
+        now = timezone.now()
+        claims = token_cache.get(key)
+        if claims is not None and (
+            claims.epoch != claims_epoch(claims.user_id)
+            or token_expired(claims.issued_at, now)
+        ):
+            # Stale or apparently expired: re-check against the database,
+            # another process may have renewed the token meanwhile
+            claims = None
+        if claims is None:
+            try:
+                token = Token.objects.select_related('user__profile').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            if token_expired(token.created, now):
+                token.delete()
+                raise exceptions.AuthenticationFailed('Token has expired.')
+            claims = claims_for_user(key, token.user, issued_at=token.created)
+            token_cache.set(claims)
+
+        if not claims.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        renew_after = timedelta(seconds=getattr(settings, 'AUTH_TOKEN_RENEW_AFTER', 3600))
+        if now - claims.issued_at > renew_after:
+            Token.objects.filter(key=key).update(created=now)
+            claims = claims._replace(issued_at=now)
+            token_cache.set(claims)
+
+        return (ClaimsUser(claims), claims)
+
+
+class SessionClaimsAuthentication(BaseAuthentication):
+    """
+    Authenticate from the claims LoginView stored in the session.
+
+    Like the session checks it replaces, this does not enforce CSRF; clients
+    relying on cookies should keep sending the X-CSRFToken header.
+    """
+
+    def authenticate(self, request):
+        session = request._request.session
+        if not session.get('is_authenticated') or not session.get('user_id'):
+            return None
+
+        user_id = session['user_id']
+        epoch = claims_epoch(user_id)
+        if session.get('claims_epoch') == epoch:
+            claims = AuthClaims(
+                key=None,
+                user_id=user_id,
+                role=session.get('role'),
+                is_active=session.get('is_active', True),
+                epoch=epoch,
+                issued_at=None,
+            )
+        else:
+            # Role or active flag changed since login: re-resolve once
+            user = User.objects.select_related('profile').filter(pk=user_id).first()
+            if user is None:
+                session.flush()
+                return None
+            claims = claims_for_user(None, user, epoch)
+            establish_session(request, user, claims)
+
+        if not claims.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        return (ClaimsUser(claims), claims)
@@ -0,0 +1,291 @@
+"""
+In-memory prefix index for course title and category type-ahead.
+
+Every course contributes a few normalized keys: its title from each word
+onwards ("machine learning basics", "learning basics", "basics") and its
+category. Keys sit in one sorted list with a parallel array of course ids,
+so the courses matching a prefix are a contiguous range found with two
+bisects. Ranges bigger than ``SCAN_THRESHOLD`` also get a precomputed
+top-k list (by enrollment count), which is what keeps one- and
+two-letter prefixes as cheap as long ones. Together the sorted keys and
+these top-k lists play the role of a trie, at a fraction of the memory of
+per-node dicts.
+
+The index is built from the database on first use and kept up to date by
+Course and Enrollment signals in this process. Other worker processes
+only see those changes when they rebuild in the background, every
+``AUTOCOMPLETE_REFRESH_INTERVAL`` seconds. At most
+``AUTOCOMPLETE_MAX_COURSES`` courses are held, the most popular first.
+"""
+
+import bisect
+import heapq
+import logging
+import re
+import sys
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Q
+
+logger = logging.getLogger(__name__)
+
+KEY_MAX_LENGTH = 48
+SCAN_THRESHOLD = 256
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    return ' '.join(_WORD_RE.findall((text or '').lower()))[:KEY_MAX_LENGTH]
+
+
+def course_keys(title, category):
+    """The index keys for a course, deduplicated"""
+    words = _WORD_RE.findall((title or '').lower())
+    keys = {' '.join(words[i:])[:KEY_MAX_LENGTH] for i in range(len(words))}
+    if category:
+        keys.add(normalize(category))
+    keys.discard('')
+    return sorted(keys)
+
+
+def load_courses(limit):
+    """``(id, title, category, enrollments)`` rows, most enrolled first"""
+    from .models import Course
+
+    # Dropped, completed and suspended rows do not count
+    return list(
+        Course.objects.annotate(enrollments=Count('enrollment', filter=Q(enrollment__status='enrolled')))
+        .order_by('-enrollments', 'id')
+        .values_list('id', 'title', 'category', 'enrollments')[:limit]
+    )
+
+
+class PrefixIndex:
+    """Sorted-key prefix index with cached top-k lists for large ranges"""
+
+    def __init__(self, top_k=10, max_courses=200000):
+        self.top_k = top_k
+        self.max_courses = max_courses
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._keys = []            # sorted normalized keys
+        self._ids = array('q')     # course id of each key
+        self._courses = {}         # id -> (title, category, enrollments)
+        self._top = {}             # prefix -> best ids, or None when stale
+        self._key_bytes = 0
+        self.built_at = None
+
+    # ----- building -----
+
+    def build(self, rows):
+        """Replace the index contents with ``(id, title, category, enrollments)`` rows"""
+        courses, entries = {}, []
+        for course_id, title, category, enrollments in rows:
+            if len(courses) >= self.max_courses:
+                break
+            courses[course_id] = (title, category or '', enrollments)
+            entries.extend((key, course_id) for key in course_keys(title, category))
+        entries.sort()
+
+        keys = [key for key, _ in entries]
+        ids = array('q', (course_id for _, course_id in entries))
+        top = self._compute_top(keys, ids, courses)
+
+        with self._lock:
+            self._keys, self._ids, self._courses, self._top = keys, ids, courses, top
+            self._key_bytes = sum(sys.getsizeof(key) for key in keys)
+            self.built_at = time.monotonic()
+
+    def _compute_top(self, keys, ids, courses):
+        # Split each large range by the next character. The top-k of a range
+        # is the top-k of its large children's lists plus its small
+        # children's ids, so every id is scanned once whatever the depth.
+        top = {}
+
+        def visit(lo, hi, depth):
+            candidates = set()
+            start = lo
+            while start < hi:
+                prefix = keys[start][:depth]
+                end = bisect.bisect_right(keys, prefix + '\uffff', start, hi)
+                if end - start > SCAN_THRESHOLD and len(prefix) == depth and depth < KEY_MAX_LENGTH:
+                    top[prefix] = visit(start, end, depth + 1)
+                    candidates.update(top[prefix])
+                else:
+                    candidates.update(ids[start:end])
+                start = end
+            return self._best(candidates, courses)
+
+        visit(0, len(keys), 1)
+        return top
+
+    def _best(self, candidates, courses=None):
+        courses = self._courses if courses is None else courses
+        return heapq.nlargest(
+            self.top_k, candidates, key=lambda course_id: (courses[course_id][2], -course_id)
+        )
+
+    def _rank_key(self, course_id):
+        # Most enrollments first, older courses win ties
+        return (self._courses[course_id][2], -course_id)
+
+    # ----- lookups -----
+
+    def lookup(self, prefix, limit=None):
+        """Top courses whose title or category has a word starting with ``prefix``"""
+        prefix = normalize(prefix)
+        limit = min(limit or self.top_k, self.top_k)
+        if not prefix:
+            return []
+        with self._lock:
+            best = self._top.get(prefix)
+            if best is None:
+                lo, hi = self._range(prefix)
+                best = self._best(set(self._ids[lo:hi]))
+                if prefix in self._top or hi - lo > SCAN_THRESHOLD:
+                    self._top[prefix] = best
+            return [self._result(course_id) for course_id in best[:limit]]
+
+    def _range(self, prefix):
+        lo = bisect.bisect_left(self._keys, prefix)
+        return lo, bisect.bisect_right(self._keys, prefix + '\uffff', lo)
+
+    def _result(self, course_id):
+        title, category, enrollments = self._courses[course_id]
+        return {'id': course_id, 'title': title, 'category': category, 'enrollments': enrollments}
+
+    # ----- incremental updates -----
+
+    def update_course(self, course_id, title, category):
+        """Add or re-key a course after it was saved"""
+        with self._lock:
+            if self.built_at is None:
+                return
+            previous = self._courses.get(course_id)
+            if previous is None and len(self._courses) >= self.max_courses:
+                return
+            if previous is not None:
+                if previous[:2] == (title, category or ''):
+                    return
+                self._remove_keys(course_id, course_keys(previous[0], previous[1]))
+            enrollments = previous[2] if previous else 0
+            self._courses[course_id] = (title, category or '', enrollments)
+            keys = course_keys(title, category)
+            for key in keys:
+                index = bisect.bisect_right(self._keys, key)
+                self._keys.insert(index, key)
+                self._ids.insert(index, course_id)
+                self._key_bytes += sys.getsizeof(key)
+            self._rerank(course_id, keys, improved=True)
+
+    def remove_course(self, course_id):
+        with self._lock:
+            previous = self._courses.pop(course_id, None)
+            if previous is not None:
+                self._remove_keys(course_id, course_keys(previous[0], previous[1]))
+
+    def adjust_enrollments(self, course_id, delta):
+        with self._lock:
+            previous = self._courses.get(course_id)
+            if previous is None:
+                return
+            title, category, enrollments = previous
+            self._courses[course_id] = (title, category, max(0, enrollments + delta))
+            self._rerank(course_id, course_keys(title, category), improved=delta > 0)
+
+    def _remove_keys(self, course_id, keys):
+        for key in keys:
+            lo, hi = bisect.bisect_left(self._keys, key), bisect.bisect_right(self._keys, key)
+            for index in range(lo, hi):
+                if self._ids[index] == course_id:
+                    del self._keys[index]
+                    del self._ids[index]
+                    self._key_bytes -= sys.getsizeof(key)
+                    break
+        self._rerank(course_id, keys, improved=False)
+
+    def _rerank(self, course_id, keys, improved):
+        prefixes = {key[:depth] for key in keys for depth in range(1, len(key) + 1)}
+        for prefix in prefixes:
+            best = self._top.get(prefix)
+            if best is None:
+                continue
+            if not improved:
+                # A course dropped or lost enrollments: recompute on next lookup
+                if course_id in best:
+                    self._top[prefix] = None
+            elif course_id in best or len(best) < self.top_k or (
+                self._rank_key(course_id) > self._rank_key(best[-1])
+            ):
+                self._top[prefix] = self._best(set(best) | {course_id})
+
+    # ----- reporting -----
+
+    def stats(self):
+        with self._lock:
+            approx_bytes = (
+                self._key_bytes
+                + sys.getsizeof(self._keys)
+                + self._ids.itemsize * len(self._ids)
+                + sys.getsizeof(self._courses)
+                + sum(sys.getsizeof(title) + sys.getsizeof(category)
+                      for title, category, _ in self._courses.values())
+                + sys.getsizeof(self._top)
+                + sum(8 * len(best) + 56 for best in self._top.values() if best)
+            )
+            return {
+                'built': self.built_at is not None,
+                'courses': len(self._courses),
+                'keys': len(self._keys),
+                'cached_prefixes': len(self._top),
+                'approx_bytes': approx_bytes,
+                'age_seconds': (
+                    round(time.monotonic() - self.built_at) if self.built_at is not None else None
+                ),
+            }
+
+
+class CourseAutocomplete(PrefixIndex):
+    """The process-wide index, loaded lazily and refreshed in the background"""
+
+    def __init__(self):
+        super().__init__(
+            top_k=getattr(settings, 'AUTOCOMPLETE_TOP_K', 10),
+            max_courses=getattr(settings, 'AUTOCOMPLETE_MAX_COURSES', 200000),
+        )
+        self._build_lock = threading.Lock()
+        self._refreshing = False
+
+    def lookup(self, prefix, limit=None):
+        self._ensure_fresh()
+        return super().lookup(prefix, limit)
+
+    def _ensure_fresh(self):
+        if self.built_at is None:
+            with self._build_lock:
+                if self.built_at is None:
+                    self.build(load_courses(self.max_courses))
+            return
+        interval = getattr(settings, 'AUTOCOMPLETE_REFRESH_INTERVAL', 600)
+        if interval and time.monotonic() - self.built_at > interval and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh, name='autocomplete-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            self.build(load_courses(self.max_courses))
+        except Exception:
+            logger.exception("Autocomplete index refresh failed")
+        finally:
+            self._refreshing = False
+            close_old_connections()
+
+
+course_autocomplete = CourseAutocomplete()
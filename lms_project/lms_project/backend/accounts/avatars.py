@@ -0,0 +1,256 @@
+"""
+Profile picture processing.
+
+An upload is only sniffed on the request thread (size, format and pixel
+count from the image header). It is then copied to a temporary file and
+handed to a small bounded thread pool. Pillow releases the GIL while it
+decodes, resizes and encodes. The pool decodes the image, applies the
+EXIF orientation and crops it to a square. It then writes every size in
+``AVATAR_SIZES`` as WebP and JPEG, with EXIF, ICC and other metadata
+dropped.
+
+Variants are stored at ``avatars/<user id>/<key>/<size>.<webp|jpg>``. A new
+upload gets a new key, so URLs never change content and can be cached
+forever. ``Profile.avatar_key`` names the current set, and
+``avatar_urls`` builds the URLs from it without touching storage. Endpoints
+that list many users therefore serve 32 or 64 px files rather than the
+original upload. ``Profile.profile_picture`` points at the largest JPEG for
+older clients.
+"""
+
+import io
+import logging
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+class AvatarError(ValueError):
+    """The upload is not an image we accept"""
+
+
+class AvatarBusy(Exception):
+    """Raised when the processing pool is at its admission limit"""
+
+
+def avatar_sizes():
+    return tuple(sorted(getattr(settings, 'AVATAR_SIZES', (32, 64, 256))))
+
+
+def variant_name(user_id, key, size, fmt):
+    return f'avatars/{user_id}/{key}/{size}.{EXTENSIONS[fmt]}'
+
+
+def snap_size(requested):
+    """The smallest configured size at least ``requested`` px (or the largest)"""
+    sizes = avatar_sizes()
+    return next((size for size in sizes if size >= requested), sizes[-1])
+
+
+def requested_avatar_size(request, default):
+    try:
+        return snap_size(int(request.query_params.get('avatar_size', default)))
+    except (TypeError, ValueError):
+        return snap_size(default)
+
+
+def avatar_urls(user_id, key, size):
+    """``{'size', 'webp', 'jpeg'}`` URLs of one variant, or None without a picture"""
+    if not key:
+        return None
+    size = snap_size(size)
+    return {
+        'size': size,
+        'webp': default_storage.url(variant_name(user_id, key, size, 'webp')),
+        'jpeg': default_storage.url(variant_name(user_id, key, size, 'jpeg')),
+    }
+
+
+def user_avatar(user, size):
+    """``avatar_urls`` for a User loaded with ``select_related('profile')``"""
+    profile = getattr(user, 'profile', None)
+    return avatar_urls(user.id, profile.avatar_key, size) if profile is not None else None
+
+
+def _check_header(image):
+    if image.format not in ALLOWED_FORMATS:
+        raise AvatarError("Profile pictures must be JPEG, PNG, WebP or GIF images")
+    width, height = image.size
+    if width * height > getattr(settings, 'AVATAR_MAX_PIXELS', 40_000_000):
+        raise AvatarError("Image dimensions are too large")
+
+
+def render_variants(path):
+    """Decode the image at ``path`` and return ``{(size, fmt): bytes}``"""
+    sizes = avatar_sizes()
+    largest = sizes[-1]
+    try:
+        with Image.open(path) as image:
+            _check_header(image)
+            # JPEGs can be decoded at a fraction of their size directly
+            image.draft('RGB', (largest, largest))
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+            base = ImageOps.fit(
+                image.convert('RGBA' if has_alpha else 'RGB'), (largest, largest),
+                Image.Resampling.LANCZOS,
+            )
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise AvatarError("The file is not a readable image") from e
+
+    variants = {}
+    for size in reversed(sizes):
+        scaled = base if size == largest else base.resize((size, size), Image.Resampling.LANCZOS)
+        # Nothing from the upload (EXIF, ICC, comments) is carried over
+        scaled.info = {}
+        webp = io.BytesIO()
+        scaled.save(webp, 'WEBP', quality=getattr(settings, 'AVATAR_WEBP_QUALITY', 80), method=4)
+        variants[size, 'webp'] = webp.getvalue()
+
+        flat = scaled
+        if has_alpha:
+            flat = Image.new('RGB', scaled.size, (255, 255, 255))
+            flat.paste(scaled, mask=scaled.getchannel('A'))
+        jpeg = io.BytesIO()
+        flat.save(jpeg, 'JPEG', quality=getattr(settings, 'AVATAR_JPEG_QUALITY', 85),
+                  optimize=True, progressive=True)
+        variants[size, 'jpeg'] = jpeg.getvalue()
+    return variants
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'AVATAR_WORKERS', 2),
+                thread_name_prefix='avatar',
+            )
+        return _executor
+
+
+def _queue_full():
+    with _pending_lock:
+        return _pending >= getattr(settings, 'AVATAR_MAX_PENDING', 16)
+
+
+def _submit(profile_pk, user_id, key, path):
+    global _pending
+    with _pending_lock:
+        _pending += 1
+    future = _get_executor().submit(_process, profile_pk, user_id, key, path)
+    future.add_done_callback(lambda _: _release_slot())
+
+
+def _release_slot():
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def _incoming_dir():
+    path = Path(settings.MEDIA_ROOT) / '.avatars'
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def accept_avatar(profile, upload):
+    """
+    Queue ``upload`` (a File, or a path) as the new picture of ``profile``.
+    Raises AvatarError for files that are not acceptable images and
+    AvatarBusy when the pool is saturated.
+    """
+    max_size = getattr(settings, 'AVATAR_MAX_UPLOAD_SIZE', 10 * 1024 ** 2)
+    size = os.path.getsize(upload) if isinstance(upload, (str, Path)) else upload.size
+    if size > max_size:
+        raise AvatarError(f"Profile pictures may be at most {max_size} bytes")
+    try:
+        # Only reads the header; the pool does the decoding
+        with Image.open(upload) as image:
+            _check_header(image)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise AvatarError("The file is not a readable image") from e
+    if _queue_full():
+        raise AvatarBusy()
+
+    key = uuid.uuid4().hex
+    path = _incoming_dir() / key
+    if isinstance(upload, (str, Path)):
+        shutil.move(upload, path)
+    else:
+        upload.seek(0)
+        with open(path, 'wb') as copy:
+            for chunk in upload.chunks():
+                copy.write(chunk)
+
+    Profile.objects.filter(pk=profile.pk).update(avatar_pending_key=key, avatar_status='processing')
+    profile.avatar_pending_key, profile.avatar_status = key, 'processing'
+    # Start once the pending key is visible to the worker's connection
+    transaction.on_commit(lambda: _submit(profile.pk, profile.user_id, key, path))
+    return key
+
+
+def _process(profile_pk, user_id, key, path):
+    stored = []
+    try:
+        for (size, fmt), data in render_variants(path).items():
+            stored.append(default_storage.save(variant_name(user_id, key, size, fmt), ContentFile(data)))
+        previous = Profile.objects.filter(pk=profile_pk).values('avatar_key', 'profile_picture').first()
+        # A newer upload may have replaced this one while it was processing
+        if previous is not None and Profile.objects.filter(pk=profile_pk, avatar_pending_key=key).update(
+            avatar_key=key, avatar_pending_key='', avatar_status='ready',
+            profile_picture=variant_name(user_id, key, avatar_sizes()[-1], 'jpeg'),
+        ):
+            _delete_variants(user_id, previous['avatar_key'])
+            if previous['profile_picture'] and not previous['profile_picture'].startswith('avatars/'):
+                default_storage.delete(previous['profile_picture'])
+        else:
+            _delete_variants(user_id, key)
+    except AvatarError as e:
+        logger.info("Rejected profile picture for user %s: %s", user_id, e)
+        Profile.objects.filter(pk=profile_pk, avatar_pending_key=key).update(
+            avatar_pending_key='', avatar_status='failed'
+        )
+    except Exception:
+        logger.exception("Profile picture processing failed for user %s", user_id)
+        for name in stored:
+            default_storage.delete(name)
+        Profile.objects.filter(pk=profile_pk, avatar_pending_key=key).update(
+            avatar_pending_key='', avatar_status='failed'
+        )
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        close_old_connections()
+
+
+def _delete_variants(user_id, key):
+    if not key:
+        return
+    for size in avatar_sizes():
+        for fmt in EXTENSIONS:
+            default_storage.delete(variant_name(user_id, key, size, fmt))
@@ -0,0 +1,54 @@
+"""
+Minimal in-process background scheduling.
+
+``PeriodicTask`` runs a function on a daemon thread every ``interval``
+seconds. Tasks are started lazily from the first request (see
+``AccountsConfig.ready``) so management commands never spawn threads. The
+test client sends requests too, so each task also has an ``*_ENABLED``
+setting, which is off under ``manage.py test``. Each worker process runs
+its own copy; tasks must be idempotent.
+"""
+
+import logging
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=f'periodic-{self.name}', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self):
+        try:
+            return self.func()
+        except Exception:
+            logger.exception("Periodic task %s failed", self.name)
+        finally:
+            close_old_connections()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
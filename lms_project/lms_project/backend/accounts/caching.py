@@ -0,0 +1,136 @@
+"""
+Versioned response cache for the course catalog and course reads.
+
+Each course has a version token in the ``RESPONSE_CACHE_ALIAS`` cache, and
+so does the catalog as a whole. Signals replace a token (after the
+transaction commits) whenever a Course, CourseModule, Lesson, lesson file,
+quiz, assignment or Enrollment changes. Rendered JSON bodies are cached under the current version, so a
+change simply makes readers miss and rebuild; nothing is deleted. A
+cache hit costs no database queries.
+
+Grades change far more often than course content, so they have a
+separate ``gradebook`` version per course. It is bumped when submissions
+are saved or graded, and only gradebook entries use it.
+
+Versions are fresh ``time_ns`` values rather than incremented counters, so
+concurrent bumps never collide and a version evicted from the cache can
+never come back with a value that still has stale bodies stored under it.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+KEY_PREFIX = "accounts.response"
+CATALOG = 'catalog'
+
+
+def _cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _version_key(scope):
+    return f"{KEY_PREFIX}.version.{scope}"
+
+
+def _version(scope):
+    cache = _cache()
+    version = cache.get(_version_key(scope))
+    if version is None:
+        version = time.time_ns()
+        # Another process may have initialised it first; use theirs
+        if not cache.add(_version_key(scope), version, None):
+            version = cache.get(_version_key(scope), version)
+    return version
+
+
+def course_version(course_id):
+    return _version(f"course.{course_id}")
+
+
+def gradebook_version(course_id):
+    return _version(f"gradebook.{course_id}")
+
+
+def catalog_version():
+    return _version(CATALOG)
+
+
+def _bump(scopes):
+    _cache().set_many({_version_key(scope): time.time_ns() for scope in scopes}, None)
+
+
+def bump_course_version(course_id, catalog=True):
+    """Invalidate cached responses for ``course_id`` (and the catalog) on commit"""
+    scopes = [f"course.{course_id}"] if course_id is not None else []
+    if catalog:
+        scopes.append(CATALOG)
+    if scopes:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def bump_gradebook_version(course_id):
+    """Invalidate cached gradebooks of ``course_id`` on commit"""
+    if course_id is not None:
+        transaction.on_commit(lambda: _bump([f"gradebook.{course_id}"]))
+
+
+def cached_value(name, version, build):
+    """``build()`` cached under ``name`` at ``version``, for data other than responses"""
+    cache = _cache()
+    key = f"{KEY_PREFIX}.value.{name}.{version}"
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 3600))
+    return value
+
+
+def request_cache_name(name, request):
+    """``name`` qualified by the query string, e.g. a catalog page's cursor"""
+    query = request.META.get('QUERY_STRING', '')
+    if not query:
+        return name
+    return f"{name}.{hashlib.blake2b(query.encode(), digest_size=8).hexdigest()}"
+
+
+def cached_json_response(request, name, version, build, private=False):
+    """
+    Serve ``name`` at ``version`` from the cache, building it on a miss.
+
+    ``build()`` returns ``(data, last_modified)`` or a Response; Responses
+    (errors) are passed through uncached. The cached body carries a strong
+    ETag and Last-Modified, and conditional requests are answered with 304.
+    Pass ``private=True`` for bodies that shared caches must not store.
+    """
+    cache = _cache()
+    key = f"{KEY_PREFIX}.{name}.{version}"
+    entry = cache.get(key)
+    if entry is None:
+        result = build()
+        if not isinstance(result, tuple):
+            return result
+        data, last_modified = result
+        body = JSONRenderer().render(data)
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        entry = (body, etag, timestamp)
+        cache.set(key, entry, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 3600))
+
+    body, etag, timestamp = entry
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    # Clients may keep the body but must revalidate before reusing it
+    response['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    return response
@@ -0,0 +1,154 @@
+"""
+Authorized file downloads with byte ranges and web-server offload.
+
+Views check access first and then call ``serve_file``. What happens next
+depends on ``FILE_DOWNLOAD_OFFLOAD``:
+
+- ``'x-accel'`` (nginx) or ``'x-sendfile'`` (Apache, lighttpd): the response
+  is only headers naming the file. The web server sends the bytes,
+  including ``Range`` requests, and the worker is free immediately.
+- ``None``: the file is sent by Django. Single ``Range`` requests get a
+  ``206``. Open-ended ranges (the common case for video seeking) are
+  passed as real files, so WSGI servers with ``wsgi.file_wrapper``
+  (gunicorn) can use ``os.sendfile`` rather than copying through Python.
+
+Either way ``If-None-Match``/``If-Modified-Since`` are answered with ``304``,
+``If-Match``/``If-Unmodified-Since`` with ``412`` and ``If-Range`` is honoured.
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class _BoundedFile:
+    """Read-only view of ``length`` bytes of an open file from its position"""
+
+    def __init__(self, handle, length):
+        self._handle = handle
+        self._remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._handle.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._handle.close()
+
+
+def parse_range(header, size):
+    """
+    Return the inclusive ``(start, end)`` of a single-range ``Range`` header,
+    or None to send the whole file (no header, or a form we do not serve
+    such as multiple ranges). Raises RangeNotSatisfiable.
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last ``last`` bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == int(mtime)
+
+
+def serve_file(request, field_file, filename=None, as_attachment=False):
+    """Respond with the stored ``field_file`` for an already authorized request"""
+    try:
+        path = field_file.path
+        stat = os.stat(path)
+    except (ValueError, NotImplementedError, OSError):
+        raise Http404("File not found")
+
+    filename = filename or os.path.basename(field_file.name)
+    size = stat.st_size
+    etag = '"%x-%x"' % (stat.st_mtime_ns, size)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        offload = getattr(settings, 'FILE_DOWNLOAD_OFFLOAD', None)
+        if offload:
+            response = _offload_response(offload, field_file.name, path)
+        else:
+            response = _file_response(request, path, size, etag, stat.st_mtime)
+        if disposition := content_disposition_header(as_attachment, filename):
+            response['Content-Disposition'] = disposition
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    # Access is checked per user, so shared caches must not keep it
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _offload_response(offload, name, path):
+    response = HttpResponse()
+    # Let the web server choose the type from the file it sends
+    del response['Content-Type']
+    if offload == 'x-accel':
+        prefix = getattr(settings, 'FILE_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(name.replace(os.sep, '/'))
+    elif offload == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        raise ValueError(f"Unknown FILE_DOWNLOAD_OFFLOAD {offload!r}")
+    return response
+
+
+def _file_response(request, path, size, etag, mtime):
+    byte_range = None
+    if request.method == 'GET' and _if_range_matches(request, etag, mtime):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    handle = open(path, 'rb')
+    if byte_range is None:
+        return FileResponse(handle, content_type=content_type)
+
+    start, end = byte_range
+    handle.seek(start)
+    length = end - start + 1
+    # Ranges that run to the end of the file stay sendfile-able
+    body = handle if end == size - 1 else _BoundedFile(handle, length)
+    response = FileResponse(body, status=206, content_type=content_type)
+    response['Content-Length'] = length
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,264 @@
+"""
+Enrollment with seat limits, plus bulk enrollment of a cohort.
+
+``enroll_student`` claims a seat with one conditional UPDATE of
+``Course.seats_taken`` (no COUNT, no SELECT ... FOR UPDATE) and inserts the
+enrollment in the same transaction. A duplicate click loses on the unique
+constraint, which rolls its seat claim back, and gets the existing row.
+A dropped enrollment is re-activated the same way, seat claim first.
+When a course with a waitlist is full, students are queued in
+``WaitlistEntry`` and promoted in FIFO order as seats free up.
+
+Bulk enrollment processes ids in chunks of ``BULK_ENROLL_CHUNK_SIZE``;
+each chunk costs a fixed handful of queries whatever its size (validate
+users, find existing enrollments, ``bulk_create(ignore_conflicts=True)``,
+count the rows really inserted, re-activate dropped ones, clear their
+waitlist entries, bump the seat counter) inside one transaction.
+``bulk_create`` and ``update`` skip model signals, so the response cache
+version and the autocomplete enrollment count are updated here, once per
+chunk.
+"""
+
+import csv
+import io
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from .autocomplete import course_autocomplete
+from .caching import bump_course_version
+from .models import Course, Enrollment, WaitlistEntry
+
+# Only the first few rejected ids are echoed back
+MAX_REPORTED_INVALID = 100
+
+
+class BulkEnrollError(ValueError):
+    """Raised when the request does not contain a usable list of users"""
+
+
+class CourseFull(Exception):
+    """Raised inside a transaction to give a claimed seat back"""
+
+
+def claim_seat(course_id):
+    """Take one seat if the course has room; True on success"""
+    return bool(
+        Course.objects.filter(pk=course_id)
+        .filter(Q(seat_capacity__isnull=True) | Q(seats_taken__lt=F('seat_capacity')))
+        .update(seats_taken=F('seats_taken') + 1)
+    )
+
+
+def release_seat(course_id):
+    """Give a seat back and offer it to the waitlist once committed"""
+    Course.objects.filter(pk=course_id, seats_taken__gt=0).update(seats_taken=F('seats_taken') - 1)
+    transaction.on_commit(lambda: promote_waitlist(course_id))
+
+
+def _activate_enrollment(course_id, user_id, dropped=True):
+    """
+    Insert the enrollment, or re-activate a dropped one, after ``claim_seat``.
+    Raises IntegrityError (rolling the claim back) if the student already
+    has an active row.
+    """
+    if dropped and Enrollment.objects.filter(
+        course_id=course_id, student_id=user_id, status='dropped'
+    ).update(status='enrolled'):
+        # update() sends no signals; the seat was counted by claim_seat
+        bump_course_version(course_id)
+        transaction.on_commit(lambda: course_autocomplete.adjust_enrollments(course_id, 1))
+        return Enrollment.objects.get(course_id=course_id, student_id=user_id)
+    return Enrollment.objects.create(course_id=course_id, student_id=user_id)
+
+
+def enroll_student(course_id, user_id):
+    """
+    Enroll ``user_id`` in ``course_id``.
+
+    Returns ``(outcome, row)``, where ``outcome`` is one of:
+    - ``'enrolled'`` with the new Enrollment
+    - ``'existing'`` with the Enrollment the student already had (unless dropped)
+    - ``'waitlisted'`` with the student's WaitlistEntry
+    - ``'full'`` with None
+
+    Raises Course.DoesNotExist for an unknown course.
+    """
+    existing = Enrollment.objects.filter(course_id=course_id, student_id=user_id).first()
+    if existing is not None and existing.status != 'dropped':
+        return 'existing', existing
+    try:
+        with transaction.atomic():
+            if not claim_seat(course_id):
+                raise CourseFull()
+            enrollment = _activate_enrollment(course_id, user_id, dropped=existing is not None)
+        return 'enrolled', enrollment
+    except IntegrityError:
+        # A concurrent request for the same student won; its row is the answer
+        return 'existing', Enrollment.objects.get(course_id=course_id, student_id=user_id)
+    except CourseFull:
+        pass
+
+    # Only a full or missing course gets here, so this lookup stays off the fast path
+    waitlist_enabled = (
+        Course.objects.filter(pk=course_id).values_list('waitlist_enabled', flat=True).first()
+    )
+    if waitlist_enabled is None:
+        raise Course.DoesNotExist()
+    if not waitlist_enabled:
+        return 'full', None
+    entry, _ = WaitlistEntry.objects.get_or_create(course_id=course_id, student_id=user_id)
+    return 'waitlisted', entry
+
+
+def waitlist_position(entry):
+    """1-based place of ``entry`` in its course's queue"""
+    return WaitlistEntry.objects.filter(course_id=entry.course_id, id__lte=entry.id).count()
+
+
+def promote_waitlist(course_id):
+    """Move students from the head of the waitlist into free seats"""
+    while True:
+        entry = WaitlistEntry.objects.filter(course_id=course_id).order_by('id').first()
+        if entry is None:
+            return
+        try:
+            with transaction.atomic():
+                if not WaitlistEntry.objects.filter(pk=entry.pk).delete()[0]:
+                    continue  # promoted by a concurrent call
+                if not claim_seat(course_id):
+                    raise CourseFull()
+                _activate_enrollment(course_id, entry.student_id)
+        except CourseFull:
+            return
+        except IntegrityError:
+            # Enrolled some other way meanwhile; just drop the queue entry
+            WaitlistEntry.objects.filter(pk=entry.pk).delete()
+
+
+def parse_enrollment_request(request):
+    """
+    Read user ids from a JSON ``user_ids`` list or a CSV ``file`` with a
+    ``user_id`` or ``username`` column. Usernames are resolved to ids with
+    one query. Returns ``(ids, invalid)``, where ``invalid`` holds the
+    entries that could not be read.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        values = request.data.get('user_ids')
+        if not isinstance(values, list):
+            raise BulkEnrollError("Provide user_ids as a list or upload a CSV file")
+        usernames = []
+    else:
+        try:
+            reader = csv.DictReader(io.StringIO(upload.read().decode('utf-8-sig')))
+        except UnicodeDecodeError:
+            raise BulkEnrollError("CSV file must be UTF-8 encoded")
+        fields = reader.fieldnames or []
+        if 'user_id' not in fields and 'username' not in fields:
+            raise BulkEnrollError("CSV header must include user_id or username")
+        rows = list(reader)
+        values = [row['user_id'] for row in rows if 'user_id' in fields and row.get('user_id')]
+        usernames = [
+            row['username'].strip() for row in rows
+            if 'username' in fields and row.get('username') and not row.get('user_id')
+        ]
+
+    max_rows = getattr(settings, 'BULK_ENROLL_MAX_ROWS', 20000)
+    if len(values) + len(usernames) > max_rows:
+        raise BulkEnrollError(f"At most {max_rows} users can be enrolled at once")
+
+    ids, invalid = [], []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            invalid.append(value)
+    if usernames:
+        found = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+        for username in usernames:
+            if username in found:
+                ids.append(found[username])
+            else:
+                invalid.append(username)
+    return ids, invalid
+
+
+def _count_inserted(course, rows):
+    """
+    How many of ``rows`` ``bulk_create(ignore_conflicts=True)`` really inserted.
+    Skipped rows report no error, but each inserted one carries the
+    ``enrolled_at`` it was given here, and a concurrent winner does not.
+    """
+    if not rows:
+        return 0
+    stamps = {row.student_id: row.enrolled_at for row in rows}
+    return sum(
+        stamps[student_id] == enrolled_at
+        for student_id, enrolled_at in Enrollment.objects.filter(
+            course=course, student_id__in=list(stamps)
+        ).values_list('student_id', 'enrolled_at')
+    )
+
+
+def bulk_enroll(course, user_ids, unreadable=(), chunk_size=None):
+    """
+    Enroll ``user_ids`` into ``course``.
+
+    Returns counts of ``created``, ``already_enrolled``, ``invalid`` (unknown
+    or inactive users, plus the ``unreadable`` entries from parsing) and
+    ``duplicates`` (ids repeated in the request), with up to
+    ``MAX_REPORTED_INVALID`` of the invalid entries.
+    """
+    chunk_size = chunk_size or getattr(settings, 'BULK_ENROLL_CHUNK_SIZE', 500)
+    unique_ids = list(dict.fromkeys(user_ids))
+    result = {
+        'created': 0,
+        'already_enrolled': 0,
+        'invalid': len(unreadable),
+        'duplicates': len(user_ids) - len(unique_ids),
+        'invalid_ids': list(unreadable)[:MAX_REPORTED_INVALID],
+    }
+
+    for start in range(0, len(unique_ids), chunk_size):
+        chunk = unique_ids[start:start + chunk_size]
+        with transaction.atomic():
+            valid = set(
+                User.objects.filter(id__in=chunk, is_active=True).values_list('id', flat=True)
+            )
+            existing = dict(
+                Enrollment.objects.filter(course=course, student_id__in=valid)
+                .values_list('student_id', 'status')
+            )
+            new_rows = [
+                Enrollment(student_id=user_id, course=course)
+                for user_id in chunk if user_id in valid and user_id not in existing
+            ]
+            # A concurrent enroll of the same student is skipped, not an error
+            Enrollment.objects.bulk_create(new_rows, ignore_conflicts=True)
+            created = _count_inserted(course, new_rows)
+            # Dropped students are enrolled again, like enroll_student does
+            dropped = [user_id for user_id, status in existing.items() if status == 'dropped']
+            if dropped:
+                created += Enrollment.objects.filter(
+                    course=course, student_id__in=dropped, status='dropped'
+                ).update(status='enrolled')
+            # Stale entries would make promote_waitlist fail on these students
+            WaitlistEntry.objects.filter(course=course, student_id__in=valid).delete()
+            if created:
+                # Staff enrollments may exceed seat_capacity but still take seats
+                Course.objects.filter(pk=course.pk).update(seats_taken=F('seats_taken') + created)
+                bump_course_version(course.pk)
+                transaction.on_commit(
+                    lambda created=created: course_autocomplete.adjust_enrollments(course.pk, created)
+                )
+
+        result['created'] += created
+        result['already_enrolled'] += len(valid) - created
+        rejected = [user_id for user_id in chunk if user_id not in valid]
+        result['invalid'] += len(rejected)
+        room = MAX_REPORTED_INVALID - len(result['invalid_ids'])
+        result['invalid_ids'].extend(rejected[:max(room, 0)])
+    return result
@@ -0,0 +1,178 @@
+"""
+Course gradebook: a student × assignment matrix of grades.
+
+``load_gradebook`` reads a course's enrolled (not dropped) students, its
+assignments in course order and the graded submissions, using three
+queries. The latest grade of each student on each assignment goes into a
+dense float64 NumPy matrix, with NaN where nothing is graded. The result
+is cached under the course and gradebook versions (see accounts.caching),
+so it is only rebuilt after the course, its enrollments or its grades
+change.
+
+All statistics work on whole columns at once:
+
+- count, mean, median and standard deviation;
+- the ``GRADEBOOK_PERCENTILES``;
+- a histogram of ``GRADEBOOK_HISTOGRAM_BINS`` equal bins from 0 to 100 %
+  of the maximum points.
+
+Final grades are weighted by ``max_points``. ``current`` counts only the
+graded assignments, while ``overall`` counts missing work as zero.
+"""
+
+import warnings
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+
+from .caching import cached_value, course_version, gradebook_version
+from .models import Assignment, AssignmentSubmission, Enrollment
+
+Gradebook = namedtuple('Gradebook', 'student_ids usernames assignment_ids titles max_points matrix')
+
+
+def current_version(course_id):
+    return f"{course_version(course_id)}.{gradebook_version(course_id)}"
+
+
+def _positions(ids, values):
+    """Index of each of ``values`` in the unsorted ``ids``, and whether it was found"""
+    order = np.argsort(ids, kind='stable')
+    found_at = order[np.minimum(np.searchsorted(ids, values, sorter=order), len(ids) - 1)]
+    return found_at, ids[found_at] == values
+
+
+def build_gradebook(course_id):
+    students = list(
+        Enrollment.objects.filter(course_id=course_id).exclude(status='dropped')
+        .order_by('student__username', 'student_id').values_list('student_id', 'student__username')
+    )
+    assignments = list(
+        Assignment.objects.filter(lesson__module__course_id=course_id)
+        .order_by('lesson__module__order', 'lesson__order', 'id').values_list('id', 'title', 'max_points')
+    )
+    student_ids = np.array([row[0] for row in students], dtype=np.int64)
+    assignment_ids = np.array([row[0] for row in assignments], dtype=np.int64)
+    max_points = np.array([row[2] for row in assignments], dtype=np.float64)
+    matrix = np.full((len(students), len(assignments)), np.nan)
+
+    if students and assignments:
+        # Newest first, so the first grade seen for a cell is the one kept
+        graded = np.array(list(
+            AssignmentSubmission.objects.filter(assignment_id__in=assignment_ids.tolist(), grade__isnull=False)
+            .order_by('-submitted_at', '-id').values_list('student_id', 'assignment_id', 'grade')
+        ), dtype=np.float64).reshape(-1, 3)
+        rows, known_student = _positions(student_ids, graded[:, 0].astype(np.int64))
+        cols, known_assignment = _positions(assignment_ids, graded[:, 1].astype(np.int64))
+        known = known_student & known_assignment
+        cells, first = np.unique(rows[known] * len(assignments) + cols[known], return_index=True)
+        matrix.flat[cells] = graded[known, 2][first]
+
+    return Gradebook(
+        student_ids, [row[1] for row in students],
+        assignment_ids, [row[1] for row in assignments], max_points, matrix,
+    )
+
+
+def load_gradebook(course_id):
+    """The cached ``Gradebook`` of ``course_id``"""
+    return cached_value(f'gradebook.{course_id}', current_version(course_id), lambda: build_gradebook(course_id))
+
+
+def _histograms(fractions, bins):
+    """Per-column counts of ``fractions`` (0-1, NaN skipped) in ``bins`` equal bins"""
+    columns = fractions.shape[1]
+    rows, cols = np.nonzero(~np.isnan(fractions))
+    # Full marks (and extra credit) go in the top bin
+    bucket = np.clip((fractions[rows, cols] * bins).astype(np.int64), 0, bins - 1)
+    return np.bincount(cols * bins + bucket, minlength=columns * bins).reshape(columns, bins)
+
+
+def column_stats(matrix, max_points):
+    """Statistics of every column of ``matrix``, as arrays with one entry per column"""
+    percentiles = getattr(settings, 'GRADEBOOK_PERCENTILES', (10, 25, 75, 90))
+    bins = getattr(settings, 'GRADEBOOK_HISTOGRAM_BINS', 10)
+    empty = np.full(matrix.shape[1], np.nan)
+    with warnings.catch_warnings():
+        # Columns nobody has been graded on are all NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        has_rows = matrix.shape[0] > 0
+        stats = {
+            'count': (~np.isnan(matrix)).sum(axis=0),
+            'mean': np.nanmean(matrix, axis=0) if has_rows else empty,
+            'median': np.nanmedian(matrix, axis=0) if has_rows else empty,
+            'std': np.nanstd(matrix, axis=0) if has_rows else empty,
+            'percentiles': (
+                np.nanpercentile(matrix, percentiles, axis=0) if has_rows
+                else np.full((len(percentiles), matrix.shape[1]), np.nan)
+            ),
+        }
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fractions = matrix / np.where(max_points > 0, max_points, np.nan)
+    stats['histogram'] = _histograms(fractions, bins)
+    return stats
+
+
+def final_grades(matrix, max_points):
+    """``(current, overall)`` percentages per student, weighted by max points"""
+    graded = ~np.isnan(matrix)
+    earned = np.where(graded, matrix, 0.0).sum(axis=1)
+    possible = graded @ max_points
+    with np.errstate(divide='ignore', invalid='ignore'):
+        current = np.where(possible > 0, 100 * earned / possible, np.nan)
+        overall = 100 * earned / max_points.sum() if max_points.sum() > 0 else np.full(len(earned), np.nan)
+    return current, overall
+
+
+def _json(values):
+    """Rounded floats with None for NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    return np.where(np.isnan(values), None, np.round(values, 2)).tolist()
+
+
+def _stats_json(stats, column):
+    percentiles = getattr(settings, 'GRADEBOOK_PERCENTILES', (10, 25, 75, 90))
+    return {
+        'count': int(stats['count'][column]),
+        'mean': _json(stats['mean'][column]),
+        'median': _json(stats['median'][column]),
+        'std': _json(stats['std'][column]),
+        'percentiles': dict(zip(
+            (f'p{p:g}' for p in percentiles), _json(stats['percentiles'][:, column])
+        )),
+        'histogram': stats['histogram'][column].tolist(),
+    }
+
+
+def gradebook_data(course_id):
+    """The gradebook of ``course_id`` with assignment and final-grade statistics"""
+    book = load_gradebook(course_id)
+    stats = column_stats(book.matrix, book.max_points)
+    current, overall = final_grades(book.matrix, book.max_points)
+    final_stats = column_stats(np.column_stack([current, overall]), np.array([100.0, 100.0]))
+    grades = _json(book.matrix)
+    current, overall = _json(current), _json(overall)
+    return {
+        'course_id': course_id,
+        'assignments': [
+            {
+                'id': int(assignment_id),
+                'title': title,
+                'max_points': int(points),
+                'stats': _stats_json(stats, column),
+            }
+            for column, (assignment_id, title, points)
+            in enumerate(zip(book.assignment_ids, book.titles, book.max_points))
+        ],
+        'students': [
+            {
+                'id': int(student_id),
+                'username': username,
+                'grades': grades[row],
+                'final': {'current': current[row], 'overall': overall[row]},
+            }
+            for row, (student_id, username) in enumerate(zip(book.student_ids, book.usernames))
+        ],
+        'final_stats': {'current': _stats_json(final_stats, 0), 'overall': _stats_json(final_stats, 1)},
+    }
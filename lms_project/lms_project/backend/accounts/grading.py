@@ -0,0 +1,121 @@
+"""
+Bulk grading of assignment submissions.
+
+A lecturer posts ``{submission_id: {"grade": ..., "feedback": ...}}`` for one
+assignment. Every entry is checked first: the submission must belong to
+the assignment and the grade must be a number between 0 and
+``Assignment.max_points``. If any entry is wrong nothing is applied, and
+the errors are returned per submission.
+
+Valid requests are applied in one transaction. Changed submissions are
+saved with one ``bulk_update`` and their ``grade_posted`` notifications with
+one ``bulk_create``. The number of queries does not grow with the number of
+grades, apart from the batching of very large requests. Entries identical
+to what is stored are skipped and nobody is notified about them.
+"""
+
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import bump_gradebook_version
+from .models import AssignmentSubmission, Notification
+
+GRADED_FIELDS = ['grade', 'feedback', 'status', 'graded_at', 'graded_by']
+
+
+class GradingError(ValueError):
+    """Raised when the request body is not a usable map of grades"""
+
+
+def parse_grades(data):
+    """
+    Read ``{submission_id: {grade, feedback}}`` from ``data`` (either the map
+    itself or under ``grades``). Returns ``({id: (grade, feedback)}, errors)``.
+    """
+    grades = data.get('grades', data) if hasattr(data, 'get') else None
+    if not isinstance(grades, dict) or not grades:
+        raise GradingError("Provide grades as a map of submission id to {grade, feedback}")
+    max_rows = getattr(settings, 'BULK_GRADE_MAX_ROWS', 5000)
+    if len(grades) > max_rows:
+        raise GradingError(f"At most {max_rows} submissions can be graded at once")
+
+    parsed, errors = {}, {}
+    for key, entry in grades.items():
+        try:
+            submission_id = int(key)
+        except (TypeError, ValueError):
+            errors[str(key)] = "Not a submission id"
+            continue
+        if not isinstance(entry, dict) or 'grade' not in entry:
+            errors[str(key)] = "Expected an object with a grade"
+            continue
+        grade, feedback = entry['grade'], entry.get('feedback')
+        if isinstance(grade, bool) or not isinstance(grade, (int, float)) or not math.isfinite(grade):
+            errors[str(key)] = "Grade must be a number"
+            continue
+        if feedback is not None and not isinstance(feedback, str):
+            errors[str(key)] = "Feedback must be text"
+            continue
+        parsed[submission_id] = (float(grade), feedback)
+    return parsed, errors
+
+
+def bulk_grade(assignment, grades, grader_id, errors=None):
+    """
+    Apply ``grades`` (from ``parse_grades``) to submissions of ``assignment``,
+    whose lesson, module and course must be loaded. Returns
+    ``(result, errors)``. ``errors`` is non-empty when nothing was applied.
+    """
+    errors = dict(errors or {})
+    submissions = {
+        submission.pk: submission
+        for submission in AssignmentSubmission.objects.filter(assignment=assignment, pk__in=list(grades))
+        .only('id', 'student_id', *GRADED_FIELDS)
+    }
+    for submission_id, (grade, _) in grades.items():
+        if submission_id not in submissions:
+            errors[str(submission_id)] = "No such submission for this assignment"
+        elif not 0 <= grade <= assignment.max_points:
+            errors[str(submission_id)] = f"Grade must be between 0 and {assignment.max_points}"
+    if errors:
+        return None, errors
+
+    now = timezone.now()
+    changed = []
+    for submission_id, (grade, feedback) in grades.items():
+        submission = submissions[submission_id]
+        if feedback is None:
+            feedback = submission.feedback
+        if submission.status == 'graded' and submission.grade == grade and submission.feedback == feedback:
+            continue
+        submission.grade, submission.feedback = grade, feedback
+        submission.status, submission.graded_at, submission.graded_by_id = 'graded', now, grader_id
+        changed.append(submission)
+
+    batch_size = getattr(settings, 'BULK_GRADE_BATCH_SIZE', 500)
+    course = assignment.lesson.module.course
+    with transaction.atomic():
+        AssignmentSubmission.objects.bulk_update(changed, GRADED_FIELDS, batch_size=batch_size)
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=submission.student_id,
+                title="Grade posted",
+                message=f"Your submission for '{assignment.title}' was graded: "
+                        f"{submission.grade:g}/{assignment.max_points}",
+                notification_type='grade_posted',
+                related_course=course,
+            )
+            for submission in changed
+        ], batch_size=batch_size)
+        if changed:
+            bump_gradebook_version(course.id)
+
+    return {
+        'assignment_id': assignment.id,
+        'graded': len(changed),
+        'unchanged': len(grades) - len(changed),
+        'notified': len(changed),
+    }, {}
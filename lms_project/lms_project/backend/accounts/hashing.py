@@ -0,0 +1,167 @@
+"""
+Bounded worker pool for password hashing.
+
+PBKDF2 spends tens of milliseconds of CPU per call. ``hashlib`` releases the
+GIL while it runs, so a small thread pool lets the async login and signup
+views hash without blocking the event loop. Admission is capped by
+``PASSWORD_HASH_MAX_PENDING``; once that many hashes are queued or running,
+callers get ``HashingBusy`` and should answer 503 instead of piling up.
+
+Bulk imports hash thousands of passwords at once and use a separate process
+pool (``hash_passwords``) so the work spreads over every core.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    check_password, get_hasher, identify_hasher, make_password
+)
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is at its admission limit"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PASSWORD_HASH_WORKERS', 4),
+                thread_name_prefix='password-hash',
+            )
+        return _executor
+
+
+_process_executor = None
+
+
+def _init_hash_process():
+    # Spawned workers start without Django configured
+    django.setup()
+
+
+def _process_workers():
+    return getattr(settings, 'PASSWORD_HASH_PROCESSES', None) or os.cpu_count() or 1
+
+
+def _get_process_executor():
+    global _process_executor
+    with _executor_lock:
+        if _process_executor is None:
+            _process_executor = ProcessPoolExecutor(
+                max_workers=_process_workers(),
+                initializer=_init_hash_process,
+            )
+        return _process_executor
+
+
+def _reset_process_executor():
+    global _process_executor
+    with _executor_lock:
+        _process_executor = None
+
+
+def hash_passwords(passwords):
+    """
+    Hash ``passwords`` with the default hasher on the process pool.
+
+    Returns the encoded hashes in input order. If the pool cannot be used
+    (e.g. a worker died) the batch is hashed in this process instead.
+    """
+    passwords = list(passwords)
+    if len(passwords) < 2:
+        return [make_password(p) for p in passwords]
+    executor = _get_process_executor()
+    chunksize = max(1, len(passwords) // (_process_workers() * 4))
+    try:
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+    except BrokenProcessPool:
+        logger.exception("Password hashing process pool failed, hashing inline")
+        _reset_process_executor()
+        return [make_password(p) for p in passwords]
+
+
+def _acquire_slot():
+    global _pending
+    with _pending_lock:
+        if _pending >= getattr(settings, 'PASSWORD_HASH_MAX_PENDING', 64):
+            return False
+        _pending += 1
+        return True
+
+
+def _release_slot():
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+async def run_hashing(func, *args):
+    """Run ``func(*args)`` on the hashing pool, or raise HashingBusy"""
+    if not _acquire_slot():
+        raise HashingBusy()
+    try:
+        return await asyncio.wrap_future(_get_executor().submit(func, *args))
+    finally:
+        _release_slot()
+
+
+def verify_password(password, encoded):
+    """
+    Check ``password`` against ``encoded``.
+
+    Returns ``(is_valid, must_update)``. When there is no stored hash the
+    default hasher still runs once, as ModelBackend does, so unknown usernames
+    take as long as wrong passwords.
+    """
+    if encoded is None:
+        make_password(password)
+        return False, False
+    if not check_password(password, encoded):
+        return False, False
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return True, False
+    preferred = get_hasher('default')
+    must_update = hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+    return True, must_update
+
+
+def _rehash(user_id, old_encoded, password):
+    try:
+        # Only replace the hash we verified, never a concurrently changed one
+        User.objects.filter(pk=user_id, password=old_encoded).update(
+            password=make_password(password)
+        )
+    except Exception:
+        logger.exception("Password rehash failed for user %s", user_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_rehash(user_id, old_encoded, password):
+    """Upgrade a legacy hash in the background; skipped when the pool is busy"""
+    if not _acquire_slot():
+        return
+    future = _get_executor().submit(_rehash, user_id, old_encoded, password)
+    future.add_done_callback(lambda _: _release_slot())
@@ -0,0 +1,313 @@
+"""
+Background ingestion of assignment submissions.
+
+Saving a new submission (or a new file or text on an existing one) inserts
+a ``SubmissionJob`` row in the same transaction, so work is never lost when
+a worker process restarts. After commit the local workers are woken up.
+
+Workers are ``SUBMISSION_INGEST_WORKERS`` daemon threads per process. Each
+claims the oldest due job with a conditional UPDATE, so several processes
+can share the table. It then runs these stages, recording the seconds each
+took on the job:
+
+- ``extract``: text from a PDF, DOCX or plain-text ``submission_file`` plus
+  ``submission_text``, stored in ``SubmissionText``.
+- ``count``: ``word_count``.
+- ``fingerprint``: SHA-256 of the normalized text.
+- ``screen``: flags an identical earlier submission by another student on
+  the same assignment in ``duplicate_of``.
+- ``index``: writes the text to the ``accounts_submission_fts`` full-text
+  table (SQLite). Deleting a submission removes its row again.
+
+A failed job is retried with exponential backoff up to
+``SUBMISSION_INGEST_MAX_ATTEMPTS`` times. A job whose worker died is
+re-queued once its lease (``SUBMISSION_INGEST_LEASE``) runs out. Clients
+poll ``submissions/<id>/processing/`` for ``processing_status``.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import AssignmentSubmission, SubmissionJob, SubmissionText
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'accounts_submission_fts'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_DOCX_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+_stats_lock = threading.Lock()
+_stats = {
+    'jobs_done': 0,
+    'jobs_failed': 0,
+    'jobs_retried': 0,
+    'stage_seconds': {},
+}
+
+
+class UnsupportedFile(Exception):
+    """The submitted file is of a type we cannot read"""
+
+
+def enqueue(submission):
+    """Queue ``submission`` for processing; call inside the saving transaction"""
+    if not SubmissionJob.objects.filter(submission_id=submission.pk, status='queued').exists():
+        SubmissionJob.objects.create(submission_id=submission.pk)
+    AssignmentSubmission.objects.filter(pk=submission.pk).update(processing_status='queued')
+    submission.processing_status = 'queued'
+    transaction.on_commit(workers.wake)
+
+
+def _extract_pdf(handle):
+    # pypdf is only needed by processes that run ingestion
+    from pypdf import PdfReader
+
+    return '\n'.join(page.extract_text() or '' for page in PdfReader(handle).pages)
+
+
+def _extract_docx(handle):
+    limit = getattr(settings, 'SUBMISSION_DOCX_MAX_XML_BYTES', 50 * 1024 ** 2)
+    with zipfile.ZipFile(handle) as archive:
+        # A tiny archive can inflate to gigabytes; never read past the limit
+        if archive.getinfo('word/document.xml').file_size > limit:
+            raise UnsupportedFile("The document is too large to extract")
+        with archive.open('word/document.xml') as member:
+            xml = member.read(limit + 1)
+        if len(xml) > limit:
+            raise UnsupportedFile("The document is too large to extract")
+        root = ElementTree.fromstring(xml)
+    return '\n'.join(
+        ''.join(node.text or '' for node in paragraph.iter(f'{_DOCX_NS}t'))
+        for paragraph in root.iter(f'{_DOCX_NS}p')
+    )
+
+
+def _extract_txt(handle):
+    return handle.read().decode('utf-8', errors='replace')
+
+
+EXTRACTORS = {
+    '.pdf': _extract_pdf,
+    '.docx': _extract_docx,
+    '.txt': _extract_txt,
+    '.md': _extract_txt,
+}
+
+
+def extract_text(submission):
+    """``submission_text`` followed by the text of ``submission_file``"""
+    parts = [submission.submission_text or '']
+    if submission.submission_file:
+        name = submission.submission_file.name.lower()
+        extractor = next((func for ext, func in EXTRACTORS.items() if name.endswith(ext)), None)
+        if extractor is None:
+            raise UnsupportedFile(f"Cannot extract text from {name.rsplit('/', 1)[-1]}")
+        with submission.submission_file.open('rb') as handle:
+            parts.append(extractor(handle))
+    text = '\n'.join(part.strip() for part in parts if part and part.strip())
+    return text[:getattr(settings, 'SUBMISSION_TEXT_MAX_CHARS', 1_000_000)]
+
+
+def fingerprint(text):
+    """SHA-256 of the lower-cased words, so spacing and punctuation do not matter"""
+    words = _WORD_RE.findall(text.lower())
+    return hashlib.sha256(' '.join(words).encode()).hexdigest() if words else ''
+
+
+def index_text(submission_id, text):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [submission_id])
+        if text:
+            cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)", [submission_id, text])
+
+
+def remove_text(submission_id):
+    index_text(submission_id, '')
+
+
+def process_submission(submission):
+    """Run every stage on ``submission``; returns ``{stage: seconds}``"""
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(stage):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = round(now - started, 6)
+        started = now
+
+    text = extract_text(submission)
+    lap('extract')
+    word_count = len(_WORD_RE.findall(text))
+    lap('count')
+    digest = fingerprint(text)
+    lap('fingerprint')
+    duplicate_of = None
+    if digest:
+        duplicate_of = (
+            AssignmentSubmission.objects.filter(assignment_id=submission.assignment_id, fingerprint=digest)
+            .exclude(student_id=submission.student_id).order_by('submitted_at', 'id')
+            .values_list('pk', flat=True).first()
+        )
+    lap('screen')
+    with transaction.atomic():
+        AssignmentSubmission.objects.filter(pk=submission.pk).update(
+            word_count=word_count, fingerprint=digest,
+            duplicate_of_id=duplicate_of, processing_status='processed',
+        )
+        SubmissionText.objects.update_or_create(submission_id=submission.pk, defaults={'text': text})
+        index_text(submission.pk, text)
+    lap('index')
+    return timings
+
+
+def _lease():
+    return timedelta(seconds=getattr(settings, 'SUBMISSION_INGEST_LEASE', 300))
+
+
+def requeue_expired():
+    """Put jobs back whose worker stopped before finishing them"""
+    return SubmissionJob.objects.filter(status='running', locked_at__lt=timezone.now() - _lease()).update(
+        status='queued', locked_at=None
+    )
+
+
+def claim_job():
+    """Claim the oldest due job, or return None"""
+    now = timezone.now()
+    for pk in (
+        SubmissionJob.objects.filter(status='queued', run_after__lte=now)
+        .order_by('run_after', 'pk').values_list('pk', flat=True)[:5]
+    ):
+        # Another worker may have taken it between the SELECT and here
+        if SubmissionJob.objects.filter(pk=pk, status='queued').update(
+            status='running', locked_at=now, attempts=F('attempts') + 1
+        ):
+            return SubmissionJob.objects.select_related('submission').get(pk=pk)
+    return None
+
+
+def run_job(job):
+    submission = job.submission
+    AssignmentSubmission.objects.filter(pk=submission.pk).update(processing_status='processing')
+    try:
+        timings = process_submission(submission)
+    except Exception as e:
+        retry = not isinstance(e, UnsupportedFile) and job.attempts < getattr(
+            settings, 'SUBMISSION_INGEST_MAX_ATTEMPTS', 3
+        )
+        if retry:
+            logger.warning("Submission %s ingestion failed, will retry: %s", submission.pk, e)
+        elif isinstance(e, UnsupportedFile):
+            logger.info("Submission %s cannot be processed: %s", submission.pk, e)
+        else:
+            logger.exception("Submission %s ingestion failed", submission.pk)
+        backoff = getattr(settings, 'SUBMISSION_INGEST_RETRY_DELAY', 30) * 2 ** (job.attempts - 1)
+        SubmissionJob.objects.filter(pk=job.pk, status='running').update(
+            status='queued' if retry else 'failed', error=str(e)[:2000], locked_at=None,
+            run_after=timezone.now() + timedelta(seconds=backoff),
+            finished_at=None if retry else timezone.now(),
+        )
+        if not retry:
+            AssignmentSubmission.objects.filter(pk=submission.pk).update(processing_status='failed')
+        with _stats_lock:
+            _stats['jobs_retried' if retry else 'jobs_failed'] += 1
+        return False
+
+    SubmissionJob.objects.filter(pk=job.pk, status='running').update(
+        status='done', timings=timings, error='', finished_at=timezone.now()
+    )
+    with _stats_lock:
+        _stats['jobs_done'] += 1
+        for stage, seconds in timings.items():
+            _stats['stage_seconds'][stage] = _stats['stage_seconds'].get(stage, 0.0) + seconds
+    return True
+
+
+def run_pending(limit=None):
+    """Process due jobs in this thread until none are left (or ``limit``); returns how many"""
+    requeue_expired()
+    done = 0
+    while limit is None or done < limit:
+        job = claim_job()
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
+
+
+def ingestion_stats():
+    """Queue size by status plus cumulative worker metrics for this process"""
+    by_status = dict(
+        SubmissionJob.objects.order_by().values_list('status').annotate(n=Count('pk'))
+    )
+    with _stats_lock:
+        return {
+            'jobs': by_status,
+            **{key: value for key, value in _stats.items() if key != 'stage_seconds'},
+            'stage_seconds': dict(_stats['stage_seconds']),
+        }
+
+
+class IngestionWorkers:
+    """Daemon threads that drain the job table, woken early by ``wake``"""
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if any(thread.is_alive() for thread in self._threads):
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'submission-ingest-{n}', daemon=True)
+                for n in range(getattr(settings, 'SUBMISSION_INGEST_WORKERS', 2))
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        poll = getattr(settings, 'SUBMISSION_INGEST_POLL_INTERVAL', 5)
+        # Like PeriodicTask, nothing runs until the first wake-up or poll
+        while not self._stop.is_set():
+            self._wake.wait(poll)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                run_pending()
+            except Exception:
+                logger.exception("Submission ingestion worker failed")
+            finally:
+                close_old_connections()
+
+
+workers = IngestionWorkers()
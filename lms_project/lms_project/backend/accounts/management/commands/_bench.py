@@ -0,0 +1,53 @@
+"""
+Shared helpers for the ``bench_*`` management commands.
+
+Benchmarks run against a throwaway test database so they never touch
+``db.sqlite3``.
+"""
+
+import math
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def benchmark_database(on_disk=False):
+    """
+    Create a fresh test database for the duration of the block.
+
+    SQLite test databases live in memory by default, which threads cannot
+    share; pass ``on_disk=True`` for benchmarks that open one connection
+    per thread.
+    """
+    setup_test_environment()
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    saved_name = test_settings.get('NAME')
+    if on_disk and connection.vendor == 'sqlite':
+        handle, path = tempfile.mkstemp(prefix='lms-bench-', suffix='.sqlite3')
+        os.close(handle)
+        test_settings['NAME'] = path
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = saved_name
+        teardown_test_environment()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:8.2f} ms"
@@ -0,0 +1,65 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.autocomplete import PrefixIndex
+
+from ._bench import format_ms, percentile
+from .bench_search import CATEGORIES, WORDS
+
+PREFIXES = ['p', 'py', 'pyt', 'mach', 'machine l', 'data sc', 'web dev', 'zz', 'hist', 'da']
+
+
+class Command(BaseCommand):
+    help = "Measure autocomplete index build time, memory and lookup latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=100000)
+        parser.add_argument('--lookups', type=int, default=2000,
+                            help="Lookups per prefix")
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        # Lookups never touch the database, so the index is fed synthetic rows
+        rng = random.Random(options['seed'])
+        rows = [
+            (
+                i,
+                ' '.join(rng.choices(WORDS, k=rng.randint(2, 5))).title(),
+                rng.choice(CATEGORIES),
+                int(rng.paretovariate(1.2)),
+            )
+            for i in range(1, options['courses'] + 1)
+        ]
+        index = PrefixIndex(max_courses=len(rows))
+
+        started = time.perf_counter()
+        index.build(rows)
+        stats = index.stats()
+        self.stdout.write(
+            f"Built {stats['courses']} courses / {stats['keys']} keys in "
+            f"{time.perf_counter() - started:.2f}s, ~{stats['approx_bytes'] / 1024 / 1024:.1f} MiB, "
+            f"{stats['cached_prefixes']} cached prefixes\n"
+        )
+
+        self.stdout.write(f"{'prefix':<12} {'p50':>11} {'p99':>11}")
+        for prefix in PREFIXES:
+            latencies = []
+            for _ in range(options['lookups']):
+                started = time.perf_counter()
+                index.lookup(prefix)
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            self.stdout.write(
+                f"{prefix:<12} {format_ms(percentile(latencies, 50))} {format_ms(percentile(latencies, 99))}"
+            )
+
+        started = time.perf_counter()
+        for i in range(1000):
+            index.update_course(len(rows) + i + 1, f"{rng.choice(WORDS)} {rng.choice(WORDS)}", 'Programming')
+            index.adjust_enrollments(rng.randint(1, len(rows)), 1)
+        self.stdout.write(
+            f"\n1000 inserts + 1000 enrollment updates: "
+            f"{format_ms((time.perf_counter() - started) / 2000)} each"
+        )
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+
+from accounts.authentication import claims_epoch
+from accounts.models import Course, Enrollment, Profile, WaitlistEntry
+
+from ._bench import benchmark_database, format_ms, percentile
+
+# Threads share the in-process caches; the file-based ones are per test run anyway
+BENCH_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'},
+    'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'responses'},
+}
+
+
+class Command(BaseCommand):
+    help = "Race concurrent students for a limited number of seats and check nothing is oversold"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=500,
+                            help="Concurrent enrollers, one thread each")
+        parser.add_argument('--capacity', type=int, default=100)
+        parser.add_argument('--rounds', type=int, default=3,
+                            help="Rounds of simultaneous requests; later rounds are repeat clicks")
+        parser.add_argument('--waitlist', action='store_true',
+                            help="Queue students who miss out instead of turning them away")
+        parser.add_argument('--path', default='/api/enroll/')
+
+    def handle(self, *args, **options):
+        options_dict = connection.settings_dict.setdefault('OPTIONS', {})
+        saved_options = dict(options_dict)
+        # Writers queue on SQLite's lock instead of failing after 5 seconds
+        options_dict.setdefault('timeout', 60)
+        # 409s for a full course are expected; don't log hundreds of them
+        request_logger = logging.getLogger('django.request')
+        saved_level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(CACHES=BENCH_CACHES), benchmark_database(on_disk=True):
+                self._run(options)
+        finally:
+            options_dict.clear()
+            options_dict.update(saved_options)
+            request_logger.setLevel(saved_level)
+
+    def _run(self, options):
+        course = Course.objects.create(
+            title='Limited seats', description='', duration='4 weeks',
+            seat_capacity=options['capacity'], waitlist_enabled=options['waitlist'],
+        )
+        cookies = self._create_sessions(options['students'])
+
+        self.stdout.write(f"{'round':>6} {'enrolled':>9} {'existing':>9} {'waitlisted':>11} "
+                          f"{'full':>6} {'req/s':>8} {'p50':>11} {'p99':>11}")
+        for round_number in range(1, options['rounds'] + 1):
+            started = time.perf_counter()
+            latencies, outcomes = self._race(options['path'], course.id, cookies)
+            elapsed = time.perf_counter() - started
+            latencies.sort()
+            self.stdout.write(
+                f"{round_number:>6} {outcomes.get('enrolled', 0):>9} {outcomes.get('existing', 0):>9} "
+                f"{outcomes.get('waitlisted', 0):>11} {outcomes.get('full', 0):>6} "
+                f"{len(latencies) / elapsed:>8.0f} "
+                f"{format_ms(percentile(latencies, 50))} {format_ms(percentile(latencies, 99))}"
+            )
+            errors = {key: count for key, count in outcomes.items() if key.startswith('HTTP')}
+            if errors:
+                raise CommandError(f"Unexpected responses in round {round_number}: {errors}")
+
+        course.refresh_from_db()
+        enrolled = Enrollment.objects.filter(course=course, status='enrolled').count()
+        waitlisted = WaitlistEntry.objects.filter(course=course).count()
+        self.stdout.write(
+            f"\ncapacity={course.seat_capacity} enrolled={enrolled} "
+            f"seats_taken={course.seats_taken} waitlisted={waitlisted}"
+        )
+        expected = min(course.seat_capacity, options['students'])
+        if enrolled != expected or course.seats_taken != enrolled:
+            raise CommandError("Seat accounting is inconsistent")
+
+    def _create_sessions(self, count):
+        users = User.objects.bulk_create(
+            User(username=f'enroller{i}', email=f'enroller{i}@example.com') for i in range(count)
+        )
+        Profile.objects.bulk_create(Profile(user=user, role='student') for user in users)
+
+        engine = import_module(settings.SESSION_ENGINE)
+        cookies = []
+        for user in users:
+            session = engine.SessionStore()
+            session.update({
+                'user_id': user.id, 'username': user.username, 'role': 'student',
+                'is_active': True, 'claims_epoch': claims_epoch(user.id),
+                'is_authenticated': True,
+            })
+            session.save()
+            cookies.append(session.session_key)
+        return cookies
+
+    def _race(self, path, course_id, cookies):
+        barrier = threading.Barrier(len(cookies))
+        lock = threading.Lock()
+        latencies, outcomes = [], {}
+
+        def enroll(session_key):
+            client = Client()
+            client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+            try:
+                barrier.wait()
+                started = time.perf_counter()
+                response = client.post(path, {'course_id': course_id}, content_type='application/json')
+                elapsed = time.perf_counter() - started
+                if response.status_code in (200, 202):
+                    outcome = response.json()['status']
+                elif response.status_code == 409:
+                    outcome = 'full'
+                else:
+                    outcome = f'HTTP {response.status_code}'
+                with lock:
+                    latencies.append(elapsed)
+                    outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=enroll, args=(key,)) for key in cookies]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, outcomes
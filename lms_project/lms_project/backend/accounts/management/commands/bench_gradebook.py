@@ -0,0 +1,97 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from accounts.gradebook import build_gradebook, column_stats, final_grades, gradebook_data, load_gradebook
+from accounts.models import Assignment, AssignmentSubmission, Course, CourseModule, Enrollment, Lesson
+
+from ._bench import benchmark_database, format_ms, percentile
+
+BENCH_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'responses'},
+}
+
+
+class Command(BaseCommand):
+    help = "Time building the gradebook matrix and its statistics for a large course"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--assignments', type=int, default=50)
+        parser.add_argument('--graded', type=float, default=0.9,
+                            help="Share of student/assignment cells with a grade")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with override_settings(CACHES=BENCH_CACHES), benchmark_database():
+            course_id = self._populate(options)
+            self._run(course_id, options['repeat'])
+
+    def _populate(self, options):
+        rng = random.Random(options['seed'])
+        course = Course.objects.create(title='Gradebook', description='', duration='12 weeks')
+        module = CourseModule.objects.create(course=course, title='Coursework', description='', order=1)
+        lessons = Lesson.objects.bulk_create(
+            Lesson(module=module, title=f'Assignment {n}', content='', lesson_type='assignment', order=n)
+            for n in range(options['assignments'])
+        )
+        assignments = Assignment.objects.bulk_create(
+            Assignment(lesson=lesson, title=lesson.title, description='', instructions='',
+                       due_date=course.created_at, max_points=rng.choice((10, 20, 50, 100)))
+            for lesson in lessons
+        )
+        students = User.objects.bulk_create(
+            User(username=f'gradebook{i}', email=f'gradebook{i}@example.com') for i in range(options['students'])
+        )
+        Enrollment.objects.bulk_create(Enrollment(student=student, course=course) for student in students)
+        AssignmentSubmission.objects.bulk_create(
+            (
+                AssignmentSubmission(
+                    assignment=assignment, student=student, status='graded',
+                    grade=round(min(assignment.max_points, rng.gauss(0.75, 0.15) * assignment.max_points), 1),
+                )
+                for student in students for assignment in assignments if rng.random() < options['graded']
+            ),
+            batch_size=1000,
+        )
+        self.stdout.write(
+            f"{len(students)} students x {len(assignments)} assignments, "
+            f"{AssignmentSubmission.objects.count()} graded submissions\n"
+        )
+        return course.id
+
+    def _time(self, label, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        self.stdout.write(f"{label:<24} {format_ms(percentile(timings, 50))} {format_ms(timings[-1])}")
+
+    def _python_stats(self, book):
+        """The same column statistics with plain Python, for comparison"""
+        for column in range(book.matrix.shape[1]):
+            grades = sorted(value for value in book.matrix[:, column].tolist() if value == value)
+            if grades:
+                statistics.fmean(grades)
+                statistics.median(grades)
+                statistics.pstdev(grades)
+                statistics.quantiles(grades, n=20, method='inclusive')
+
+    def _run(self, course_id, repeat):
+        book = build_gradebook(course_id)
+        self.stdout.write(f"{'step':<24} {'p50':>11} {'max':>11}")
+        self._time('build matrix (3 queries)', lambda: build_gradebook(course_id), repeat)
+        load_gradebook(course_id)
+        self._time('load cached matrix', lambda: load_gradebook(course_id), repeat)
+        self._time('column statistics', lambda: column_stats(book.matrix, book.max_points), repeat)
+        self._time('final grades', lambda: final_grades(book.matrix, book.max_points), repeat)
+        self._time('python statistics', lambda: self._python_stats(book), repeat)
+        self._time('full response data', lambda: gradebook_data(course_id), repeat)
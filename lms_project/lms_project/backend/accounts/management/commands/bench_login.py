@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+
+from accounts.models import Profile
+
+from ._bench import benchmark_database, format_ms, percentile
+
+PASSWORD = 'bench-password-123'
+
+
+class Command(BaseCommand):
+    help = "Benchmark the async login endpoint at several client concurrency levels"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--requests', type=int, default=128,
+                            help="Logins issued per concurrency level")
+        parser.add_argument('--path', default='/api/login-async/')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            users = self._create_users(max(options['concurrency']))
+            self.stdout.write(f"{'clients':>8} {'logins/s':>10} {'p50':>11} {'p99':>11}")
+            for level in options['concurrency']:
+                latencies, elapsed = asyncio.run(
+                    self._run(options['path'], users, level, options['requests'])
+                )
+                latencies.sort()
+                self.stdout.write(
+                    f"{level:>8} {len(latencies) / elapsed:>10.1f} "
+                    f"{format_ms(percentile(latencies, 50))} {format_ms(percentile(latencies, 99))}"
+                )
+
+    def _create_users(self, count):
+        # Every login still pays for a full hash check; only setup is shared
+        encoded = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            User(username=f'bench{i}', email=f'bench{i}@example.com', password=encoded)
+            for i in range(count)
+        )
+        Profile.objects.bulk_create(Profile(user=user, role='student') for user in users)
+        return [user.username for user in users]
+
+    async def _run(self, path, usernames, concurrency, total):
+        latencies = []
+        slots = asyncio.Semaphore(concurrency)
+
+        async def login(i):
+            client = AsyncClient()
+            async with slots:
+                started = time.perf_counter()
+                response = await client.post(
+                    path,
+                    {'username': usernames[i % concurrency], 'password': PASSWORD},
+                    content_type='application/json',
+                )
+                latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"Login failed with {response.status_code}: {response.content!r}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(total)))
+        return latencies, time.perf_counter() - started
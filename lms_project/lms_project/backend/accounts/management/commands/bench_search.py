@@ -0,0 +1,81 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Course
+from accounts.search import _search_icontains, rebuild_index, search_courses
+
+from ._bench import benchmark_database, format_ms, percentile
+
+WORDS = (
+    "python data science machine learning web development design databases "
+    "statistics algebra calculus physics chemistry biology history literature "
+    "writing marketing finance accounting management leadership networking "
+    "security cloud devops testing mobile android kotlin swift javascript react "
+    "django flask rust golang linux systems graphics audio video photography "
+    "music painting drawing economics psychology philosophy ethics law health"
+).split()
+CATEGORIES = [
+    'Programming', 'Data Science', 'Design', 'Business', 'Science',
+    'Mathematics', 'Humanities', 'Arts', 'Health', 'Languages',
+]
+QUERIES = ['python', 'machine learning', 'photo', 'django web development', 'quantum']
+
+
+class Command(BaseCommand):
+    help = "Compare FTS5 course search latency with icontains filtering"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help="Runs per query and strategy")
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with benchmark_database():
+            started = time.perf_counter()
+            self._create_courses(rng, options['courses'])
+            rebuild_index()
+            self.stdout.write(
+                f"Indexed {options['courses']} courses in {time.perf_counter() - started:.1f}s\n"
+            )
+            self.stdout.write(
+                f"{'query':<26} {'matches':>8} {'fts p50':>11} {'fts p99':>11} "
+                f"{'icontains p50':>14} {'icontains p99':>14}"
+            )
+            for query in QUERIES:
+                fts, total = self._time(
+                    lambda: search_courses(query, limit=20)[1], options['repeat'])
+                like, _ = self._time(
+                    lambda: _search_icontains(query, None, None, 20, 0)[1], options['repeat'])
+                self.stdout.write(
+                    f"{query:<26} {total:>8} {format_ms(percentile(fts, 50))} "
+                    f"{format_ms(percentile(fts, 99))} {format_ms(percentile(like, 50)):>14} "
+                    f"{format_ms(percentile(like, 99)):>14}"
+                )
+
+    def _create_courses(self, rng, count):
+        batch = []
+        for i in range(count):
+            batch.append(Course(
+                title=' '.join(rng.choices(WORDS, k=3)).title(),
+                description=' '.join(rng.choices(WORDS, k=40)),
+                duration=f'{rng.randint(1, 12)} weeks',
+                difficulty=rng.choice(('beginner', 'intermediate', 'advanced')),
+                category=rng.choice(CATEGORIES),
+            ))
+            if len(batch) == 5000:
+                Course.objects.bulk_create(batch)
+                batch = []
+        Course.objects.bulk_create(batch)
+
+    def _time(self, run, repeat):
+        latencies, result = [], None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = run()
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        return latencies, result
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from accounts.storage import collect_unreferenced_blobs, import_existing_files, recount_references
+
+
+class Command(BaseCommand):
+    help = "Delete media blobs that are no longer referenced (for cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--import-existing', action='store_true',
+                            help="First move files saved before deduplication into blob storage")
+        parser.add_argument('--recount', action='store_true',
+                            help="First recompute reference counts from the referencing tables")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['import_existing']:
+            moved, missing = import_existing_files()
+            self.stdout.write(f"Moved {moved} files into blob storage ({missing} missing on disk)")
+        if options['recount']:
+            self.stdout.write(f"Corrected {recount_references()} reference counts")
+        blobs = removed_bytes = 0
+        while True:
+            result = collect_unreferenced_blobs(batch_size=options['batch_size'])
+            blobs += result['blobs_removed']
+            removed_bytes += result['bytes_removed']
+            if not result['blobs_removed']:
+                break
+        self.stdout.write(f"Removed {blobs} blobs ({removed_bytes} bytes)")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from accounts.ingestion import run_pending
+
+
+class Command(BaseCommand):
+    help = "Process queued submission ingestion jobs (for cron, or with the workers disabled)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help="Stop after this many jobs")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Processed {run_pending(limit=options['limit'])} submissions")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the course full-text search index (after bulk imports)"
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stdout.write("Full-text index is only used on SQLite; nothing to do")
+            return
+        rebuild_index()
+        self.stdout.write("Course search index rebuilt")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Course
+from accounts.progress import recompute_stale_progress
+
+
+class Command(BaseCommand):
+    help = "Recompute course progress for courses whose lessons changed (for cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Recompute every course, not only the flagged ones")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['all']:
+            Course.objects.update(progress_stale=True)
+        courses = enrollments = 0
+        seconds = 0.0
+        while True:
+            result = recompute_stale_progress(batch_size=options['batch_size'])
+            courses += result['courses']
+            enrollments += result['enrollments']
+            seconds += result['seconds']
+            if not result['courses']:
+                break
+        self.stdout.write(
+            f"Recomputed {enrollments} enrollments in {courses} courses in {seconds:.2f}s"
+        )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from accounts.rendering import render_stale_lessons
+
+
+class Command(BaseCommand):
+    help = "Store rendered HTML for lessons changed by queryset updates or imports"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Rendered {render_stale_lessons()} lessons")
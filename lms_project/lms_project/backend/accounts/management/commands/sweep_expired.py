@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from accounts.sweeper import sweep_expired
+
+
+class Command(BaseCommand):
+    help = "Purge expired sessions, API tokens and abandoned uploads in small batches (for cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        sessions = tokens = uploads = 0
+        seconds = 0.0
+        while True:
+            result = sweep_expired(batch_size=options['batch_size'])
+            sessions += result['sessions_removed']
+            tokens += result['tokens_removed']
+            uploads += result['uploads_removed']
+            seconds += result['seconds']
+            if not (result['sessions_removed'] or result['tokens_removed'] or result['uploads_removed']):
+                break
+        self.stdout.write(
+            f"Removed {sessions} sessions, {tokens} tokens and {uploads} uploads in {seconds:.2f}s"
+        )
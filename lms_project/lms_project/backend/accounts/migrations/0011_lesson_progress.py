@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_published_lessons(apps, schema_editor):
+    Course = apps.get_model('accounts', 'Course')
+    Lesson = apps.get_model('accounts', 'Lesson')
+    published = (
+        Lesson.objects.filter(
+            module__course=models.OuterRef('pk'), is_published=True, module__is_published=True
+        )
+        .order_by().values('module__course').annotate(n=models.Count('pk')).values('n')
+    )
+    Course.objects.update(
+        published_lessons=Coalesce(models.Subquery(published, output_field=models.IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_course_seats_waitlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='progress_stale',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='published_lessons',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='lessons_completed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='LessonCompletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_completions', to='accounts.enrollment')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='completions', to='accounts.lesson')),
+            ],
+            options={
+                'unique_together': {('enrollment', 'lesson')},
+            },
+        ),
+        migrations.RunPython(count_published_lessons, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:41
+
+import accounts.storage
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='assignmentsubmission',
+            name='submission_file',
+            field=models.FileField(blank=True, null=True, storage=accounts.storage.get_blob_storage, upload_to='assignment_submissions/'),
+        ),
+        migrations.AlterField(
+            model_name='certificate',
+            name='pdf_file',
+            field=models.FileField(blank=True, null=True, storage=accounts.storage.get_blob_storage, upload_to='certificates/'),
+        ),
+        migrations.AlterField(
+            model_name='lessonfile',
+            name='file',
+            field=models.FileField(storage=accounts.storage.get_blob_storage, upload_to='lesson_files/'),
+        ),
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'last_used_at'], name='blob_gc_idx')],
+            },
+        ),
+    ]
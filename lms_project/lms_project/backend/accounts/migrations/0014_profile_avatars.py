@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_key',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_pending_key',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_status',
+            field=models.CharField(blank=True, choices=[('', 'None'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], max_length=20),
+        ),
+    ]
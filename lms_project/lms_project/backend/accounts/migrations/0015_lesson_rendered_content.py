@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:46
+
+from django.db import migrations, models
+
+
+def render_existing_lessons(apps, schema_editor):
+    from accounts.rendering import excerpt, render_markdown
+
+    Lesson = apps.get_model('accounts', 'Lesson')
+    for lesson_id, content, updated_at in Lesson.objects.values_list('pk', 'content', 'updated_at').iterator():
+        content_html = render_markdown(content)
+        Lesson.objects.filter(pk=lesson_id).update(
+            content_html=content_html, content_excerpt=excerpt(content_html), content_rendered_at=updated_at,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_profile_avatars'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='content_excerpt',
+            field=models.CharField(blank=True, default='', max_length=300),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='content_html',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='content_rendered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(render_existing_lessons, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_lesson_rendered_content'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignmentsubmission',
+            index=models.Index(fields=['student', 'assignment', 'submitted_at'], name='submission_student_asg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursemodule',
+            index=models.Index(fields=['course', 'order'], name='module_course_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['module', 'lesson_type', 'order'], name='lesson_module_type_idx'),
+        ),
+    ]
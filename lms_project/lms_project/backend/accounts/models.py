@@ -1,9 +1,12 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 import uuid
 
+from .storage import get_blob_storage
+
 class Profile(models.Model):
     ROLE_CHOICES = (
         ('student', 'Student'),
@@ -13,7 +16,17 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='student')
     bio = models.TextField(blank=True, null=True)
+    AVATAR_STATUS_CHOICES = (
+        ('', 'None'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
     profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    # Resized variants (see accounts.avatars)
+    avatar_key = models.CharField(max_length=32, blank=True)
+    avatar_pending_key = models.CharField(max_length=32, blank=True)
+    avatar_status = models.CharField(max_length=20, choices=AVATAR_STATUS_CHOICES, blank=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
     date_of_birth = models.DateField(blank=True, null=True)
     address = models.TextField(blank=True, null=True)
@@ -40,6 +53,29 @@ class Student(models.Model):
     def __str__(self):
         return self.user.username
 
+class CourseQuerySet(models.QuerySet):
+    def with_catalog_stats(self):
+        """
+        Lecturer and user joined in, plus ``modules_count`` and
+        ``students_count`` annotations, so CourseSerializer needs no extra
+        queries per course.
+        """
+        # Modules are counted in a subquery so the module and enrollment joins
+        # do not multiply each other's rows.
+        modules = (
+            CourseModule.objects.filter(course=models.OuterRef('pk'))
+            .order_by().values('course').annotate(n=models.Count('pk')).values('n')
+        )
+        return self.select_related('lecturer__user').annotate(
+            modules_count=Coalesce(
+                models.Subquery(modules, output_field=models.IntegerField()), 0
+            ),
+            students_count=models.Count(
+                'enrollment', filter=models.Q(enrollment__status='enrolled')
+            ),
+        )
+
+
 class Course(models.Model):
     DIFFICULTY_CHOICES = (
         ('beginner', 'Beginner'),
@@ -54,8 +90,26 @@ class Course(models.Model):
     category = models.CharField(max_length=100, blank=True, null=True)
     image = models.URLField(blank=True, null=True)
     lecturer = models.ForeignKey(Lecturer, on_delete=models.SET_NULL, null=True, blank=True)
+    # Seat limits: None means unlimited. seats_taken counts 'enrolled' rows and
+    # is only changed with conditional UPDATEs (see accounts.enrollment).
+    seat_capacity = models.PositiveIntegerField(blank=True, null=True)
+    seats_taken = models.PositiveIntegerField(default=0)
+    waitlist_enabled = models.BooleanField(default=False)
+    # Published lessons in published modules, kept current by signals; set
+    # progress_stale when enrollments still need recomputing against it
+    # (see accounts.progress)
+    published_lessons = models.PositiveIntegerField(default=0)
+    progress_stale = models.BooleanField(default=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CourseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination order (newest first)
+            models.Index(fields=['created_at', 'id'], name='course_created_id_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -72,12 +126,29 @@ class Enrollment(models.Model):
     enrolled_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='enrolled')
     progress_percentage = models.FloatField(default=0.0, validators=[MinValueValidator(0.0), MaxValueValidator(100.0)])
+    lessons_completed = models.PositiveIntegerField(default=0)
     completion_date = models.DateTimeField(blank=True, null=True)
     grade = models.CharField(max_length=5, blank=True, null=True)
     certificate_issued = models.BooleanField(default=False)
 
     class Meta:
         unique_together = ('student', 'course')
+        indexes = [
+            models.Index(fields=['student', 'enrolled_at', 'id'], name='enroll_student_date_idx'),
+        ]
+
+class WaitlistEntry(models.Model):
+    """A student queued for a full course; promoted first come, first served"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='waitlist')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('course', 'student')
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.student.username} waiting for {self.course.title}"
 
 # Advanced Course Content Models
 class CourseModule(models.Model):
@@ -91,6 +162,9 @@ class CourseModule(models.Model):
 
     class Meta:
         ordering = ['order']
+        indexes = [
+            models.Index(fields=['course', 'order'], name='module_course_order_idx'),
+        ]
 
 class Lesson(models.Model):
     LESSON_TYPES = (
@@ -103,6 +177,10 @@ class Lesson(models.Model):
     module = models.ForeignKey(CourseModule, on_delete=models.CASCADE, related_name='lessons')
     title = models.CharField(max_length=200)
     content = models.TextField()
+    # Rendered Markdown and its excerpt, valid while content_rendered_at == updated_at (see accounts.rendering)
+    content_html = models.TextField(blank=True, default='')
+    content_excerpt = models.CharField(max_length=300, blank=True, default='')
+    content_rendered_at = models.DateTimeField(blank=True, null=True)
     lesson_type = models.CharField(max_length=20, choices=LESSON_TYPES)
     duration_minutes = models.PositiveIntegerField(default=0)
     order = models.PositiveIntegerField()
@@ -112,10 +190,22 @@ class Lesson(models.Model):
 
     class Meta:
         ordering = ['order']
+        indexes = [
+            # Assignment lessons of a module, in order (course_assignments, get_profile)
+            models.Index(fields=['module', 'lesson_type', 'order'], name='lesson_module_type_idx'),
+        ]
+
+class LessonCompletion(models.Model):
+    enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name='lesson_completions')
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='completions')
+    completed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('enrollment', 'lesson')
 
 class LessonFile(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='files')
-    file = models.FileField(upload_to='lesson_files/')
+    file = models.FileField(upload_to='lesson_files/', storage=get_blob_storage)
     filename = models.CharField(max_length=255)
     file_size = models.PositiveIntegerField()
     uploaded_at = models.DateTimeField(auto_now_add=True)
@@ -184,6 +274,11 @@ class Assignment(models.Model):
     is_published = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='assignment_created_id_idx'),
+        ]
+
 class AssignmentSubmission(models.Model):
     STATUS_CHOICES = (
         ('submitted', 'Submitted'),
@@ -193,7 +288,7 @@ class AssignmentSubmission(models.Model):
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='submissions')
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     submission_text = models.TextField(blank=True, null=True)
-    submission_file = models.FileField(upload_to='assignment_submissions/', blank=True, null=True)
+    submission_file = models.FileField(upload_to='assignment_submissions/', storage=get_blob_storage, blank=True, null=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
     grade = models.FloatField(blank=True, null=True)
     feedback = models.TextField(blank=True, null=True)
@@ -201,6 +296,25 @@ class AssignmentSubmission(models.Model):
     graded_at = models.DateTimeField(blank=True, null=True)
     graded_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='graded_assignments')
 
+    # Filled in by the ingestion pipeline (see accounts.ingestion)
+    PROCESSING_CHOICES = (
+        ('', 'Not processed'),
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    )
+    processing_status = models.CharField(max_length=20, choices=PROCESSING_CHOICES, blank=True)
+    word_count = models.PositiveIntegerField(blank=True, null=True)
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)  # SHA-256 of the normalized text
+    duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+
+    class Meta:
+        indexes = [
+            # A student's submissions for a set of assignments
+            models.Index(fields=['student', 'assignment', 'submitted_at'], name='submission_student_asg_idx'),
+        ]
+
 # Communication System
 class DiscussionForum(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='forums')
@@ -258,7 +372,7 @@ class Certificate(models.Model):
     enrollment = models.OneToOneField(Enrollment, on_delete=models.CASCADE, related_name='certificate')
     certificate_number = models.UUIDField(default=uuid.uuid4, unique=True)
     issued_at = models.DateTimeField(auto_now_add=True)
-    pdf_file = models.FileField(upload_to='certificates/', blank=True, null=True)
+    pdf_file = models.FileField(upload_to='certificates/', storage=get_blob_storage, blank=True, null=True)
     is_valid = models.BooleanField(default=True)
 
 # Live Session System
@@ -278,4 +392,79 @@ class LiveSessionAttendance(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     joined_at = models.DateTimeField(auto_now_add=True)
     left_at = models.DateTimeField(blank=True, null=True)
-    duration_minutes = models.PositiveIntegerField(default=0)
\ No newline at end of file
+    duration_minutes = models.PositiveIntegerField(default=0)
+# Resumable uploads (see accounts.uploads)
+class UploadSession(models.Model):
+    PURPOSE_CHOICES = (
+        ('lesson_file', 'Lesson file'),
+        ('submission', 'Assignment submission'),
+        ('profile_picture', 'Profile picture'),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    target_id = models.PositiveIntegerField(blank=True, null=True)  # lesson or assignment id
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    received_chunks = models.PositiveIntegerField(default=0)  # chunks 0..n-1 are on disk
+    bytes_received = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)  # set on completion
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='upload_updated_idx'),
+        ]
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+# Content-addressed media (see accounts.storage)
+class StoredBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)  # blobs/aa/bb/<sha256><ext>
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)  # FileFields pointing at it
+    last_used_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'last_used_at'], name='blob_gc_idx'),
+        ]
+
+# Text extracted from a submission (see accounts.ingestion). It can be up to
+# SUBMISSION_TEXT_MAX_CHARS long, so it lives off the submission row that
+# every listing and download loads; also indexed in accounts_submission_fts.
+class SubmissionText(models.Model):
+    submission = models.OneToOneField(
+        AssignmentSubmission, on_delete=models.CASCADE, primary_key=True, related_name='extracted'
+    )
+    text = models.TextField(blank=True)
+
+# Submission ingestion queue (see accounts.ingestion)
+class SubmissionJob(models.Model):
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    submission = models.ForeignKey(AssignmentSubmission, on_delete=models.CASCADE, related_name='ingestion_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)  # pushed back between retries
+    locked_at = models.DateTimeField(blank=True, null=True)  # when a worker claimed it
+    timings = models.JSONField(default=dict, blank=True)  # seconds per stage
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='ingest_job_queue_idx'),
+        ]
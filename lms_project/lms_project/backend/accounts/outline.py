@@ -0,0 +1,95 @@
+"""
+Course outline: modules, lessons, lesson files and quiz/assignment flags.
+
+``build_outline`` runs four queries whatever the size of the course (the
+course, its modules, its lessons with the flags computed by EXISTS
+subqueries, and its lesson files), all through ``values()`` so no model
+instances are built. Lessons carry their stored excerpt, never the full
+body (see accounts.rendering). Views serve the result through
+``caching.cached_json_response``. The tree is therefore serialized once per
+course version and variant, and later requests get the stored JSON bytes.
+
+There are two variants. The published outline is what students see: it
+holds published modules, their published lessons and only published
+quizzes and assignments. The full outline is for the course's lecturer and
+admins and includes drafts.
+"""
+
+from django.db.models import Exists, OuterRef
+
+from .models import Assignment, Course, CourseModule, Lesson, LessonFile, Quiz
+from .rendering import stale_excerpts
+
+PUBLISHED = 'published'
+FULL = 'full'
+
+
+def outline_cache_name(course_id, variant):
+    return f'course_outline.{course_id}.{variant}'
+
+
+def build_outline(course_id, published_only=True):
+    """
+    Return ``(data, last_modified)`` for the outline of ``course_id``, or
+    ``None`` if there is no such course.
+    """
+    course = (
+        Course.objects.filter(pk=course_id)
+        .values('id', 'title', 'published_lessons', 'updated_at').first()
+    )
+    if course is None:
+        return None
+
+    modules = CourseModule.objects.filter(course_id=course_id)
+    quizzes = Quiz.objects.filter(lesson=OuterRef('pk'))
+    assignments = Assignment.objects.filter(lesson=OuterRef('pk'))
+    lessons = Lesson.objects.filter(module__course_id=course_id)
+    files = LessonFile.objects.filter(lesson__module__course_id=course_id)
+    if published_only:
+        modules = modules.filter(is_published=True)
+        quizzes = quizzes.filter(is_published=True)
+        assignments = assignments.filter(is_published=True)
+        lessons = lessons.filter(is_published=True, module__is_published=True)
+        files = files.filter(lesson__is_published=True, lesson__module__is_published=True)
+
+    last_modified = course.pop('updated_at')
+    tree = []
+    lessons_by_module = {}
+    for module in modules.order_by('order', 'id').values(
+        'id', 'title', 'description', 'order', 'is_published', 'updated_at'
+    ):
+        last_modified = max(last_modified, module.pop('updated_at'))
+        module['lessons'] = lessons_by_module[module['id']] = []
+        tree.append(module)
+
+    files_by_lesson = {}
+    for lesson_file in files.order_by('id').values(
+        'id', 'lesson_id', 'filename', 'file_size', 'uploaded_at'
+    ):
+        last_modified = max(last_modified, lesson_file.pop('uploaded_at'))
+        files_by_lesson.setdefault(lesson_file.pop('lesson_id'), []).append(lesson_file)
+
+    stale = []
+    for lesson in (
+        lessons.annotate(has_quiz=Exists(quizzes), has_assignment=Exists(assignments))
+        .order_by('order', 'id')
+        .values('id', 'module_id', 'title', 'lesson_type', 'duration_minutes', 'order',
+                'is_published', 'has_quiz', 'has_assignment', 'content_excerpt',
+                'content_rendered_at', 'updated_at')
+    ):
+        updated_at = lesson.pop('updated_at')
+        last_modified = max(last_modified, updated_at)
+        if lesson.pop('content_rendered_at') != updated_at:
+            stale.append(lesson)
+        lesson['excerpt'] = lesson.pop('content_excerpt')
+        lesson['files'] = files_by_lesson.get(lesson['id'], [])
+        lessons_by_module[lesson.pop('module_id')].append(lesson)
+    if stale:
+        # Only lessons changed behind the signals' back (queryset updates)
+        excerpts = stale_excerpts([lesson['id'] for lesson in stale])
+        for lesson in stale:
+            lesson['excerpt'] = excerpts.get(lesson['id'], '')
+
+    course['variant'] = PUBLISHED if published_only else FULL
+    course['modules'] = tree
+    return course, last_modified
@@ -0,0 +1,137 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages are selected with a ``WHERE (created_at, id) < (last_created_at, last_id)``
+style predicate on an indexed ordering rather than OFFSET, so fetching page
+N costs the same as page 1 and rows inserted meanwhile never shift a page.
+The cursor is an opaque base64 token holding the ordering values of the last
+row of the previous page.
+
+Clients opt in by sending ``page_size`` or ``cursor``. While
+``API_LEGACY_UNPAGINATED`` is on, requests without either get the full,
+unpaginated response they always did.
+"""
+
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+CURSOR_PARAM = 'cursor'
+PAGE_SIZE_PARAM = 'page_size'
+
+
+class InvalidCursor(ParseError):
+    default_detail = 'Invalid cursor'
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate by ``ordering``, which must end in a unique field (normally id).
+
+    Works as a DRF ``pagination_class``; function views create one and call
+    ``paginate_queryset`` and ``get_response_data`` directly.
+    """
+
+    ordering = ('-created_at', '-id')
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        self.next_cursor = None
+        self.page_size = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return the current page as a list, or None for a legacy full listing"""
+        if view is not None and getattr(view, 'ordering', None):
+            self.ordering = tuple(view.ordering)
+        params = request.query_params if hasattr(request, 'query_params') else request.GET
+        cursor = params.get(CURSOR_PARAM)
+        if (
+            cursor is None
+            and PAGE_SIZE_PARAM not in params
+            and getattr(settings, 'API_LEGACY_UNPAGINATED', True)
+        ):
+            return None
+
+        self.page_size = self._page_size(params.get(PAGE_SIZE_PARAM))
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._after(queryset.model, self._decode(cursor)))
+
+        rows = list(queryset[:self.page_size + 1])
+        page = rows[:self.page_size]
+        self.next_cursor = self._encode(page[-1]) if len(rows) > self.page_size else None
+        return page
+
+    def get_paginated_data(self, data, key='results'):
+        return {key: data, 'next_cursor': self.next_cursor, 'page_size': self.page_size}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_response_data(self, data, key=None):
+        """
+        Response body for function views: the legacy shape (``data`` or
+        ``{key: data}``) when nothing was paginated, else the paginated one.
+        """
+        if self.page_size is None:
+            return data if key is None else {key: data}
+        return self.get_paginated_data(data, key or 'results')
+
+    def _page_size(self, value):
+        default = getattr(settings, 'API_PAGE_SIZE', 50)
+        try:
+            size = int(value) if value else default
+        except ValueError:
+            size = default
+        return max(1, min(size, getattr(settings, 'API_MAX_PAGE_SIZE', 500)))
+
+    def _fields(self):
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def _encode(self, row):
+        values = []
+        for name, _ in self._fields():
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def _decode(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (binascii.Error, ValueError):
+            raise InvalidCursor()
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor()
+        return values
+
+    def _after(self, model, values):
+        """Rows strictly after ``values`` in ``ordering`` (lexicographic)"""
+        fields = self._fields()
+        try:
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(fields, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            # Well-formed JSON can still hold values of the wrong type
+            raise InvalidCursor()
+        if any(value is None for value in values):
+            raise InvalidCursor()
+
+        condition = Q()
+        for i, (name, descending) in enumerate(fields):
+            term = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+            for j in range(i):
+                term &= Q(**{fields[j][0]: values[j]})
+            condition |= term
+        return condition
@@ -0,0 +1,44 @@
+"""
+Role-based permissions that read the caller's claims.
+
+``request.auth`` is the AuthClaims tuple produced by CachedTokenAuthentication
+or SessionClaimsAuthentication, so these checks never touch the database.
+"""
+
+from rest_framework.permissions import BasePermission
+
+from .authentication import AuthClaims
+
+
+class HasRoleClaim(BasePermission):
+    """Allow active callers whose role claim is one of ``roles``"""
+
+    roles = ()
+
+    def has_permission(self, request, view):
+        claims = request.auth
+        return (
+            isinstance(claims, AuthClaims)
+            and claims.is_active
+            and claims.role in self.roles
+        )
+
+
+class IsSuperAdmin(HasRoleClaim):
+    roles = ('superadmin',)
+    message = 'Admin access required'
+
+
+class IsLecturer(HasRoleClaim):
+    roles = ('lecturer',)
+    message = 'Lecturer access required'
+
+
+class IsStudent(HasRoleClaim):
+    roles = ('student',)
+    message = 'Student access required'
+
+
+class IsLecturerOrSuperAdmin(HasRoleClaim):
+    roles = ('lecturer', 'superadmin')
+    message = 'Lecturer or admin access required'
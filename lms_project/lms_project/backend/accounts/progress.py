@@ -0,0 +1,155 @@
+"""
+Course progress from lesson completion events.
+
+Each enrollment stores ``lessons_completed`` next to ``progress_percentage``
+and each course caches its ``published_lessons`` total (published lessons in
+published modules), so recording or undoing a completion is one insert or
+delete plus one UPDATE of the enrollment row, whatever the size of the
+course. Dashboards read the stored percentage without aggregating.
+
+Adding, removing or (un)publishing lessons refreshes the course total
+straight away and flags the course ``progress_stale``. The percentages of
+its enrollments are then recomputed in batches by ``recompute_stale_progress``,
+which runs in the background every ``PROGRESS_RECOMPUTE_INTERVAL`` seconds
+and from the ``recompute_progress`` command.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .background import PeriodicTask
+from .models import Course, Enrollment, Lesson, LessonCompletion
+
+_stats_lock = threading.Lock()
+_stats = {
+    'runs': 0,
+    'courses_recomputed': 0,
+    'enrollments_recomputed': 0,
+    'last_run_at': None,
+    'last_run_seconds': None,
+}
+
+
+def progress_job_stats():
+    """Return cumulative recompute metrics for this process"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def published_lessons(course_ref):
+    """Lessons that count towards progress in ``course_ref`` (an id or OuterRef)"""
+    return Lesson.objects.filter(
+        module__course=course_ref, is_published=True, module__is_published=True
+    )
+
+
+def lessons_changed(course_id):
+    """Refresh the cached lesson total of ``course_id`` and flag its enrollments"""
+    total = (
+        published_lessons(OuterRef('pk')).order_by()
+        .values('module__course').annotate(n=Count('pk')).values('n')
+    )
+    Course.objects.filter(pk=course_id).update(
+        published_lessons=Coalesce(Subquery(total), 0), progress_stale=True
+    )
+
+
+def _percentage(completed, total):
+    if not total:
+        return Value(0.0)
+    return Least(Cast(completed, FloatField()) * Value(100.0 / total), Value(100.0))
+
+
+def record_completion(enrollment, lesson_id, completed=True):
+    """
+    Mark ``lesson_id`` completed (or not) for ``enrollment``, whose course
+    must be loaded. Returns ``(changed, lessons_completed, progress_percentage)``.
+    """
+    total = enrollment.course.published_lessons
+    with transaction.atomic():
+        if completed:
+            _, changed = LessonCompletion.objects.get_or_create(
+                enrollment_id=enrollment.pk, lesson_id=lesson_id
+            )
+            count = F('lessons_completed') + 1
+        else:
+            changed = bool(
+                LessonCompletion.objects.filter(enrollment_id=enrollment.pk, lesson_id=lesson_id).delete()[0]
+            )
+            count = Greatest(F('lessons_completed') - 1, 0)
+        if changed:
+            Enrollment.objects.filter(pk=enrollment.pk).update(
+                lessons_completed=count, progress_percentage=_percentage(count, total)
+            )
+    lessons_completed, percentage = (
+        Enrollment.objects.filter(pk=enrollment.pk)
+        .values_list('lessons_completed', 'progress_percentage').get()
+    )
+    return changed, lessons_completed, percentage
+
+
+def recompute_course_progress(course_id, batch_size=None):
+    """Recount every enrollment of ``course_id`` in batches; returns how many"""
+    batch_size = batch_size or getattr(settings, 'PROGRESS_RECOMPUTE_BATCH_SIZE', 1000)
+    total = published_lessons(course_id).count()
+    Course.objects.filter(pk=course_id).update(published_lessons=total)
+
+    done = Coalesce(Subquery(
+        LessonCompletion.objects.filter(
+            enrollment=OuterRef('pk'), lesson__is_published=True, lesson__module__is_published=True,
+        ).order_by().values('enrollment').annotate(n=Count('pk')).values('n')
+    ), 0)
+
+    recomputed, last_pk = 0, 0
+    while True:
+        pks = list(
+            Enrollment.objects.filter(course_id=course_id, pk__gt=last_pk)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return recomputed
+        # One short write per batch so completions are never blocked for long
+        Enrollment.objects.filter(pk__in=pks).update(
+            lessons_completed=done, progress_percentage=_percentage(done, total)
+        )
+        recomputed += len(pks)
+        last_pk = pks[-1]
+
+
+def recompute_stale_progress(batch_size=None, max_courses=None):
+    """Recompute the enrollments of courses flagged ``progress_stale``"""
+    max_courses = max_courses or getattr(settings, 'PROGRESS_RECOMPUTE_MAX_COURSES', 100)
+    now = timezone.now()
+    started = time.perf_counter()
+    course_ids = list(
+        Course.objects.filter(progress_stale=True).order_by('pk')
+        .values_list('pk', flat=True)[:max_courses]
+    )
+    courses = enrollments = 0
+    for course_id in course_ids:
+        # Clear the flag first: a lesson change during the recount flags it again
+        if not Course.objects.filter(pk=course_id, progress_stale=True).update(progress_stale=False):
+            continue
+        enrollments += recompute_course_progress(course_id, batch_size)
+        courses += 1
+    elapsed = time.perf_counter() - started
+
+    with _stats_lock:
+        _stats['runs'] += 1
+        _stats['courses_recomputed'] += courses
+        _stats['enrollments_recomputed'] += enrollments
+        _stats['last_run_at'] = now.isoformat()
+        _stats['last_run_seconds'] = elapsed
+    return {'courses': courses, 'enrollments': enrollments, 'seconds': elapsed}
+
+
+progress_job = PeriodicTask(
+    'progress-recompute', recompute_stale_progress,
+    getattr(settings, 'PROGRESS_RECOMPUTE_INTERVAL', 60),
+)
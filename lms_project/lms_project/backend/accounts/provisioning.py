@@ -0,0 +1,243 @@
+"""
+Bulk user provisioning for the admin import endpoint.
+
+Rows come from a CSV upload or a JSON list. Every username and email is
+checked against the database in a single query up front; valid rows are then
+hashed on the process pool (``accounts.hashing.hash_passwords``) and inserted
+with ``bulk_create``, one transaction per chunk of ``BULK_IMPORT_CHUNK_SIZE``.
+``import_users`` yields one result per row, in input order, followed by a
+summary so the view can stream the report while later chunks are still
+being processed.
+"""
+
+import csv
+import io
+import logging
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .hashing import hash_passwords
+from .models import Lecturer, Profile, Student
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FIELDS = ('username', 'email', 'password', 'first_name', 'last_name', 'role')
+IMPORT_ROLES = ('student', 'lecturer')
+
+
+class BulkImportError(ValueError):
+    """Raised when an upload cannot be read as a list of user rows"""
+
+
+def parse_import(request):
+    """Read the rows of a CSV ``file`` upload or a JSON list (bare or under ``users``)"""
+    upload = request.FILES.get('file')
+    if upload is not None:
+        try:
+            text = upload.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise BulkImportError("CSV file must be UTF-8 encoded")
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or 'username' not in reader.fieldnames:
+            raise BulkImportError("CSV header must include username, email and password")
+        rows = list(reader)
+    else:
+        data = request.data
+        rows = data if isinstance(data, list) else data.get('users')
+        if not isinstance(rows, list):
+            raise BulkImportError("Upload a CSV file or a JSON list of users")
+
+    if not rows:
+        raise BulkImportError("No users to import")
+    max_rows = getattr(settings, 'BULK_IMPORT_MAX_ROWS', 10000)
+    if len(rows) > max_rows:
+        raise BulkImportError(f"At most {max_rows} users can be imported at once")
+    return [_clean_row(row) for row in rows]
+
+
+def _clean_row(row):
+    if not isinstance(row, dict):
+        return {field: '' for field in IMPORT_FIELDS}
+    cleaned = {}
+    for field in IMPORT_FIELDS:
+        value = row.get(field)
+        cleaned[field] = '' if value is None else str(value)
+        if field != 'password':
+            cleaned[field] = cleaned[field].strip()
+    cleaned['username'] = User.normalize_username(cleaned['username'])
+    cleaned['email'] = User.objects.normalize_email(cleaned['email'])
+    cleaned['role'] = cleaned['role'].lower() or 'student'
+    return cleaned
+
+
+def validate_rows(rows):
+    """Return a list of error messages for each row (empty when the row is valid)"""
+    errors = [_row_errors(row) for row in rows]
+
+    # Duplicates inside the upload: the first occurrence wins
+    seen_usernames, seen_emails = set(), set()
+    for row, row_errors in zip(rows, errors):
+        if row['username'] in seen_usernames:
+            row_errors.append("Duplicate username in upload")
+        if row['email'] in seen_emails:
+            row_errors.append("Duplicate email in upload")
+        seen_usernames.add(row['username'])
+        seen_emails.add(row['email'])
+
+    # One set-based query for every name and address in the upload
+    usernames = {row['username'] for row in rows if row['username']}
+    emails = {row['email'] for row in rows if row['email']}
+    taken_usernames, taken_emails = set(), set()
+    if usernames or emails:
+        for username, email in User.objects.filter(
+            Q(username__in=usernames) | Q(email__in=emails)
+        ).values_list('username', 'email'):
+            taken_usernames.add(username)
+            taken_emails.add(email)
+
+    for row, row_errors in zip(rows, errors):
+        if row['username'] in taken_usernames:
+            row_errors.append("Username already exists")
+        if row['email'] in taken_emails:
+            row_errors.append("Email already exists")
+    return errors
+
+
+def _row_errors(row):
+    errors = []
+    if not row['username']:
+        errors.append("Username is required")
+    else:
+        try:
+            User.username_validator(row['username'])
+        except ValidationError as e:
+            errors.extend(e.messages)
+    if not row['email']:
+        errors.append("Email is required")
+    else:
+        try:
+            validate_email(row['email'])
+        except ValidationError:
+            errors.append("Enter a valid email address")
+    if not row['password']:
+        errors.append("Password is required")
+    if row['role'] not in IMPORT_ROLES:
+        errors.append(f"Role must be one of: {', '.join(IMPORT_ROLES)}")
+    return errors
+
+
+def _build_user(row, encoded):
+    return User(
+        username=row['username'],
+        email=row['email'],
+        first_name=row['first_name'],
+        last_name=row['last_name'],
+        password=encoded,
+    )
+
+
+def _create_related(users, rows):
+    Profile.objects.bulk_create(
+        [Profile(user=user, role=row['role']) for user, row in zip(users, rows)]
+    )
+    Student.objects.bulk_create(
+        [Student(user=user) for user, row in zip(users, rows) if row['role'] == 'student']
+    )
+    Lecturer.objects.bulk_create(
+        [Lecturer(user=user) for user, row in zip(users, rows) if row['role'] == 'lecturer']
+    )
+
+
+def _insert_chunk(rows, hashes):
+    """Insert a chunk in one transaction; returns the created users"""
+    users = [_build_user(row, encoded) for row, encoded in zip(rows, hashes)]
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        if any(user.pk is None for user in users):
+            # Backends that cannot return ids from a bulk insert
+            ids = dict(User.objects.filter(
+                username__in=[user.username for user in users]
+            ).values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+        _create_related(users, rows)
+    return users
+
+
+def _insert_rows_individually(rows, hashes):
+    """
+    Fallback when a chunk hits a unique constraint, e.g. because an account
+    was created after validation. Each row gets its own savepoint so one
+    conflict does not sink the rest of the chunk.
+    """
+    results = []
+    for row, encoded in zip(rows, hashes):
+        user = _build_user(row, encoded)
+        try:
+            with transaction.atomic():
+                user.save()
+                _create_related([user], [row])
+        except IntegrityError:
+            results.append("Username or email already exists")
+        else:
+            results.append(user)
+    return results
+
+
+def _process_chunk(rows):
+    hashes = hash_passwords([row['password'] for row in rows])
+    try:
+        return _insert_chunk(rows, hashes)
+    except IntegrityError:
+        return _insert_rows_individually(rows, hashes)
+
+
+def import_users(rows, chunk_size=None):
+    """
+    Create accounts for ``rows`` and yield a result dict per row, then a summary.
+
+    Row numbers are 1-based positions in the upload.
+    """
+    chunk_size = chunk_size or getattr(settings, 'BULK_IMPORT_CHUNK_SIZE', 500)
+    errors = validate_rows(rows)
+    summary = {'total': len(rows), 'created': 0, 'failed': 0}
+
+    for start in range(0, len(rows), chunk_size):
+        indexes = range(start, min(start + chunk_size, len(rows)))
+        valid = [i for i in indexes if not errors[i]]
+        outcomes = {}
+        if valid:
+            try:
+                created = _process_chunk([rows[i] for i in valid])
+            except Exception as e:
+                logger.exception("Bulk import chunk starting at row %s failed", start + 1)
+                created = [f"Error creating user: {str(e)}"] * len(valid)
+            outcomes = dict(zip(valid, created))
+
+        for i in indexes:
+            row = rows[i]
+            outcome = outcomes.get(i)
+            if isinstance(outcome, User):
+                summary['created'] += 1
+                yield {
+                    'row': i + 1,
+                    'username': row['username'],
+                    'status': 'created',
+                    'user_id': outcome.pk,
+                    'role': row['role'],
+                }
+            else:
+                summary['failed'] += 1
+                yield {
+                    'row': i + 1,
+                    'username': row['username'],
+                    'status': 'error',
+                    'errors': errors[i] or [outcome],
+                }
+
+    yield {'summary': summary}
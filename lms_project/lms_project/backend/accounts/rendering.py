@@ -0,0 +1,102 @@
+"""
+Server-side rendering of lesson content.
+
+``Lesson.content`` is Markdown. It is rendered to sanitized HTML once, when
+the lesson is saved, and stored with a plain-text excerpt in
+``content_html`` and ``content_excerpt``. ``content_rendered_at`` records
+the ``updated_at`` the stored copy belongs to, so a lesson whose
+``updated_at`` has moved on (for example after a queryset ``update()``) is
+rendered on the fly when read, but not stored: read paths never write.
+Its next save, or the ``render_lessons`` command, stores the new copy.
+
+The HTML is cleaned with bleach: only a fixed set of tags and attributes is
+kept, and links may only use http, https and mailto.
+"""
+
+import html
+import re
+
+import bleach
+import markdown
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+from .models import Lesson
+
+MARKDOWN_EXTENSIONS = ['extra', 'sane_lists']
+
+ALLOWED_TAGS = bleach.sanitizer.ALLOWED_TAGS | {
+    'p', 'br', 'hr', 'pre', 'code', 'span', 'div',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'img', 'del', 'sub', 'sup', 'dl', 'dt', 'dd',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td',
+}
+ALLOWED_ATTRIBUTES = {
+    **bleach.sanitizer.ALLOWED_ATTRIBUTES,
+    'img': ['src', 'alt', 'title'],
+    'code': ['class'],
+    'th': ['align'],
+    'td': ['align'],
+}
+ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def render_markdown(text):
+    """Markdown to sanitized HTML"""
+    # Markdown instances keep per-document state, so one per call
+    rendered = markdown.markdown(text or '', extensions=MARKDOWN_EXTENSIONS)
+    return bleach.clean(
+        rendered, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES,
+        protocols=ALLOWED_PROTOCOLS, strip=True,
+    )
+
+
+def excerpt(content_html, length=None):
+    """The first ``length`` characters of the text of ``content_html``"""
+    length = length or getattr(settings, 'LESSON_EXCERPT_LENGTH', 200)
+    text = _WHITESPACE_RE.sub(' ', html.unescape(strip_tags(content_html))).strip()
+    return Truncator(text).chars(length)
+
+
+def store_rendered(lesson_id, content, updated_at):
+    """
+    Render ``content`` and store it for the lesson version ``updated_at``.
+    Returns ``(content_html, content_excerpt)``.
+    """
+    content_html = render_markdown(content)
+    content_excerpt = excerpt(content_html)
+    # update() leaves updated_at alone; a newer save wins the race
+    Lesson.objects.filter(pk=lesson_id, updated_at=updated_at).update(
+        content_html=content_html, content_excerpt=content_excerpt, content_rendered_at=updated_at,
+    )
+    return content_html, content_excerpt
+
+
+def rendered_content(lesson):
+    """``(content_html, content_excerpt)`` of ``lesson``, rendering it if stale"""
+    if lesson.content_rendered_at == lesson.updated_at:
+        return lesson.content_html, lesson.content_excerpt
+    content_html = render_markdown(lesson.content)
+    return content_html, excerpt(content_html)
+
+
+def stale_excerpts(lesson_ids):
+    """Render the given stale lessons; returns ``{lesson id: excerpt}``"""
+    return {
+        lesson_id: excerpt(render_markdown(content))
+        for lesson_id, content in Lesson.objects.filter(pk__in=lesson_ids).values_list('pk', 'content')
+    }
+
+
+def render_stale_lessons():
+    """Store a rendered copy of every stale lesson; returns how many were rendered"""
+    stale = Lesson.objects.filter(Q(content_rendered_at__isnull=True) | ~Q(content_rendered_at=F('updated_at')))
+    rendered = 0
+    for lesson_id, content, updated_at in stale.values_list('pk', 'content', 'updated_at').iterator():
+        store_rendered(lesson_id, content, updated_at)
+        rendered += 1
+    return rendered
@@ -0,0 +1,171 @@
+"""
+Full-text course search.
+
+On SQLite, courses are indexed in the ``accounts_course_fts`` FTS5 table
+(created by migration 0009, rowid = course id) which signals keep in step
+with Course saves and deletes. Matches are ranked with BM25, weighting the
+title above category and description. A single statement returns the top
+hits, the total and the difficulty/category facet counts. Each facet
+applies the other filter but not its own, so clients can show how many
+results picking another value would give.
+
+Other database backends fall back to ``icontains`` filtering.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Count, Q
+
+from .models import Course
+
+FTS_TABLE = 'accounts_course_fts'
+
+# bm25() column weights: title, description, category
+BM25_WEIGHTS = (10.0, 1.0, 4.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def index_course(course):
+    """Insert or replace ``course`` in the search index"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [course.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, category) VALUES (%s, %s, %s, %s)",
+            [course.pk, course.title, course.description, course.category or ''],
+        )
+
+
+def remove_course(course_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [course_id])
+
+
+def rebuild_index():
+    """Re-index every course, e.g. after bulk_create or raw SQL imports"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, category) "
+            "SELECT id, title, description, COALESCE(category, '') FROM accounts_course"
+        )
+
+
+def match_expression(query):
+    """
+    Turn free text into a safe FTS5 query: every word must match, and the
+    last one is treated as a prefix so results update while typing.
+    """
+    tokens = _TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+_SEARCH_SQL = f"""
+WITH matches AS (
+    SELECT c.id AS id, c.difficulty AS difficulty, c.category AS category,
+           bm25({FTS_TABLE}, %s, %s, %s) AS rank
+    FROM {FTS_TABLE}
+    JOIN accounts_course c ON c.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH %s
+),
+filtered AS (
+    SELECT * FROM matches
+    WHERE (%s IS NULL OR difficulty = %s) AND (%s IS NULL OR category = %s)
+)
+SELECT * FROM (
+    SELECT 'hit' AS kind, id AS value, rank AS score FROM filtered
+    ORDER BY rank, id LIMIT %s OFFSET %s
+)
+UNION ALL
+SELECT 'total', NULL, COUNT(*) FROM filtered
+UNION ALL
+SELECT 'difficulty', difficulty, COUNT(*) FROM matches
+WHERE (%s IS NULL OR category = %s) GROUP BY difficulty
+UNION ALL
+SELECT 'category', category, COUNT(*) FROM matches
+WHERE (%s IS NULL OR difficulty = %s) GROUP BY category
+"""
+
+
+def _search_fts(expression, difficulty, category, limit, offset):
+    params = [
+        *BM25_WEIGHTS, expression,
+        difficulty, difficulty, category, category,
+        limit, offset,
+        category, category,
+        difficulty, difficulty,
+    ]
+    hits, total = [], 0
+    facets = {'difficulty': {}, 'category': {}}
+    with connection.cursor() as cursor:
+        cursor.execute(_SEARCH_SQL, params)
+        for kind, value, score in cursor.fetchall():
+            if kind == 'hit':
+                hits.append((score, value))
+            elif kind == 'total':
+                total = score
+            else:
+                facets[kind][value or ''] = score
+    # UNION ALL does not keep the subquery's order, so rank the page here
+    return [course_id for _, course_id in sorted(hits)], total, facets
+
+
+def _search_icontains(query, difficulty, category, limit, offset):
+    matches = Course.objects.all()
+    for token in _TOKEN_RE.findall(query):
+        matches = matches.filter(
+            Q(title__icontains=token) | Q(description__icontains=token)
+            | Q(category__icontains=token)
+        )
+    filtered = matches
+    if difficulty:
+        filtered = filtered.filter(difficulty=difficulty)
+    if category:
+        filtered = filtered.filter(category=category)
+
+    def facet(queryset, field):
+        return {
+            row[field] or '': row['n']
+            for row in queryset.order_by().values(field).annotate(n=Count('id'))
+        }
+
+    facets = {
+        'difficulty': facet(matches.filter(category=category) if category else matches, 'difficulty'),
+        'category': facet(matches.filter(difficulty=difficulty) if difficulty else matches, 'category'),
+    }
+    ids = list(filtered.order_by('title', 'id').values_list('id', flat=True)[offset:offset + limit])
+    return ids, filtered.count(), facets
+
+
+def search_courses(query, difficulty=None, category=None, limit=20, offset=0):
+    """
+    Search courses for ``query``.
+
+    Returns ``(courses, total, facets)`` where ``courses`` are annotated with
+    catalog stats and ordered by relevance.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return [], 0, {'difficulty': {}, 'category': {}}
+    if fts_available():
+        ids, total, facets = _search_fts(expression, difficulty, category, limit, offset)
+    else:
+        ids, total, facets = _search_icontains(query, difficulty, category, limit, offset)
+
+    courses = Course.objects.with_catalog_stats().in_bulk(ids)
+    return [courses[i] for i in ids if i in courses], total, facets
@@ -50,11 +50,17 @@ class CourseSerializer(serializers.ModelSerializer):
             }
         return None
 
+    # Querysets built with Course.objects.with_catalog_stats() carry both
+    # counts as annotations; plain instances fall back to a COUNT each.
     def get_modules_count(self, obj):
+        if hasattr(obj, 'modules_count'):
+            return obj.modules_count
         return obj.modules.count()
 
     def get_students_count(self, obj):
-        return obj.enrollments.filter(status='enrolled').count()
+        if hasattr(obj, 'students_count'):
+            return obj.students_count
+        return obj.enrollment_set.filter(status='enrolled').count()
 
 class EnrollmentSerializer(serializers.ModelSerializer):
     course = CourseSerializer(read_only=True)
@@ -63,7 +69,7 @@ class EnrollmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Enrollment
         fields = ['id', 'student', 'course', 'enrolled_at', 'status', 
-                 'progress_percentage', 'completion_date', 'grade', 'certificate_issued']
+                 'progress_percentage', 'lessons_completed', 'completion_date', 'grade', 'certificate_issued']
 
 class CourseModuleSerializer(serializers.ModelSerializer):
     lessons_count = serializers.SerializerMethodField()
@@ -0,0 +1,113 @@
+"""
+Cache-first session engine that only writes when something changed.
+
+Sessions are read from the ``SESSION_CACHE_ALIAS`` cache and fall back to
+``django_session``. With ``SESSION_SAVE_EVERY_REQUEST`` the middleware calls
+``save()`` on every response; this store skips the write unless the session
+data differs from what was last persisted or the sliding expiry has moved more than
+``SESSION_REFRESH_THRESHOLD`` seconds past the expiry that was last persisted.
+
+Use it with ``SESSION_ENGINE = 'accounts.session_backend'``.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+KEY_PREFIX = "accounts.session_backend"
+
+logger = logging.getLogger("django.contrib.sessions")
+
+_stats_lock = threading.Lock()
+_write_stats = {'written': 0, 'skipped': 0}
+
+
+def session_write_stats():
+    """Return how many session saves were written or skipped by this process"""
+    with _stats_lock:
+        return dict(_write_stats)
+
+
+def _record(outcome):
+    with _stats_lock:
+        _write_stats[outcome] += 1
+
+
+class SessionStore(CachedDBStore):
+    """
+    Cached, database backed sessions with dirty-only persistence.
+
+    Cache entries hold ``(session_data, persisted_expiry)`` so the store can
+    tell whether the sliding expiry needs refreshing without a DB read.
+    """
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._persisted_expiry = None
+        self._persisted_data = None
+        super().__init__(session_key)
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            # Some backends raise on invalid cache keys; treat as a miss.
+            entry = None
+
+        if entry is not None:
+            data, self._persisted_expiry = entry
+            self._persisted_data = self._snapshot(data)
+            return data
+
+        s = self._get_session_from_db()
+        if not s:
+            return {}
+        data = self.decode(s.session_data)
+        self._persisted_expiry = s.expire_date
+        self._persisted_data = self._snapshot(data)
+        self._cache_set(data, s.expire_date)
+        return data
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        if not must_create and self._can_skip_save():
+            _record('skipped')
+            return
+        super(CachedDBStore, self).save(must_create)
+        self._persisted_expiry = self.get_expiry_date()
+        self._persisted_data = self._snapshot(self._session)
+        self._cache_set(self._session, self._persisted_expiry)
+        _record('written')
+
+    async def asave(self, must_create=False):
+        await sync_to_async(self.save)(must_create)
+
+    def _snapshot(self, data):
+        return self.serializer().dumps(data)
+
+    def _can_skip_save(self):
+        # Compare serialized data rather than trusting ``modified``: views
+        # often re-assign identical values (e.g. LoginView on every login).
+        if self._persisted_expiry is None:
+            return False
+        if self._snapshot(self._session) != self._persisted_data:
+            return False
+        threshold = timedelta(seconds=getattr(settings, 'SESSION_REFRESH_THRESHOLD', 300))
+        return self.get_expiry_date() - self._persisted_expiry < threshold
+
+    def _cache_set(self, data, expiry):
+        try:
+            self._cache.set(
+                self.cache_key, (data, expiry), self.get_expiry_age(expiry=expiry)
+            )
+        except Exception:
+            logger.exception("Error saving to cache (%s)", self._cache)
@@ -0,0 +1,324 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import bump_claims_epoch, token_cache
+from .autocomplete import course_autocomplete
+from .caching import bump_course_version, bump_gradebook_version
+from .enrollment import release_seat
+from .ingestion import enqueue as enqueue_ingestion, remove_text as remove_submission_text
+from .models import (
+    Assignment, AssignmentSubmission, Certificate, Course, CourseModule, Enrollment, Lesson, LessonFile,
+    Profile, Quiz,
+)
+from .progress import lessons_changed
+from .rendering import store_rendered
+from .search import index_course, remove_course
+from .storage import add_reference, drop_reference
+
+
+# Keep cached token and session claims in step with role and active-flag
+# changes. The loaded values are remembered so unrelated saves (last_login,
+# profile edits) do not invalidate anything. ``__dict__`` is read so that
+# deferred fields are never fetched just to take the snapshot.
+@receiver(post_init, sender=User)
+def remember_user_claims(sender, instance, **kwargs):
+    instance._claims_snapshot = instance.__dict__.get('is_active')
+
+
+@receiver(post_init, sender=Profile)
+def remember_profile_claims(sender, instance, **kwargs):
+    instance._claims_snapshot = instance.__dict__.get('role')
+
+
+@receiver(post_save, sender=User)
+def refresh_user_claims(sender, instance, created, **kwargs):
+    if not created and instance._claims_snapshot != instance.is_active:
+        _invalidate_claims(instance.id)
+    instance._claims_snapshot = instance.is_active
+
+
+@receiver(post_save, sender=Profile)
+def refresh_profile_claims(sender, instance, created, **kwargs):
+    if created or instance._claims_snapshot != instance.role:
+        _invalidate_claims(instance.user_id)
+    instance._claims_snapshot = instance.role
+
+
+@receiver(post_delete, sender=User)
+def drop_user_claims(sender, instance, **kwargs):
+    _invalidate_claims(instance.id)
+
+
+@receiver(post_delete, sender=Profile)
+def drop_profile_claims(sender, instance, **kwargs):
+    _invalidate_claims(instance.user_id)
+
+
+# Other processes only learn about a deleted token (logout, expiry) through
+# the shared epoch
+@receiver(post_delete, sender=Token)
+def invalidate_token_claims(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+    bump_claims_epoch(instance.user_id)
+
+
+def _invalidate_claims(user_id):
+    token_cache.invalidate_user(user_id)
+    bump_claims_epoch(user_id)
+
+
+# Versioned response cache (see accounts.caching). Lessons are not part of
+# the catalog payload, so they only invalidate their own course.
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def bump_course(sender, instance, **kwargs):
+    bump_course_version(instance.pk)
+
+
+@receiver(post_save, sender=CourseModule)
+@receiver(post_delete, sender=CourseModule)
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def bump_course_of_related(sender, instance, **kwargs):
+    bump_course_version(instance.course_id)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def bump_course_of_lesson(sender, instance, **kwargs):
+    course_id = (
+        CourseModule.objects.filter(pk=instance.module_id)
+        .values_list('course_id', flat=True).first()
+    )
+    bump_course_version(course_id, catalog=False)
+
+
+# Files, quizzes and assignments appear in the course outline (see accounts.outline)
+@receiver(post_save, sender=LessonFile)
+@receiver(post_delete, sender=LessonFile)
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def bump_course_of_lesson_item(sender, instance, **kwargs):
+    course_id = (
+        Lesson.objects.filter(pk=instance.lesson_id)
+        .values_list('module__course_id', flat=True).first()
+    )
+    bump_course_version(course_id, catalog=False)
+
+
+# Course gradebooks (see accounts.gradebook). Bulk grading bumps the
+# version itself, since bulk_update sends no signals.
+@receiver(post_save, sender=AssignmentSubmission)
+@receiver(post_delete, sender=AssignmentSubmission)
+def bump_gradebook_of_submission(sender, instance, **kwargs):
+    course_id = (
+        Assignment.objects.filter(pk=instance.assignment_id)
+        .values_list('lesson__module__course_id', flat=True).first()
+    )
+    bump_gradebook_version(course_id)
+
+
+# Full-text search index (see accounts.search)
+@receiver(post_save, sender=Course)
+def index_course_for_search(sender, instance, **kwargs):
+    index_course(instance)
+
+
+@receiver(post_delete, sender=Course)
+def remove_course_from_search(sender, instance, **kwargs):
+    remove_course(instance.pk)
+
+
+# In-process autocomplete index (see accounts.autocomplete), applied once
+# the change is committed
+@receiver(post_save, sender=Course)
+def update_course_autocomplete(sender, instance, **kwargs):
+    course_id, title, category = instance.pk, instance.title, instance.category
+    transaction.on_commit(lambda: course_autocomplete.update_course(course_id, title, category))
+
+
+@receiver(post_delete, sender=Course)
+def remove_course_autocomplete(sender, instance, **kwargs):
+    course_id = instance.pk
+    transaction.on_commit(lambda: course_autocomplete.remove_course(course_id))
+
+
+def _count_autocomplete_enrollment(course_id, delta):
+    transaction.on_commit(lambda: course_autocomplete.adjust_enrollments(course_id, delta))
+
+
+# Seat accounting (see accounts.enrollment) and the autocomplete enrollment
+# counts, which both only count rows while their status is 'enrolled'. New
+# rows take the seat claimed for them; here only status changes and deletes
+# move Course.seats_taken.
+@receiver(post_init, sender=Enrollment)
+def remember_enrollment_status(sender, instance, **kwargs):
+    instance._enrollment_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Enrollment)
+def count_enrollment(sender, instance, created, **kwargs):
+    was_counted = not created and instance._enrollment_status == 'enrolled'
+    counted = instance.status == 'enrolled'
+    if counted != was_counted:
+        _count_autocomplete_enrollment(instance.course_id, 1 if counted else -1)
+        if was_counted:
+            release_seat(instance.course_id)
+        elif not created:
+            Course.objects.filter(pk=instance.course_id).update(seats_taken=F('seats_taken') + 1)
+    instance._enrollment_status = instance.status
+
+
+@receiver(post_delete, sender=Enrollment)
+def uncount_enrollment(sender, instance, **kwargs):
+    if instance.status == 'enrolled':
+        release_seat(instance.course_id)
+        _count_autocomplete_enrollment(instance.course_id, -1)
+
+
+# Cached published-lesson totals (see accounts.progress). Only changes that
+# can move a course's total refresh it and flag its enrollments.
+@receiver(post_init, sender=Lesson)
+def remember_lesson_placement(sender, instance, **kwargs):
+    instance._progress_snapshot = (instance.__dict__.get('module_id'), instance.__dict__.get('is_published'))
+
+
+@receiver(post_init, sender=CourseModule)
+def remember_module_placement(sender, instance, **kwargs):
+    instance._progress_snapshot = (instance.__dict__.get('course_id'), instance.__dict__.get('is_published'))
+
+
+@receiver(post_save, sender=Lesson)
+def count_lesson_progress(sender, instance, created, **kwargs):
+    snapshot = (instance.module_id, instance.is_published)
+    if instance.is_published if created else snapshot != instance._progress_snapshot:
+        module_ids = {instance.module_id, instance._progress_snapshot[0]} - {None}
+        for course_id in set(
+            CourseModule.objects.filter(pk__in=module_ids).values_list('course_id', flat=True)
+        ):
+            lessons_changed(course_id)
+    instance._progress_snapshot = snapshot
+
+
+@receiver(post_save, sender=CourseModule)
+def count_module_progress(sender, instance, created, **kwargs):
+    # A new module has no lessons yet
+    snapshot = (instance.course_id, instance.is_published)
+    if not created and snapshot != instance._progress_snapshot:
+        for course_id in {instance.course_id, instance._progress_snapshot[0]} - {None}:
+            lessons_changed(course_id)
+    instance._progress_snapshot = snapshot
+
+
+@receiver(post_delete, sender=Lesson)
+def uncount_lesson_progress(sender, instance, **kwargs):
+    if instance.is_published:
+        course_id = (
+            CourseModule.objects.filter(pk=instance.module_id)
+            .values_list('course_id', flat=True).first()
+        )
+        if course_id is not None:
+            lessons_changed(course_id)
+
+
+@receiver(post_delete, sender=CourseModule)
+def uncount_module_progress(sender, instance, **kwargs):
+    lessons_changed(instance.course_id)
+
+
+# Blob reference counts (see accounts.storage). The stored name is
+# remembered on load; a row whose file field was deferred is not counted,
+# since its previous name is unknown (``gc_blobs --recount`` repairs that).
+BLOB_FIELDS = {LessonFile: 'file', AssignmentSubmission: 'submission_file', Certificate: 'pdf_file'}
+_DEFERRED = object()
+
+
+def _file_name(value):
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=LessonFile)
+@receiver(post_init, sender=AssignmentSubmission)
+@receiver(post_init, sender=Certificate)
+def remember_blob_name(sender, instance, **kwargs):
+    field = BLOB_FIELDS[sender]
+    instance._blob_snapshot = (
+        _file_name(instance.__dict__[field]) if field in instance.__dict__ else _DEFERRED
+    )
+
+
+@receiver(post_save, sender=LessonFile)
+@receiver(post_save, sender=AssignmentSubmission)
+@receiver(post_save, sender=Certificate)
+def count_blob_reference(sender, instance, created, **kwargs):
+    field = BLOB_FIELDS[sender]
+    if instance._blob_snapshot is _DEFERRED:
+        return
+    name = _file_name(instance.__dict__.get(field))
+    previous = '' if created else instance._blob_snapshot
+    if name != previous:
+        add_reference(name)
+        drop_reference(previous)
+    instance._blob_snapshot = name
+
+
+@receiver(post_delete, sender=LessonFile)
+@receiver(post_delete, sender=AssignmentSubmission)
+@receiver(post_delete, sender=Certificate)
+def uncount_blob_reference(sender, instance, **kwargs):
+    if instance._blob_snapshot is not _DEFERRED:
+        drop_reference(instance._blob_snapshot)
+
+
+# Rendered lesson content (see accounts.rendering). Every save moves
+# updated_at; the HTML is only rendered again when the content changed.
+@receiver(post_init, sender=Lesson)
+def remember_lesson_content(sender, instance, **kwargs):
+    instance._content_snapshot = (instance.__dict__.get('content'), instance.__dict__.get('updated_at'))
+
+
+@receiver(post_save, sender=Lesson)
+def render_lesson_content(sender, instance, created, **kwargs):
+    content = instance.__dict__.get('content')
+    if content is None:
+        return
+    previous_content, previous_updated_at = instance._content_snapshot
+    was_fresh = instance.content_rendered_at is not None and instance.content_rendered_at == previous_updated_at
+    if created or content != previous_content or not was_fresh:
+        instance.content_html, instance.content_excerpt = store_rendered(
+            instance.pk, content, instance.updated_at
+        )
+    else:
+        Lesson.objects.filter(pk=instance.pk, updated_at=instance.updated_at).update(
+            content_rendered_at=instance.updated_at
+        )
+    instance.content_rendered_at = instance.updated_at
+    instance._content_snapshot = (content, instance.updated_at)
+
+
+# Submission ingestion (see accounts.ingestion). New submissions and new
+# files or text on existing ones are queued; grading saves are not.
+@receiver(post_init, sender=AssignmentSubmission)
+def remember_submission_content(sender, instance, **kwargs):
+    instance._ingest_snapshot = (
+        _file_name(instance.__dict__.get('submission_file')), instance.__dict__.get('submission_text')
+    )
+
+
+@receiver(post_save, sender=AssignmentSubmission)
+def queue_submission_ingestion(sender, instance, created, **kwargs):
+    snapshot = (_file_name(instance.__dict__.get('submission_file')), instance.__dict__.get('submission_text'))
+    if created or snapshot != instance._ingest_snapshot:
+        enqueue_ingestion(instance)
+    instance._ingest_snapshot = snapshot
+
+
+@receiver(post_delete, sender=AssignmentSubmission)
+def remove_submission_from_index(sender, instance, **kwargs):
+    remove_submission_text(instance.pk)
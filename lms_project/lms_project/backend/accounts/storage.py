@@ -0,0 +1,236 @@
+"""
+Content-addressed, deduplicated storage for course media.
+
+``LessonFile.file``, ``AssignmentSubmission.submission_file`` and
+``Certificate.pdf_file`` are saved through ``ContentAddressedStorage``. A
+file is stored once, at ``blobs/<aa>/<bb>/<sha256><ext>``, however many rows
+point at it. Saving content that is already stored writes nothing.
+
+Each stored file has a ``StoredBlob`` row. Signals count how many of those
+model fields reference it. When the count drops to zero, the blob is left
+in place for ``BLOB_GC_GRACE`` seconds and is then deleted by
+``collect_unreferenced_blobs``. That runs in the background every
+``BLOB_GC_INTERVAL`` seconds and from the ``gc_blobs`` command. The grace
+period covers the gap between storing a file and saving the row that
+refers to it.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .background import PeriodicTask
+
+BLOB_PREFIX = 'blobs'
+INCOMING_DIR = '.incoming'
+
+_stats_lock = threading.Lock()
+_stats = {
+    'runs': 0,
+    'blobs_removed': 0,
+    'bytes_removed': 0,
+    'last_run_at': None,
+}
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(BLOB_PREFIX + '/')
+
+
+def _extension(name):
+    ext = os.path.splitext(name or '')[1].lower()
+    return ext if len(ext) <= 16 and ext[1:].isalnum() else ''
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files after their SHA-256"""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is chosen in _save from the content
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        digest = getattr(content, 'sha256', None)
+        if digest and hasattr(content, 'temporary_file_path'):
+            # Already hashed (e.g. a finished resumable upload): just move it
+            source = content.temporary_file_path()
+        else:
+            source, digest = self._spool(content)
+        size = os.path.getsize(source)
+
+        blob_name = f'{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{_extension(name)}'
+        with transaction.atomic():
+            blob, created = StoredBlob.objects.get_or_create(
+                name=blob_name, defaults={'sha256': digest, 'size': size}
+            )
+            if not created:
+                # Restarts the grace period so the collector leaves it alone
+                StoredBlob.objects.filter(pk=blob.pk).update(last_used_at=timezone.now())
+
+        full_path = self.path(blob_name)
+        if os.path.exists(full_path):
+            os.remove(source)
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            file_move_safe(source, full_path, allow_overwrite=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+        return blob_name
+
+    def _spool(self, content):
+        """Copy ``content`` to a temporary file next to the blobs, hashing it on the way"""
+        incoming = self.path(f'{BLOB_PREFIX}/{INCOMING_DIR}')
+        os.makedirs(incoming, exist_ok=True)
+        path = os.path.join(incoming, uuid.uuid4().hex)
+        hasher = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        with open(path, 'wb') as spool:
+            for chunk in content.chunks():
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                hasher.update(chunk)
+                spool.write(chunk)
+        return path, hasher.hexdigest()
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def get_blob_storage():
+    # Passed to FileField(storage=...) so migrations reference this function
+    return blob_storage
+
+
+def add_reference(name):
+    from .models import StoredBlob
+
+    if is_blob_name(name):
+        StoredBlob.objects.filter(name=name).update(
+            ref_count=F('ref_count') + 1, last_used_at=timezone.now()
+        )
+
+
+def drop_reference(name):
+    from .models import StoredBlob
+
+    if is_blob_name(name):
+        StoredBlob.objects.filter(name=name, ref_count__gt=0).update(
+            ref_count=F('ref_count') - 1, last_used_at=timezone.now()
+        )
+
+
+def referencing_fields():
+    """``(model, field name)`` pairs whose files live in blob storage"""
+    from .models import AssignmentSubmission, Certificate, LessonFile
+
+    return [
+        (LessonFile, 'file'),
+        (AssignmentSubmission, 'submission_file'),
+        (Certificate, 'pdf_file'),
+    ]
+
+
+def recount_references():
+    """Recompute every ``ref_count`` from the referencing tables; returns how many changed"""
+    from .models import StoredBlob
+
+    counts = {}
+    for model, field in referencing_fields():
+        for name in model.objects.filter(**{f'{field}__startswith': BLOB_PREFIX + '/'}).values_list(field, flat=True):
+            counts[name] = counts.get(name, 0) + 1
+    changed = 0
+    for blob in StoredBlob.objects.only('name', 'ref_count').iterator():
+        actual = counts.get(blob.name, 0)
+        if blob.ref_count != actual:
+            StoredBlob.objects.filter(pk=blob.pk).update(ref_count=actual, last_used_at=timezone.now())
+            changed += 1
+    return changed
+
+
+def import_existing_files():
+    """
+    Move files stored before deduplication (``lesson_files/...`` and so on)
+    into blobs and repoint their rows. Returns ``(rows moved, files missing)``.
+    """
+    moved = missing = 0
+    for model, field in referencing_fields():
+        rows = (
+            model.objects.exclude(**{f'{field}__startswith': BLOB_PREFIX + '/'})
+            .exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            .values_list('pk', field)
+        )
+        for pk, old_name in rows.iterator():
+            if not blob_storage.exists(old_name):
+                missing += 1
+                continue
+            with blob_storage.open(old_name) as content:
+                name = blob_storage.save(old_name, content)
+            with transaction.atomic():
+                # A plain update: the signals only count blob names
+                model.objects.filter(pk=pk).update(**{field: name})
+                add_reference(name)
+            blob_storage.delete(old_name)
+            moved += 1
+    return moved, missing
+
+
+def collect_unreferenced_blobs(batch_size=None):
+    """Delete blobs that have had no references for ``BLOB_GC_GRACE`` seconds"""
+    from .models import StoredBlob
+
+    batch_size = batch_size or getattr(settings, 'BLOB_GC_BATCH_SIZE', 500)
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'BLOB_GC_GRACE', 3600))
+    candidates = list(
+        StoredBlob.objects.filter(ref_count=0, last_used_at__lt=cutoff)
+        .values_list('pk', 'name', 'size')[:batch_size]
+    )
+    removed = removed_bytes = 0
+    for pk, name, size in candidates:
+        # The file goes in the same transaction as the row, so a concurrent
+        # save of the same content either revives the row first or recreates both
+        with transaction.atomic():
+            if StoredBlob.objects.filter(pk=pk, ref_count=0, last_used_at__lt=cutoff).delete()[0]:
+                blob_storage.delete(name)
+                removed += 1
+                removed_bytes += size
+    with _stats_lock:
+        _stats['runs'] += 1
+        _stats['blobs_removed'] += removed
+        _stats['bytes_removed'] += removed_bytes
+        _stats['last_run_at'] = now.isoformat()
+    return {'blobs_removed': removed, 'bytes_removed': removed_bytes}
+
+
+def blob_stats():
+    from django.db.models import Count, Sum
+
+    from .models import StoredBlob
+
+    totals = StoredBlob.objects.aggregate(
+        blobs=Count('pk'), bytes=Sum('size'), references=Sum('ref_count')
+    )
+    with _stats_lock:
+        return {
+            'blobs': totals['blobs'],
+            'bytes': totals['bytes'] or 0,
+            'references': totals['references'] or 0,
+            'gc': dict(_stats),
+        }
+
+
+blob_gc = PeriodicTask(
+    'blob-gc', collect_unreferenced_blobs, getattr(settings, 'BLOB_GC_INTERVAL', 3600)
+)
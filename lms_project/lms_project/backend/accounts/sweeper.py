@@ -0,0 +1,91 @@
+"""
+Incremental purge of expired sessions, API tokens and abandoned uploads.
+
+Rows are deleted in small batches, each in its own short transaction, with a
+pause in between so the sweeper never holds SQLite's write lock for long. A
+single run stops after ``SWEEPER_MAX_BATCHES`` batches per table; whatever is
+left is picked up by the next run.
+"""
+
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .background import PeriodicTask
+from .uploads import purge_stale_uploads
+
+_stats_lock = threading.Lock()
+_stats = {
+    'runs': 0,
+    'sessions_removed': 0,
+    'tokens_removed': 0,
+    'uploads_removed': 0,
+    'seconds_spent': 0.0,
+    'last_run_at': None,
+    'last_run_seconds': None,
+}
+
+
+def sweeper_stats():
+    """Return cumulative sweep metrics for this process"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def token_ttl():
+    return timedelta(seconds=getattr(settings, 'AUTH_TOKEN_TTL', 7 * 24 * 3600))
+
+
+def _delete_in_batches(queryset, batch_size, max_batches, pause):
+    removed = 0
+    for _ in range(max_batches):
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        queryset.model.objects.filter(pk__in=pks).delete()
+        removed += len(pks)
+        if len(pks) < batch_size:
+            break
+        time.sleep(pause)
+    return removed
+
+
+def sweep_expired(batch_size=None, max_batches=None, pause=None):
+    """Delete one increment of expired sessions, tokens and uploads; return the counts"""
+    batch_size = batch_size or getattr(settings, 'SWEEPER_BATCH_SIZE', 500)
+    max_batches = max_batches or getattr(settings, 'SWEEPER_MAX_BATCHES', 20)
+    pause = getattr(settings, 'SWEEPER_BATCH_PAUSE', 0.05) if pause is None else pause
+
+    started = time.perf_counter()
+    now = timezone.now()
+    sessions = _delete_in_batches(
+        Session.objects.filter(expire_date__lt=now), batch_size, max_batches, pause
+    )
+    tokens = _delete_in_batches(
+        Token.objects.filter(created__lt=now - token_ttl()), batch_size, max_batches, pause
+    )
+    uploads = purge_stale_uploads(batch_size)
+    elapsed = time.perf_counter() - started
+
+    with _stats_lock:
+        _stats['runs'] += 1
+        _stats['sessions_removed'] += sessions
+        _stats['tokens_removed'] += tokens
+        _stats['uploads_removed'] += uploads
+        _stats['seconds_spent'] += elapsed
+        _stats['last_run_at'] = now.isoformat()
+        _stats['last_run_seconds'] = elapsed
+    return {
+        'sessions_removed': sessions, 'tokens_removed': tokens, 'uploads_removed': uploads,
+        'seconds': elapsed,
+    }
+
+
+sweeper = PeriodicTask(
+    'expiry-sweeper', sweep_expired, getattr(settings, 'SWEEPER_INTERVAL', 300)
+)
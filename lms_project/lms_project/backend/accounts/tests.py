@@ -1,3 +1,1650 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from .authentication import AuthClaims, CachedTokenAuthentication, token_cache
+from .autocomplete import SCAN_THRESHOLD, PrefixIndex, course_autocomplete, load_courses
+from .avatars import avatar_sizes, render_variants
+from .enrollment import bulk_enroll, enroll_student, waitlist_position
+from .ingestion import FTS_TABLE, run_pending
+from .models import (
+    Assignment, AssignmentSubmission, Course, CourseModule, Enrollment, Lecturer, Lesson, LessonFile, Notification,
+    Profile, Quiz, StoredBlob, SubmissionJob, WaitlistEntry,
+)
+from .permissions import IsLecturer, IsLecturerOrSuperAdmin, IsStudent, IsSuperAdmin
+from .progress import record_completion, recompute_course_progress, recompute_stale_progress
+from .provisioning import import_users
+from .rendering import render_stale_lessons, rendered_content, stale_excerpts
+from .search import match_expression, search_courses
+from .session_backend import SessionStore, session_write_stats
+from .storage import blob_storage, collect_unreferenced_blobs
+from .sweeper import sweep_expired, token_ttl
+from .views import course_list
+
+# Process-local stand-ins for the file-based caches, so tests never share state
+LOCAL_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'},
+    'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'responses'},
+}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TokenClaimsCacheTests(TestCase):
+    """Cached token and session claims follow role and active-flag changes"""
+
+    def setUp(self):
+        token_cache.clear()
+        caches['sessions'].clear()
+        self.user = User.objects.create_user('claims-lecturer', password='secret-pass')
+        self.profile = Profile.objects.create(user=self.user, role='lecturer')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def lecturer_courses(self):
+        # Lecturers without a Lecturer row get 404 from the view itself
+        return self.client.get('/api/lecturer/courses/').status_code
+
+    def test_cached_claims_skip_the_database(self):
+        authentication = CachedTokenAuthentication()
+        user, claims = authentication.authenticate_credentials(self.token.key)
+        self.assertEqual((claims.user_id, claims.role, claims.is_active), (self.user.id, 'lecturer', True))
+        with self.assertNumQueries(0):
+            user, claims = authentication.authenticate_credentials(self.token.key)
+            self.assertEqual((user.id, claims.role), (self.user.id, 'lecturer'))
+
+    def test_role_change_invalidates_token_claims(self):
+        self.assertEqual(self.lecturer_courses(), 404)
+        self.profile.role = 'student'
+        self.profile.save()
+        self.assertEqual(self.lecturer_courses(), 403)
+
+    def test_deactivation_invalidates_token_claims(self):
+        self.assertEqual(self.lecturer_courses(), 404)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.lecturer_courses(), 401)
+
+    def test_logout_revokes_the_token(self):
+        self.assertEqual(self.lecturer_courses(), 404)
+        self.assertEqual(self.client.post('/api/logout/').status_code, 200)
+        self.assertEqual(self.lecturer_courses(), 401)
+
+    def test_token_deleted_by_another_process_is_refused(self):
+        self.assertEqual(self.lecturer_courses(), 404)
+        # Only the shared claims epoch reaches this process's cache
+        with mock.patch.object(token_cache, 'invalidate'):
+            self.token.delete()
+        self.assertEqual(self.lecturer_courses(), 401)
+
+    def test_unrelated_saves_keep_cached_claims(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        self.user.first_name = 'Ada'
+        self.user.save()
+        self.profile.save()
+        with self.assertNumQueries(0):
+            authentication.authenticate_credentials(self.token.key)
+
+    def test_role_change_invalidates_session_claims(self):
+        client = APIClient()
+        response = client.post('/api/login/', {'username': 'claims-lecturer', 'password': 'secret-pass'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get('/api/lecturer/courses/').status_code, 404)
+        self.profile.role = 'student'
+        self.profile.save()
+        self.assertEqual(client.get('/api/lecturer/courses/').status_code, 403)
+        self.assertEqual(client.session['role'], 'student')
+
+
+@override_settings(CACHES=LOCAL_CACHES, SESSION_REFRESH_THRESHOLD=300)
+class SessionWriteTests(TestCase):
+    """Sessions are only written when their data or expiry really changed"""
+
+    def setUp(self):
+        caches['sessions'].clear()
+        session = SessionStore()
+        session['user_id'] = 1
+        session['role'] = 'student'
+        session.create()
+        self.session_key = session.session_key
+
+    def saved(self, session):
+        before = session_write_stats()
+        session.save()
+        after = session_write_stats()
+        return after['written'] - before['written'], after['skipped'] - before['skipped']
+
+    def stored(self):
+        return Session.objects.get(session_key=self.session_key)
+
+    def test_loads_from_cache(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(self.session_key)['role'], 'student')
+
+    def test_unchanged_session_is_not_written(self):
+        session = SessionStore(self.session_key)
+        # Re-assigning identical values marks the session modified
+        session['role'] = 'student'
+        with self.assertNumQueries(0):
+            self.assertEqual(self.saved(session), (0, 1))
+
+    def test_changed_data_is_written(self):
+        session = SessionStore(self.session_key)
+        session['role'] = 'lecturer'
+        self.assertEqual(self.saved(session), (1, 0))
+        self.assertEqual(self.stored().get_decoded()['role'], 'lecturer')
+        caches['sessions'].clear()
+        self.assertEqual(SessionStore(self.session_key)['role'], 'lecturer')
+
+    def test_sliding_expiry_is_written_after_threshold(self):
+        persisted = self.stored().expire_date
+        session = SessionStore(self.session_key)
+        session.load()
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=60)):
+            self.assertEqual(self.saved(session), (0, 1))
+        later = timezone.now() + timedelta(seconds=301)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(self.saved(session), (1, 0))
+        self.assertGreater(self.stored().expire_date, persisted)
+
+
+class RolePermissionTests(TestCase):
+    """Role permissions are decided from the claims alone"""
+
+    ALLOWED = {
+        IsSuperAdmin: {'superadmin'},
+        IsLecturer: {'lecturer'},
+        IsStudent: {'student'},
+        IsLecturerOrSuperAdmin: {'lecturer', 'superadmin'},
+    }
+
+    def request_as(self, role, is_active=True):
+        return SimpleNamespace(auth=AuthClaims('key', 1, role, is_active, 0, 0))
+
+    def test_roles(self):
+        for permission, allowed in self.ALLOWED.items():
+            for role in ('superadmin', 'lecturer', 'student', None):
+                with self.subTest(permission=permission.__name__, role=role):
+                    self.assertEqual(
+                        permission().has_permission(self.request_as(role), None), role in allowed
+                    )
+
+    def test_inactive_or_missing_claims_are_refused(self):
+        for permission in self.ALLOWED:
+            with self.subTest(permission=permission.__name__):
+                self.assertFalse(permission().has_permission(self.request_as('superadmin', False), None))
+                self.assertFalse(permission().has_permission(SimpleNamespace(auth=None), None))
+
+    def test_wrong_role_gets_403_without_queries(self):
+        student = User.objects.create_user('permission-student')
+        client = APIClient()
+        client.force_authenticate(student, AuthClaims('key', student.id, 'student', True, 0, 0))
+        for url, message in (
+            ('/api/admin/courses/', 'Admin access required'),
+            ('/api/lecturer/courses/', 'Lecturer access required'),
+        ):
+            with self.subTest(url=url), self.assertNumQueries(0):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 403)
+                self.assertEqual(response.json()['detail'], message)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class AsyncLoginTests(TestCase):
+    """The async login hashes on the bounded pool and sheds load with 503"""
+
+    def setUp(self):
+        token_cache.clear()
+        User.objects.create_user('async-student', password='secret-pass')
+
+    def login(self, password='secret-pass'):
+        return self.client.post(
+            '/api/login-async/', {'username': 'async-student', 'password': password},
+            content_type='application/json',
+        )
+
+    def test_login(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['role'], 'student')
+        self.assertEqual(response.json()['token'], Token.objects.get(user__username='async-student').key)
+        self.assertEqual(self.login('wrong').status_code, 401)
+
+    @override_settings(PASSWORD_HASH_MAX_PENDING=0)
+    def test_busy_pool_returns_503(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Token.objects.exists())
+        response = self.client.post(
+            '/api/signup-async/', {'username': 'async-new', 'email': 'new@example.com', 'password': 'pw'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(User.objects.filter(username='async-new').exists())
+
+
+@override_settings(CACHES=LOCAL_CACHES, AUTH_TOKEN_TTL=7 * 24 * 3600, AUTH_TOKEN_RENEW_AFTER=3600)
+class TokenExpiryTests(TestCase):
+    """Tokens expire after AUTH_TOKEN_TTL and are renewed while in use"""
+
+    def setUp(self):
+        token_cache.clear()
+        caches['sessions'].clear()
+        self.user = User.objects.create_user('expiry-student')
+        Profile.objects.create(user=self.user, role='student')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def age_token(self, age):
+        Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - age)
+
+    def test_expired_token_is_rejected_and_deleted(self):
+        self.age_token(token_ttl() + timedelta(minutes=1))
+        response = self.client.get('/api/my-courses/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'Token has expired.')
+        self.assertFalse(Token.objects.filter(pk=self.token.pk).exists())
+
+    def test_cached_token_expires_too(self):
+        self.assertEqual(self.client.get('/api/my-courses/').status_code, 200)
+        later = timezone.now() + token_ttl() + timedelta(minutes=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(self.client.get('/api/my-courses/').status_code, 401)
+        self.assertFalse(Token.objects.filter(pk=self.token.pk).exists())
+
+    def test_token_in_use_is_renewed(self):
+        self.age_token(timedelta(days=2))
+        self.assertEqual(self.client.get('/api/my-courses/').status_code, 200)
+        self.token.refresh_from_db()
+        self.assertLess(timezone.now() - self.token.created, timedelta(minutes=1))
+        renewed = self.token.created
+        self.client.get('/api/my-courses/')
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.created, renewed)
+
+
+class ExpirySweepTests(TestCase):
+    """The sweeper removes expired sessions and tokens in bounded batches"""
+
+    def setUp(self):
+        now = timezone.now()
+        for n in range(5):
+            Session.objects.create(session_key=f'expired{n}', session_data='', expire_date=now - timedelta(hours=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(hours=1))
+        for n in range(3):
+            Token.objects.create(user=User.objects.create_user(f'sweep-expired{n}'))
+        Token.objects.update(created=now - token_ttl() - timedelta(minutes=1))
+        self.fresh = Token.objects.create(user=User.objects.create_user('sweep-fresh'))
+
+    def test_sweeps_in_batches(self):
+        removed = sweep_expired(batch_size=2, max_batches=2, pause=0)
+        self.assertEqual((removed['sessions_removed'], removed['tokens_removed']), (4, 3))
+        self.assertEqual(Session.objects.count(), 2)
+
+        removed = sweep_expired(batch_size=2, max_batches=2, pause=0)
+        self.assertEqual((removed['sessions_removed'], removed['tokens_removed']), (1, 0))
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+        self.assertEqual(list(Token.objects.values_list('key', flat=True)), [self.fresh.key])
+
+    def test_requests_do_not_start_background_tasks(self):
+        self.client.get('/api/courses/')
+        self.assertFalse([thread for thread in threading.enumerate() if thread.name.startswith('periodic-')])
+
+
+def _hash_inline(passwords):
+    return [make_password(password) for password in passwords]
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+@mock.patch('accounts.provisioning.hash_passwords', _hash_inline)
+class BulkUserImportTests(TestCase):
+    """Bulk imports validate every row and report failures per row"""
+
+    url = '/api/admin/users/bulk/'
+
+    def setUp(self):
+        self.admin = User.objects.create_user('import-admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin, AuthClaims('key', self.admin.id, 'superadmin', True, 0, 0))
+
+    def post(self, data=None, **kwargs):
+        response = self.client.post(self.url, data, **kwargs)
+        if response.status_code != 200:
+            return response.status_code, response.json()
+        return 200, [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def post_csv(self, text, encoding='utf-8'):
+        upload = SimpleUploadedFile('users.csv', text.encode(encoding), content_type='text/csv')
+        return self.post({'file': upload}, format='multipart')
+
+    def test_csv_import(self):
+        status_code, report = self.post_csv(
+            "username,email,password,role\nada,ada@example.com,pw1,lecturer\nbob,bob@example.com,pw2,\n"
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(report[-1], {'summary': {'total': 2, 'created': 2, 'failed': 0}})
+        self.assertEqual([(row['row'], row['username'], row['role']) for row in report[:-1]],
+                         [(1, 'ada', 'lecturer'), (2, 'bob', 'student')])
+        ada = User.objects.select_related('profile').get(username='ada')
+        self.assertTrue(ada.check_password('pw1'))
+        self.assertEqual(ada.profile.role, 'lecturer')
+        self.assertTrue(Lecturer.objects.filter(user=ada).exists())
+
+    def test_rejected_uploads(self):
+        with override_settings(BULK_IMPORT_MAX_ROWS=1):
+            self.assertEqual(self.post([{'username': 'a'}, {'username': 'b'}], format='json')[0], 400)
+        for status_code, body in (
+            self.post({'users': []}, format='json'),
+            self.post({'users': 'ada'}, format='json'),
+            self.post_csv("name,email\nada,ada@example.com\n"),
+            self.post_csv("username,email,password\nzoë,z@example.com,pw\n", encoding='latin-1'),
+        ):
+            self.assertEqual(status_code, 400)
+            self.assertIn('error', body)
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_invalid_rows_are_reported_and_the_rest_created(self):
+        User.objects.create_user('taken', 'taken@example.com')
+        status_code, report = self.post({'users': [
+            {'username': 'ok1', 'email': 'ok1@example.com', 'password': 'pw'},
+            {'username': 'taken', 'email': 'new@example.com', 'password': 'pw'},
+            {'username': 'bad email', 'email': 'nope', 'password': ''},
+            {'username': 'ok1', 'email': 'other@example.com', 'password': 'pw'},
+            {'username': 'ok2', 'email': 'ok2@example.com', 'password': 'pw', 'role': 'superadmin'},
+            'not a row',
+            {'username': 'ok3', 'email': 'ok3@example.com', 'password': 'pw', 'role': 'Student'},
+        ]}, format='json')
+        self.assertEqual(status_code, 200)
+        self.assertEqual(report[-1], {'summary': {'total': 7, 'created': 2, 'failed': 5}})
+        self.assertEqual([row['status'] for row in report[:-1]],
+                         ['created', 'error', 'error', 'error', 'error', 'error', 'created'])
+        self.assertEqual(report[1]['errors'], ['Username already exists'])
+        self.assertEqual(report[2]['errors'], [
+            'Enter a valid username. This value may contain only letters, numbers, and @/./+/-/_ characters.',
+            'Enter a valid email address', 'Password is required',
+        ])
+        self.assertEqual(report[3]['errors'], ['Duplicate username in upload'])
+        self.assertIn('Role must be one of: student, lecturer', report[4]['errors'])
+        self.assertIn('Username is required', report[5]['errors'])
+        self.assertEqual(
+            set(User.objects.filter(username__startswith='ok').values_list('username', flat=True)), {'ok1', 'ok3'}
+        )
+
+    def test_conflict_after_validation_only_fails_that_row(self):
+        rows = [
+            {'username': f'late{n}', 'email': f'late{n}@example.com', 'password': 'pw', 'first_name': '',
+             'last_name': '', 'role': 'student'}
+            for n in range(3)
+        ]
+        with mock.patch('accounts.provisioning.validate_rows', return_value=[[], [], []]):
+            User.objects.create_user('late1')
+            report = list(import_users(rows, chunk_size=2))
+        self.assertEqual(report[-1], {'summary': {'total': 3, 'created': 2, 'failed': 1}})
+        self.assertEqual([row['status'] for row in report[:-1]], ['created', 'error', 'created'])
+        self.assertEqual(report[1]['errors'], ['Username or email already exists'])
+        self.assertEqual(Profile.objects.filter(user__username__startswith='late').count(), 2)
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class CourseCatalogQueryCountTests(TestCase):
+    """The course catalog must not issue queries per course"""
+
+    def setUp(self):
+        cache.clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('catalog-viewer', 'viewer@example.com', 'pw')
+        cls.lecturer = Lecturer.objects.create(
+            user=User.objects.create_user('catalog-lecturer', 'lecturer@example.com', 'pw')
+        )
+        cls.students = [
+            User.objects.create_user(f'catalog-student-{i}', f'student{i}@example.com', 'pw')
+            for i in range(3)
+        ]
+
+    def add_courses(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._add_courses(count)
+
+    def _add_courses(self, count):
+        for i in range(count):
+            course = Course.objects.create(
+                title=f'Course {i}', description='', duration='4 weeks', lecturer=self.lecturer
+            )
+            for order in range(2):
+                CourseModule.objects.create(course=course, title='Module', description='', order=order)
+            for student in self.students:
+                Enrollment.objects.create(student=student, course=course)
+        Enrollment.objects.filter(student=self.students[0]).update(status='dropped')
+
+    def get_course_list(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            response = client.get('/api/courses/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_course_list_view_query_count_is_constant(self):
+        self.add_courses(2)
+        small = self.get_course_list()
+        self.add_courses(20)
+        large = self.get_course_list()
+
+        self.assertEqual(len(small), 2)
+        self.assertEqual(len(large), 22)
+        for course in large:
+            self.assertEqual(course['modules_count'], 2)
+            self.assertEqual(course['students_count'], 2)
+            self.assertEqual(course['lecturer_info']['username'], 'catalog-lecturer')
+
+    def test_course_list_function_view_query_count_is_constant(self):
+        factory = APIRequestFactory()
+        for count in (2, 20):
+            self.add_courses(count)
+            request = factory.get('/api/courses/')
+            force_authenticate(request, user=self.user)
+            with self.assertNumQueries(1):
+                response = course_list(request)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content)[-1]['students_count'], 2)
+
+    def test_unannotated_course_still_serializes_counts(self):
+        from .serializers import CourseSerializer
+
+        self.add_courses(1)
+        data = CourseSerializer(Course.objects.get()).data
+        self.assertEqual(data['modules_count'], 2)
+        self.assertEqual(data['students_count'], 2)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursors walk a listing page by page; bad cursors are a 400"""
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = User.objects.create_user('pagination-admin')
+        cls.claims = AuthClaims('key', admin.id, 'superadmin', True, 0, 0)
+        cls.admin = admin
+        for n in range(7):
+            Course.objects.create(title=f'Course {n}', description='', duration='1 week')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin, self.claims)
+
+    def encode(self, values):
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def test_next_cursor_round_trip(self):
+        ids, cursor, pages = [], None, 0
+        while True:
+            params = {'page_size': 3, **({'cursor': cursor} if cursor else {})}
+            data = self.client.get('/api/admin/courses/', params).json()
+            ids += [course['id'] for course in data['courses']]
+            pages += 1
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids, list(Course.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_rows_added_meanwhile_do_not_shift_pages(self):
+        first = self.client.get('/api/admin/courses/', {'page_size': 3}).json()
+        Course.objects.create(title='Newest', description='', duration='1 week')
+        second = self.client.get('/api/admin/courses/', {'page_size': 3, 'cursor': first['next_cursor']}).json()
+        expected = list(Course.objects.order_by('-created_at', '-id').values_list('id', flat=True))[4:7]
+        self.assertEqual([course['id'] for course in second['courses']], expected)
+
+    def test_legacy_unpaginated_listing(self):
+        data = self.client.get('/api/admin/courses/').json()
+        self.assertEqual(len(data['courses']), 7)
+        self.assertNotIn('next_cursor', data)
+        with override_settings(API_LEGACY_UNPAGINATED=False, API_PAGE_SIZE=5):
+            data = self.client.get('/api/admin/courses/').json()
+        self.assertEqual((len(data['courses']), data['page_size']), (5, 5))
+        self.assertIsNotNone(data['next_cursor'])
+
+    def test_bad_cursors_are_rejected(self):
+        for cursor in (
+            'not base64!', self.encode({'a': 1}), self.encode([1]), self.encode([{}, 1]),
+            self.encode([None, None]), self.encode(['2024-01-01T00:00:00', [1]]), self.encode(['x', 'y']),
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/admin/courses/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class CourseResponseCacheTests(TestCase):
+    """Course reads are served from the versioned response cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course = Course.objects.create(title='Cached', description='', duration='1 week')
+            CourseModule.objects.create(course=self.course, title='Intro', description='', order=1)
+
+    def test_cache_hit_costs_no_queries(self):
+        for url in (f'/api/courses/{self.course.id}/', f'/api/courses/{self.course.id}/modules/'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(second['ETag'], first['ETag'])
+            self.assertIn('Last-Modified', second)
+
+    def test_if_none_match_returns_304(self):
+        url = f'/api/courses/{self.course.id}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_changes_bump_the_version(self):
+        url = f'/api/courses/{self.course.id}/modules/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            module = self.course.modules.get()
+            module.title = 'Renamed'
+            module.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['modules'][0]['title'], 'Renamed')
+
+
+class CourseSearchTests(TestCase):
+    """Full-text course search, its facets and the icontains fallback"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.basics = Course.objects.create(
+            title='Python Basics', description='First steps', duration='4 weeks',
+            difficulty='beginner', category='Programming',
+        )
+        cls.advanced = Course.objects.create(
+            title='Advanced Python', description='Generators and typing', duration='6 weeks',
+            difficulty='advanced', category='Programming',
+        )
+        cls.cooking = Course.objects.create(
+            title='Cooking', description='Recipes written in python-flavoured pseudo code', duration='2 weeks',
+            difficulty='beginner', category='Food',
+        )
+        Course.objects.create(title='Java', description='Classes', duration='6 weeks', category='Programming')
+
+    def search(self, query, **filters):
+        courses, total, facets = search_courses(query, **filters)
+        return [course.id for course in courses], total, facets
+
+    def test_match_expression(self):
+        self.assertEqual(match_expression('Intro to Py'), '"intro" "to" "py"*')
+        # FTS5 syntax in the input is reduced to plain quoted words
+        self.assertEqual(match_expression('python" OR title:NEAR(x*'), '"python" "or" "title" "near" "x"*')
+        self.assertEqual(match_expression('Café'), '"café"*')
+        self.assertIsNone(match_expression(' "*(): '))
+
+    def test_ranked_prefix_search(self):
+        ids, total, facets = self.search('pyth')
+        self.assertEqual(total, 3)
+        # Title matches rank above a description match
+        self.assertEqual(set(ids[:2]), {self.basics.id, self.advanced.id})
+        self.assertEqual(ids[2], self.cooking.id)
+        self.assertEqual(facets, {
+            'difficulty': {'beginner': 2, 'advanced': 1},
+            'category': {'Programming': 2, 'Food': 1},
+        })
+        self.assertEqual(self.search('python basics')[0], [self.basics.id])
+        self.assertEqual(self.search('python" OR')[1], 0)
+
+    def test_facets_ignore_their_own_filter(self):
+        ids, total, facets = self.search('python', difficulty='beginner')
+        self.assertEqual((set(ids), total), ({self.basics.id, self.cooking.id}, 2))
+        self.assertEqual(facets, {
+            'difficulty': {'beginner': 2, 'advanced': 1},
+            'category': {'Programming': 1, 'Food': 1},
+        })
+        ids, total, facets = self.search('python', category='Programming', limit=1, offset=1)
+        self.assertEqual((len(ids), total), (1, 2))
+        self.assertEqual(facets['difficulty'], {'beginner': 1, 'advanced': 1})
+
+    def test_index_follows_saves_and_deletes(self):
+        self.cooking.title = 'Python Cooking'
+        self.cooking.save()
+        self.assertEqual(self.search('pyth', category='Food')[0], [self.cooking.id])
+        self.advanced.delete()
+        self.assertEqual(self.search('advanced')[1], 0)
+
+    def test_icontains_fallback(self):
+        with mock.patch('accounts.search.fts_available', return_value=False):
+            ids, total, facets = self.search('pyth', difficulty='beginner')
+            self.assertEqual(self.search('')[1], 0)
+        # Ordered by title rather than rank
+        self.assertEqual((ids, total), ([self.cooking.id, self.basics.id], 2))
+        self.assertEqual(facets, {
+            'difficulty': {'beginner': 2, 'advanced': 1},
+            'category': {'Programming': 1, 'Food': 1},
+        })
+
+
+class CourseAutocompleteTests(TestCase):
+    """Prefix lookups return the most enrolled matching courses"""
+
+    def index(self, rows, top_k=3):
+        index = PrefixIndex(top_k=top_k)
+        index.build(rows)
+        return index
+
+    def ids(self, index, prefix, limit=None):
+        return [result['id'] for result in index.lookup(prefix, limit)]
+
+    def test_prefix_lookup(self):
+        index = self.index([
+            (1, 'Machine Learning Basics', 'Data Science', 5),
+            (2, 'Deep Learning', 'Data Science', 9),
+            (3, 'Cooking', 'Food', 1),
+        ])
+        self.assertEqual(self.ids(index, 'lear'), [2, 1])
+        self.assertEqual(self.ids(index, 'Machine  LEARN'), [1])
+        self.assertEqual(self.ids(index, 'basics'), [1])
+        self.assertEqual(self.ids(index, 'data sc'), [2, 1])
+        self.assertEqual(self.ids(index, 'earning'), [])
+        self.assertEqual(self.ids(index, '  '), [])
+        self.assertEqual(index.lookup('cook'), [
+            {'id': 3, 'title': 'Cooking', 'category': 'Food', 'enrollments': 1},
+        ])
+
+    def test_top_k_ordering(self):
+        # Enough courses under "c" to use the cached top-k lists
+        rows = [(n, f'Course {n}', '', n % 7) for n in range(1, SCAN_THRESHOLD * 2)]
+        index = self.index(rows)
+        expected = sorted(rows, key=lambda row: (-row[3], row[0]))
+        self.assertEqual(self.ids(index, 'c'), [row[0] for row in expected[:3]])
+        self.assertEqual(self.ids(index, 'course', limit=2), [6, 13])
+        self.assertEqual(self.ids(index, 'course 1'), [13, 104, 111])
+
+        index.adjust_enrollments(500, 10)
+        self.assertEqual(self.ids(index, 'c'), [500, 6, 13])
+        index.remove_course(500)
+        index.adjust_enrollments(6, -6)
+        self.assertEqual(self.ids(index, 'c'), [13, 20, 27])
+        index.update_course(700, 'Compilers', None)
+        index.adjust_enrollments(700, 8)
+        self.assertEqual(self.ids(index, 'co'), [700, 13, 20])
+        self.assertEqual(self.ids(index, 'compil'), [700])
+
+    def test_counts_only_active_enrollments(self):
+        self.addCleanup(course_autocomplete._reset)
+        course = Course.objects.create(title='Autocomplete', description='', duration='1 week')
+        students = [User.objects.create_user(f'autocomplete{n}') for n in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollments = [Enrollment.objects.create(student=student, course=course) for student in students]
+        enrollments[2].status = 'dropped'
+        enrollments[2].save()
+        self.assertEqual(load_courses(10), [(course.id, 'Autocomplete', None, 2)])
+
+        course_autocomplete.build(load_courses(10))
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollments[1].status = 'dropped'
+            enrollments[1].save()
+        self.assertEqual(course_autocomplete.lookup('auto')[0]['enrollments'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollments[2].status = 'enrolled'
+            enrollments[2].save()
+        self.assertEqual(course_autocomplete.lookup('auto')[0]['enrollments'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollments[0].delete()
+        self.assertEqual(course_autocomplete.lookup('auto')[0]['enrollments'], 1)
+
+    def test_enroll_student_counts_a_returning_student(self):
+        self.addCleanup(course_autocomplete._reset)
+        course = Course.objects.create(title='Autocomplete', description='', duration='1 week')
+        student = User.objects.create_user('autocomplete-returning')
+        Enrollment.objects.create(student=student, course=course, status='dropped')
+        course_autocomplete.build(load_courses(10))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(enroll_student(course.id, student.id)[0], 'enrolled')
+        self.assertEqual(course_autocomplete.lookup('auto')[0]['enrollments'], 1)
+
+
+class BulkEnrollTests(TestCase):
+    """Bulk enrollment counts only the students it really enrolled"""
+
+    def setUp(self):
+        self.course = Course.objects.create(title='Cohort', description='', duration='1 week')
+        self.students = [User.objects.create_user(f'cohort-{n}') for n in range(6)]
+        admin = User.objects.create_user('cohort-admin')
+        self.client = APIClient()
+        self.client.force_authenticate(admin, AuthClaims('key', admin.id, 'superadmin', True, 0, 0))
+        self.url = f'/api/courses/{self.course.id}/enroll/bulk/'
+
+    def seats_taken(self):
+        return Course.objects.values_list('seats_taken', flat=True).get(pk=self.course.pk)
+
+    def test_counts_existing_duplicate_and_invalid_ids(self):
+        Enrollment.objects.create(course=self.course, student=self.students[0])
+        Course.objects.filter(pk=self.course.pk).update(seats_taken=1)
+        inactive = User.objects.create_user('cohort-inactive', is_active=False)
+        ids = [s.id for s in self.students] + [self.students[1].id, inactive.id, 'abc']
+        response = self.client.post(self.url, {'user_ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            (data['created'], data['already_enrolled'], data['duplicates'], data['invalid']), (5, 1, 1, 2)
+        )
+        self.assertEqual(self.seats_taken(), 6)
+
+    def test_rows_lost_to_a_concurrent_enroll_are_not_counted(self):
+        bulk_create = Enrollment.objects.bulk_create
+
+        def enrolled_meanwhile(rows, **kwargs):
+            # Another request enrolls one of the students (and claims its own seat) first
+            enroll_student(self.course.id, rows[0].student_id)
+            return bulk_create(rows, **kwargs)
+
+        with mock.patch.object(Enrollment.objects, 'bulk_create', side_effect=enrolled_meanwhile):
+            result = bulk_enroll(self.course, [s.id for s in self.students], chunk_size=4)
+        self.assertEqual((result['created'], result['already_enrolled']), (4, 2))
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 6)
+        self.assertEqual(self.seats_taken(), 6)
+
+    def test_dropped_students_are_enrolled_again(self):
+        Enrollment.objects.create(course=self.course, student=self.students[0], status='dropped')
+        result = bulk_enroll(self.course, [s.id for s in self.students[:3]])
+        self.assertEqual((result['created'], result['already_enrolled']), (3, 0))
+        self.assertEqual(Enrollment.objects.filter(course=self.course, status='enrolled').count(), 3)
+        self.assertEqual(self.seats_taken(), 3)
+
+    def test_waitlist_entries_of_enrolled_students_are_removed(self):
+        Course.objects.filter(pk=self.course.pk).update(seat_capacity=1, waitlist_enabled=True)
+        enroll_student(self.course.id, self.students[0].id)
+        self.assertEqual(enroll_student(self.course.id, self.students[1].id)[0], 'waitlisted')
+        bulk_enroll(self.course, [self.students[1].id])
+        self.assertFalse(WaitlistEntry.objects.filter(course=self.course).exists())
+        self.assertEqual(self.seats_taken(), 2)
+
+
+class SeatLimitTests(TestCase):
+    """Seats are claimed atomically, queued when full and handed back on drop or delete"""
+
+    def setUp(self):
+        self.course = Course.objects.create(title='Seats', description='', duration='1 week', seat_capacity=2)
+        self.students = [User.objects.create_user(f'seat-student-{n}') for n in range(4)]
+
+    def test_admin_update_keeps_concurrent_seat_claims(self):
+        admin = User.objects.create_user('seat-admin')
+        lecturer = Lecturer.objects.create(user=User.objects.create_user('seat-lecturer'))
+        client = APIClient()
+        client.force_authenticate(admin, AuthClaims('key', admin.id, 'superadmin', True, 0, 0))
+        get_lecturer = Lecturer.objects.get
+
+        def enroll_meanwhile(**kwargs):
+            enroll_student(self.course.id, self.students[0].id)
+            return get_lecturer(**kwargs)
+
+        with mock.patch.object(Lecturer.objects, 'get', side_effect=enroll_meanwhile):
+            response = client.put(
+                f'/api/admin/courses/{self.course.id}/', {'title': 'Renamed', 'lecturer_id': lecturer.id},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.title, self.course.lecturer_id), ('Renamed', lecturer.id))
+        self.assertEqual(self.course.seats_taken, 1)
+
+    def drop(self, enrollment):
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment.status = 'dropped'
+            enrollment.save()
+
+    def test_dropped_student_can_enroll_again(self):
+        student = self.students[0]
+        outcome, first = enroll_student(self.course.id, student.id)
+        self.drop(first)
+        outcome, again = enroll_student(self.course.id, student.id)
+        self.assertEqual((outcome, again.id, again.status), ('enrolled', first.id, 'enrolled'))
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.seats_taken, 1)
+
+    def test_dropped_student_is_promoted_from_the_waitlist(self):
+        Course.objects.filter(pk=self.course.pk).update(waitlist_enabled=True)
+        dropped, holder, other = self.students[:3]
+        self.drop(enroll_student(self.course.id, dropped.id)[1])
+        enroll_student(self.course.id, holder.id)
+        enroll_student(self.course.id, other.id)
+        self.assertEqual(enroll_student(self.course.id, dropped.id)[0], 'waitlisted')
+
+        self.drop(Enrollment.objects.get(course=self.course, student=holder))
+        self.assertEqual(Enrollment.objects.get(course=self.course, student=dropped).status, 'enrolled')
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.seats_taken, 2)
+
+    def seats_taken(self):
+        return Course.objects.values_list('seats_taken', flat=True).get(pk=self.course.pk)
+
+    def test_full_course_turns_students_away(self):
+        first, second, third = self.students[:3]
+        self.assertEqual(enroll_student(self.course.id, first.id)[0], 'enrolled')
+        self.assertEqual(enroll_student(self.course.id, first.id)[0], 'existing')
+        self.assertEqual(enroll_student(self.course.id, second.id)[0], 'enrolled')
+        self.assertEqual(enroll_student(self.course.id, third.id), ('full', None))
+        self.assertEqual(self.seats_taken(), 2)
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 2)
+        with self.assertRaises(Course.DoesNotExist):
+            enroll_student(self.course.id + 1000, first.id)
+
+    def test_waitlist_is_promoted_in_order(self):
+        Course.objects.filter(pk=self.course.pk).update(waitlist_enabled=True)
+        for student in self.students[:2]:
+            enroll_student(self.course.id, student.id)
+        outcome, third = enroll_student(self.course.id, self.students[2].id)
+        _, fourth = enroll_student(self.course.id, self.students[3].id)
+        self.assertEqual(outcome, 'waitlisted')
+        self.assertEqual((waitlist_position(third), waitlist_position(fourth)), (1, 2))
+        self.assertEqual(enroll_student(self.course.id, self.students[2].id), ('waitlisted', third))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.get(course=self.course, student=self.students[0]).delete()
+        self.assertTrue(Enrollment.objects.filter(course=self.course, student=self.students[2]).exists())
+        self.assertFalse(Enrollment.objects.filter(course=self.course, student=self.students[3]).exists())
+        self.assertEqual(waitlist_position(fourth), 1)
+        self.assertEqual(self.seats_taken(), 2)
+
+    def test_seats_are_released_on_drop_and_delete(self):
+        first = enroll_student(self.course.id, self.students[0].id)[1]
+        second = enroll_student(self.course.id, self.students[1].id)[1]
+        self.drop(first)
+        self.assertEqual(self.seats_taken(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.seats_taken(), 0)
+        # Deleting a dropped row does not give its seat back twice
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.seats_taken(), 0)
+
+    def test_enroll_endpoint_reports_the_outcome(self):
+        Course.objects.filter(pk=self.course.pk).update(seat_capacity=1, waitlist_enabled=True)
+        responses = []
+        for student in self.students[:2]:
+            client = APIClient()
+            session = client.session
+            session.update({
+                'user_id': student.id, 'username': student.username, 'role': 'student',
+                'is_active': True, 'is_authenticated': True,
+            })
+            session.save()
+            responses.append(client.post('/api/enroll/', {'course_id': self.course.id}, format='json'))
+        self.assertEqual([r.status_code for r in responses], [200, 202])
+        self.assertEqual(responses[1].json()['waitlist_position'], 1)
+
+
+class CourseProgressTests(TestCase):
+    """Completions move stored progress; lesson changes flag the course for a recount"""
+
+    def setUp(self):
+        self.course = Course.objects.create(title='Progress', description='', duration='1 week')
+        self.module = CourseModule.objects.create(
+            course=self.course, title='Module', description='', order=1, is_published=True
+        )
+        self.lessons = [
+            Lesson.objects.create(
+                module=self.module, title=f'Lesson {n}', content='', order=n, is_published=True
+            )
+            for n in range(4)
+        ]
+        self.student = User.objects.create_user('progress-student')
+        self.enrollment = Enrollment.objects.create(course=self.course, student=self.student)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_published_lessons_are_counted(self):
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.published_lessons, self.course.progress_stale), (4, True))
+
+    def test_completion_endpoint(self):
+        url = f'/api/lessons/{self.lessons[0].id}/complete/'
+        data = self.client.post(url).json()
+        self.assertEqual(
+            (data['changed'], data['lessons_completed'], data['total_lessons'], data['progress_percentage']),
+            (True, 1, 4, 25.0),
+        )
+        self.assertFalse(self.client.post(url).json()['changed'])
+        self.client.post(f'/api/lessons/{self.lessons[1].id}/complete/')
+
+        data = self.client.delete(url).json()
+        self.assertEqual((data['changed'], data['lessons_completed'], data['progress_percentage']), (True, 1, 25.0))
+        self.assertFalse(self.client.delete(url).json()['changed'])
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.progress_percentage, 25.0)
+
+    def test_completion_endpoint_checks_lesson_and_enrollment(self):
+        draft = Lesson.objects.create(module=self.module, title='Draft', content='', order=9)
+        self.assertEqual(self.client.post(f'/api/lessons/{draft.id}/complete/').status_code, 404)
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(status='dropped')
+        self.assertEqual(self.client.post(f'/api/lessons/{self.lessons[0].id}/complete/').status_code, 403)
+
+    def test_record_completion(self):
+        enrollment = Enrollment.objects.select_related('course').get(pk=self.enrollment.pk)
+        self.assertEqual(record_completion(enrollment, self.lessons[0].id), (True, 1, 25.0))
+        self.assertEqual(record_completion(enrollment, self.lessons[0].id), (False, 1, 25.0))
+        self.assertEqual(record_completion(enrollment, self.lessons[2].id), (True, 2, 50.0))
+        self.assertEqual(record_completion(enrollment, self.lessons[0].id, completed=False), (True, 1, 25.0))
+        self.assertEqual(record_completion(enrollment, self.lessons[0].id, completed=False), (False, 1, 25.0))
+
+    def test_recompute_after_lessons_change(self):
+        enrollment = Enrollment.objects.select_related('course').get(pk=self.enrollment.pk)
+        for lesson in self.lessons[:2]:
+            record_completion(enrollment, lesson.id)
+        other = Enrollment.objects.create(course=self.course, student=User.objects.create_user('progress-other'))
+        self.lessons[3].is_published = False
+        self.lessons[3].save()
+        self.lessons[0].delete()
+
+        self.assertEqual(recompute_course_progress(self.course.id, batch_size=1), 2)
+        self.enrollment.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.enrollment.lessons_completed, self.enrollment.progress_percentage), (1, 50.0))
+        self.assertEqual((other.lessons_completed, other.progress_percentage), (0, 0.0))
+        self.assertEqual(Course.objects.get(pk=self.course.pk).published_lessons, 2)
+
+        result = recompute_stale_progress()
+        self.assertEqual((result['courses'], result['enrollments']), (1, 2))
+        self.assertFalse(Course.objects.get(pk=self.course.pk).progress_stale)
+
+    def test_admin_update_keeps_lesson_total_and_stale_flag(self):
+        Course.objects.filter(pk=self.course.pk).update(progress_stale=False)
+        admin = User.objects.create_user('progress-admin')
+        client = APIClient()
+        client.force_authenticate(admin, AuthClaims('key', admin.id, 'superadmin', True, 0, 0))
+        lecturer = Lecturer.objects.create(user=User.objects.create_user('progress-lecturer'))
+        get_lecturer = Lecturer.objects.get
+
+        def publish_meanwhile(**kwargs):
+            Lesson.objects.create(module=self.module, title='New', content='', order=5, is_published=True)
+            return get_lecturer(**kwargs)
+
+        with mock.patch.object(Lecturer.objects, 'get', side_effect=publish_meanwhile):
+            client.put(f'/api/admin/courses/{self.course.id}/', {'lecturer_id': lecturer.id}, format='json')
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.published_lessons, self.course.progress_stale), (5, True))
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class CourseOutlineTests(TestCase):
+    """The outline is built in a fixed number of queries and hides drafts from students"""
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course = Course.objects.create(title='Outline', description='', duration='1 week')
+            self.add_module(published=True, lessons=2)
+
+    def add_module(self, published, lessons):
+        module = CourseModule.objects.create(
+            course=self.course, title='Module', description='', order=1, is_published=published
+        )
+        for order in range(lessons):
+            lesson = Lesson.objects.create(
+                module=module, title='Lesson', content='', lesson_type='text', order=order,
+                is_published=order % 2 == 0,
+            )
+            LessonFile.objects.create(lesson=lesson, file='notes.pdf', filename='notes.pdf', file_size=1)
+            Quiz.objects.create(lesson=lesson, title='Quiz', description='', is_published=True)
+
+    def test_query_count_is_constant(self):
+        url = f'/api/courses/{self.course.id}/outline/'
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_module(published=True, lessons=6)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        lessons = [lesson for module in response.json()['modules'] for lesson in module['lessons']]
+        self.assertEqual(len(lessons), 4)
+        self.assertTrue(all(lesson['has_quiz'] and len(lesson['files']) == 1 for lesson in lessons))
+
+    def test_students_only_see_published_content(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_module(published=False, lessons=2)
+        data = self.client.get(f'/api/courses/{self.course.id}/outline/').json()
+        self.assertEqual(data['variant'], 'published')
+        self.assertEqual(len(data['modules']), 1)
+        self.assertEqual([lesson['is_published'] for lesson in data['modules'][0]['lessons']], [True])
+
+    def test_full_outline_is_private(self):
+        url = f'/api/courses/{self.course.id}/outline/'
+        self.assertEqual(self.client.get(url)['Cache-Control'], 'no-cache')
+        admin = User.objects.create_user('outline-admin')
+        client = APIClient()
+        client.force_authenticate(admin, AuthClaims('key', admin.id, 'superadmin', True, 0, 0))
+        response = client.get(url)
+        self.assertEqual(response.json()['variant'], 'full')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+
+class FileDownloadTests(TestCase):
+    """Downloads check access and answer Range and conditional requests"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, FILE_DOWNLOAD_OFFLOAD=None))
+        self.lecturer_user = User.objects.create_user('download-lecturer')
+        course = Course.objects.create(
+            title='Downloads', description='', duration='1 week',
+            lecturer=Lecturer.objects.create(user=self.lecturer_user),
+        )
+        module = CourseModule.objects.create(course=course, title='Module', description='', order=1, is_published=True)
+        lesson = Lesson.objects.create(module=module, title='Lesson', content='', order=1, is_published=True)
+        self.lesson_file = LessonFile(lesson=lesson, filename='notes.txt', file_size=10)
+        self.lesson_file.file.save('notes.txt', ContentFile(b'0123456789'))
+        self.student = User.objects.create_user('download-student')
+        Enrollment.objects.create(course=course, student=self.student)
+        self.url = f'/api/lesson-files/{self.lesson_file.id}/download/'
+
+        assignment = Assignment.objects.create(
+            lesson=Lesson.objects.create(module=module, title='Essay', content='', order=2, is_published=True),
+            title='Essay', description='', instructions='', due_date=timezone.now(),
+        )
+        self.submission = AssignmentSubmission(assignment=assignment, student=self.student)
+        self.submission.submission_file.save('essay.txt', ContentFile(b'my essay'))
+
+    def client_for(self, user, role='student'):
+        client = APIClient()
+        client.force_authenticate(user, AuthClaims('key', user.id, role, True, 0, 0))
+        return client
+
+    def get(self, client=None, url=None, **headers):
+        response = (client or self.client_for(self.student)).get(url or self.url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_whole_file_and_ranges(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body, response['Accept-Ranges']), (200, b'0123456789', 'bytes'))
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        response, body = self.get(HTTP_RANGE='bytes=2-4')
+        self.assertEqual((response.status_code, body, response['Content-Range']), (206, b'234', 'bytes 2-4/10'))
+        self.assertEqual(response['Content-Length'], '3')
+        response, body = self.get(HTTP_RANGE='bytes=7-')
+        self.assertEqual((response.status_code, body), (206, b'789'))
+        response, body = self.get(HTTP_RANGE='bytes=-3')
+        self.assertEqual((body, response['Content-Range']), (b'789', 'bytes 7-9/10'))
+        response, body = self.get(HTTP_RANGE='bytes=5-100')
+        self.assertEqual((body, response['Content-Range']), (b'56789', 'bytes 5-9/10'))
+
+        for header in ('bytes=10-', 'bytes=5-2', 'bytes=-0'):
+            response, _ = self.get(HTTP_RANGE=header)
+            self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+        # Multiple ranges are not served piecewise; the whole file is sent
+        response, body = self.get(HTTP_RANGE='bytes=0-1,4-5')
+        self.assertEqual((response.status_code, body), (200, b'0123456789'))
+
+    def test_conditional_requests(self):
+        response, _ = self.get()
+        etag = response['ETag']
+        response, _ = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response, _ = self.get(HTTP_IF_MATCH='"other"')
+        self.assertEqual(response.status_code, 412)
+        response, body = self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"other"')
+        self.assertEqual((response.status_code, body), (200, b'0123456789'))
+        response, body = self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, body), (206, b'01'))
+
+    def test_lesson_file_access(self):
+        outsider = self.client_for(User.objects.create_user('download-outsider'))
+        self.assertEqual(self.get(outsider)[0].status_code, 403)
+        self.assertEqual(self.get(self.client_for(self.lecturer_user, 'lecturer'))[0].status_code, 200)
+        Lesson.objects.filter(pk=self.lesson_file.lesson_id).update(is_published=False)
+        self.assertEqual(self.get()[0].status_code, 403)
+        self.assertEqual(self.get(self.client_for(self.lecturer_user, 'lecturer'))[0].status_code, 200)
+        other_lecturer = User.objects.create_user('download-other-lecturer')
+        self.assertEqual(self.get(self.client_for(other_lecturer, 'lecturer'))[0].status_code, 403)
+        Enrollment.objects.filter(student=self.student).update(status='dropped')
+        Lesson.objects.filter(pk=self.lesson_file.lesson_id).update(is_published=True)
+        self.assertEqual(self.get()[0].status_code, 403)
+
+    def test_submission_file_access(self):
+        url = f'/api/submissions/{self.submission.id}/download/'
+        response, body = self.get(url=url)
+        self.assertEqual((response.status_code, body), (200, b'my essay'))
+        self.assertIn(f'submission-{self.submission.id}.txt', response['Content-Disposition'])
+        classmate = self.client_for(User.objects.create_user('download-classmate'))
+        self.assertEqual(self.get(classmate, url)[0].status_code, 403)
+        self.assertEqual(self.get(self.client_for(self.lecturer_user, 'lecturer'), url)[0].status_code, 200)
+
+    @override_settings(FILE_DOWNLOAD_OFFLOAD='x-accel', FILE_DOWNLOAD_ACCEL_PREFIX='/protected/')
+    def test_offloaded_download_names_the_file(self):
+        response, body = self.get(HTTP_RANGE='bytes=2-4')
+        self.assertEqual((response.status_code, body), (200, b''))
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.lesson_file.file.name)
+
+
+class ResumableUploadTests(TestCase):
+    """Chunks are accepted in order only, and completion is verified and happens once"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, UPLOAD_CHUNK_SIZE=4))
+        self.lecturer_user = User.objects.create_user('upload-lecturer')
+        self.course = Course.objects.create(
+            title='Uploads', description='', duration='1 week',
+            lecturer=Lecturer.objects.create(user=self.lecturer_user),
+        )
+        module = CourseModule.objects.create(course=self.course, title='Module', description='', order=1)
+        self.lesson = Lesson.objects.create(module=module, title='Essay', content='', lesson_type='assignment', order=1)
+        self.assignment = Assignment.objects.create(
+            lesson=self.lesson, title='Essay', description='', instructions='', due_date=timezone.now()
+        )
+        self.student = User.objects.create_user('upload-student')
+        Enrollment.objects.create(course=self.course, student=self.student)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student, AuthClaims('key', self.student.id, 'student', True, 0, 0))
+
+    def start(self, data=b'hello world', purpose='submission', target_id=None, client=None):
+        response = (client or self.client).post('/api/uploads/', {
+            'purpose': purpose, 'target_id': target_id or self.assignment.id,
+            'filename': 'essay.txt', 'size': len(data),
+        }, format='json')
+        return response
+
+    def put(self, upload_id, index, data, **headers):
+        return self.client.put(
+            f'/api/uploads/{upload_id}/chunks/{index}/', data, content_type='application/octet-stream', **headers
+        )
+
+    def upload(self, data):
+        upload_id = self.start(data).json()['upload_id']
+        for index in range(0, len(data), 4):
+            self.assertEqual(self.put(upload_id, index // 4, data[index:index + 4]).status_code, 200)
+        return upload_id
+
+    def complete(self, upload_id, data):
+        return self.client.post(
+            f'/api/uploads/{upload_id}/complete/', {'sha256': hashlib.sha256(data).hexdigest()}, format='json'
+        )
+
+    def test_chunks_must_arrive_in_order(self):
+        upload_id = self.start().json()['upload_id']
+        response = self.put(upload_id, 1, b'o wo')
+        self.assertEqual((response.status_code, response.json()['next_chunk']), (409, 0))
+        self.assertEqual(self.put(upload_id, 0, b'hell').json()['next_chunk'], 1)
+        # Re-sending an acknowledged chunk changes nothing
+        response = self.put(upload_id, 0, b'XXXX')
+        self.assertEqual((response.status_code, response.json()['bytes_received']), (200, 4))
+        self.assertEqual(self.put(upload_id, 1, b'o w', HTTP_X_CHUNK_SHA256='0' * 64).status_code, 400)
+        self.assertEqual(self.put(upload_id, 1, b'o wo', HTTP_X_CHUNK_SHA256='0' * 64).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').json()['next_chunk'], 1)
+
+    def test_complete_verifies_checksum_and_happens_once(self):
+        upload_id = self.upload(b'hello world')
+        response = self.client.post(f'/api/uploads/{upload_id}/complete/', {'sha256': 'f' * 64}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['sha256'], hashlib.sha256(b'hello world').hexdigest())
+
+        response = self.complete(upload_id, b'hello world')
+        self.assertEqual(response.status_code, 200)
+        submission = AssignmentSubmission.objects.get(pk=response.json()['submission']['id'])
+        with submission.submission_file.open('rb') as handle:
+            self.assertEqual(handle.read(), b'hello world')
+        self.assertEqual(self.complete(upload_id, b'hello world').status_code, 409)
+        self.assertEqual(AssignmentSubmission.objects.count(), 1)
+
+    def test_missing_chunks_block_completion(self):
+        upload_id = self.start().json()['upload_id']
+        self.put(upload_id, 0, b'hell')
+        response = self.complete(upload_id, b'hello world')
+        self.assertEqual((response.status_code, response.json()['next_chunk']), (409, 1))
+
+    def test_graded_submission_is_not_overwritten(self):
+        graded = AssignmentSubmission.objects.create(
+            assignment=self.assignment, student=self.student, submission_text='first',
+            grade=80, feedback='Good', status='graded', graded_at=timezone.now(), graded_by=self.lecturer_user,
+        )
+        response = self.complete(self.upload(b'second try'), b'second try')
+        self.assertNotEqual(response.json()['submission']['id'], graded.id)
+        graded.refresh_from_db()
+        self.assertEqual((graded.status, graded.grade, bool(graded.submission_file)), ('graded', 80, False))
+
+        # An ungraded resubmission replaces the file of the latest ungraded one
+        latest = response.json()['submission']['id']
+        response = self.complete(self.upload(b'third try'), b'third try')
+        self.assertEqual(response.json()['submission']['id'], latest)
+        self.assertEqual(AssignmentSubmission.objects.count(), 2)
+
+    def test_upload_targets_are_checked(self):
+        other = Course.objects.create(title='Other', description='', duration='1 week')
+        module = CourseModule.objects.create(course=other, title='Module', description='', order=1)
+        other_assignment = Assignment.objects.create(
+            lesson=Lesson.objects.create(module=module, title='Other', content='', order=1),
+            title='Other', description='', instructions='', due_date=timezone.now(),
+        )
+        self.assertEqual(self.start(target_id=other_assignment.id).status_code, 403)
+        self.assertEqual(self.start(purpose='lesson_file', target_id=self.lesson.id).status_code, 403)
+        self.assertEqual(self.start(purpose='profile_picture').status_code, 201)
+
+        lecturer = APIClient()
+        lecturer.force_authenticate(
+            self.lecturer_user, AuthClaims('key', self.lecturer_user.id, 'lecturer', True, 0, 0)
+        )
+        self.assertEqual(self.start(purpose='lesson_file', target_id=self.lesson.id, client=lecturer).status_code, 201)
+        self.assertEqual(
+            self.start(purpose='lesson_file', target_id=other_assignment.lesson_id, client=lecturer).status_code, 403
+        )
+
+        Enrollment.objects.filter(student=self.student).update(status='dropped')
+        self.assertEqual(self.start().status_code, 403)
+        # Sessions belong to their owner
+        upload_id = self.start(purpose='profile_picture').json()['upload_id']
+        self.assertEqual(lecturer.get(f'/api/uploads/{upload_id}/').status_code, 404)
+
+
+class BlobStorageTests(TestCase):
+    """Identical uploads share one blob, which is collected once nothing refers to it"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, BLOB_GC_GRACE=0))
+        course = Course.objects.create(title='Blobs', description='', duration='1 week')
+        module = CourseModule.objects.create(course=course, title='Module', description='', order=1)
+        self.lesson = Lesson.objects.create(module=module, title='Lesson', content='', order=1)
+
+    def add_file(self, content):
+        lesson_file = LessonFile(lesson=self.lesson, filename='slides.pdf', file_size=len(content))
+        lesson_file.file.save('slides.pdf', ContentFile(content))
+        return lesson_file
+
+    def test_duplicates_are_stored_once_and_collected(self):
+        first, second = self.add_file(b'deck'), self.add_file(b'deck')
+        self.assertEqual(first.file.name, second.file.name)
+        blob = StoredBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+
+        first.delete()
+        self.assertEqual(collect_unreferenced_blobs()['blobs_removed'], 0)
+        second.file.save('slides.pdf', ContentFile(b'new deck'))
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 0)
+        self.assertEqual(collect_unreferenced_blobs()['blobs_removed'], 1)
+        self.assertFalse(blob_storage.exists(blob.name))
+        self.assertTrue(blob_storage.exists(second.file.name))
+
+
+class AvatarVariantTests(TestCase):
+    """Uploads become small square WebP and JPEG files without metadata"""
+
+    def test_variants_are_square_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        upload = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
+        self.addCleanup(os.remove, upload.name)
+        Image.new('RGB', (1200, 800), 'red').save(upload, 'JPEG', exif=exif.tobytes())
+        upload.close()
+
+        variants = render_variants(upload.name)
+        self.assertEqual(set(variants), {(size, fmt) for size in avatar_sizes() for fmt in ('webp', 'jpeg')})
+        for (size, fmt), data in variants.items():
+            with Image.open(io.BytesIO(data)) as image:
+                self.assertEqual(image.format, fmt.upper())
+                self.assertEqual(image.size, (size, size))
+                self.assertFalse(image.getexif())
+
+
+class LessonRenderingTests(TestCase):
+    """Lesson Markdown is rendered and sanitized on save, not on every read"""
+
+    def setUp(self):
+        course = Course.objects.create(title='Rendering', description='', duration='1 week')
+        module = CourseModule.objects.create(course=course, title='Module', description='', order=1)
+        self.lesson = Lesson.objects.create(
+            module=module, title='Lesson', lesson_type='text', order=1,
+            content='# Intro\n\n*Read* this <script>alert(1)</script> [link](javascript:alert(1))',
+        )
+
+    def test_content_is_rendered_and_sanitized(self):
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.content_rendered_at, self.lesson.updated_at)
+        self.assertIn('<h1>Intro</h1>', self.lesson.content_html)
+        self.assertNotIn('<script', self.lesson.content_html)
+        self.assertNotIn('javascript:', self.lesson.content_html)
+        self.assertEqual(self.lesson.content_excerpt, 'Intro Read this alert(1) link')
+
+    def test_only_content_changes_render_again(self):
+        with mock.patch('accounts.signals.store_rendered') as store_rendered:
+            self.lesson.title = 'Renamed'
+            self.lesson.save()
+        store_rendered.assert_not_called()
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.content_rendered_at, self.lesson.updated_at)
+
+    def test_stale_lessons_are_not_stored_on_read(self):
+        Lesson.objects.filter(pk=self.lesson.pk).update(content='**Changed**', updated_at=timezone.now())
+        lesson = Lesson.objects.get(pk=self.lesson.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(rendered_content(lesson), ('<p><strong>Changed</strong></p>', 'Changed'))
+        with self.assertNumQueries(1):
+            self.assertEqual(stale_excerpts([lesson.pk]), {lesson.pk: 'Changed'})
+        self.assertNotEqual(Lesson.objects.get(pk=lesson.pk).content_rendered_at, lesson.updated_at)
+
+        self.assertEqual(render_stale_lessons(), 1)
+        lesson.refresh_from_db()
+        self.assertEqual(lesson.content_rendered_at, lesson.updated_at)
+        self.assertEqual(lesson.content_html, '<p><strong>Changed</strong></p>')
+        self.assertEqual(render_stale_lessons(), 0)
+
+
+class AssignmentLookupQueryCountTests(TestCase):
+    """Course and profile assignment lists use a fixed number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('assignment-student', 'student@example.com', 'pw')
+        Profile.objects.create(user=cls.student, role='student')
+
+    def add_course(self, assignments):
+        course = Course.objects.create(title='Assignments', description='', duration='1 week')
+        module = CourseModule.objects.create(course=course, title='Module', description='', order=1)
+        for order in range(assignments):
+            lesson = Lesson.objects.create(
+                module=module, title='Lesson', content='', lesson_type='assignment', order=order
+            )
+            assignment = Assignment.objects.create(
+                lesson=lesson, title=f'Assignment {order}', description='', instructions='',
+                due_date=timezone.now(),
+            )
+            if order % 2 == 0:
+                AssignmentSubmission.objects.create(assignment=assignment, student=self.student)
+        Enrollment.objects.create(student=self.student, course=course)
+        return course
+
+    def get(self, url, queries):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        with self.assertNumQueries(queries):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_course_assignments(self):
+        course = self.add_course(2)
+        self.assertEqual(len(self.get(f'/api/courses/{course.id}/assignments/', 2)['assignments']), 2)
+        course = self.add_course(20)
+        self.assertEqual(len(self.get(f'/api/courses/{course.id}/assignments/', 2)['assignments']), 20)
+
+    def test_lecturer_assignments(self):
+        lecturer_user = User.objects.create_user('assignment-lecturer', 'lecturer@example.com', 'pw')
+        lecturer = Lecturer.objects.create(user=lecturer_user)
+        client = APIClient()
+        client.force_authenticate(
+            lecturer_user, AuthClaims('key', lecturer_user.id, 'lecturer', True, 0, 0)
+        )
+        for courses in (1, 4):
+            for _ in range(courses):
+                Course.objects.filter(pk=self.add_course(8).pk).update(lecturer=lecturer)
+            with self.assertNumQueries(3):
+                response = client.get('/api/lecturer/assignments/')
+        assignments = response.json()['assignments']
+        self.assertEqual(len(assignments), 40)
+        self.assertEqual({a['submission_count'] for a in assignments}, {0, 1})
+        self.assertEqual(sum(a['ungraded_count'] for a in assignments), 20)
+        self.assertEqual(sum(len(a['recent_submissions']) for a in assignments), 20)
+
+    def test_profile_assignments(self):
+        self.add_course(2)
+        self.assertEqual(len(self.get('/api/profile/', 4)['assignments']), 2)
+        for _ in range(7):
+            self.add_course(20)
+        assignments = self.get('/api/profile/', 4)['assignments']
+        self.assertEqual(len(assignments), 142)
+        self.assertEqual(
+            sum(assignment['submission']['status'] == 'submitted' for assignment in assignments), 71
+        )
+
+
+class SubmissionIngestionTests(TestCase):
+    """New submissions are queued and processed from the job table"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        course = Course.objects.create(title='Ingestion', description='', duration='1 week')
+        module = CourseModule.objects.create(course=course, title='Module', description='', order=1)
+        lesson = Lesson.objects.create(module=module, title='Essay', content='', lesson_type='assignment', order=1)
+        self.assignment = Assignment.objects.create(
+            lesson=lesson, title='Essay', description='', instructions='', due_date=timezone.now()
+        )
+
+    def docx(self, *paragraphs):
+        body = ''.join(f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>' for text in paragraphs)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as docx:
+            docx.writestr('word/document.xml', (
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:body>{body}</w:body></w:document>'
+            ))
+        return ContentFile(archive.getvalue())
+
+    def test_text_is_extracted_and_duplicates_flagged(self):
+        first = AssignmentSubmission(assignment=self.assignment, student=User.objects.create_user('first'))
+        first.submission_file.save('essay.docx', self.docx('The mitochondria', 'is the powerhouse.'))
+        copy = AssignmentSubmission.objects.create(
+            assignment=self.assignment, student=User.objects.create_user('second'),
+            submission_text='the Mitochondria is the  powerhouse',
+        )
+        self.assertEqual(first.processing_status, 'queued')
+        self.assertEqual(SubmissionJob.objects.filter(status='queued').count(), 2)
+
+        self.assertEqual(run_pending(), 2)
+        first.refresh_from_db()
+        copy.refresh_from_db()
+        self.assertEqual(first.extracted.text, 'The mitochondria\nis the powerhouse.')
+        self.assertEqual((first.processing_status, first.word_count), ('processed', 5))
+        self.assertEqual(copy.fingerprint, first.fingerprint)
+        self.assertEqual(copy.duplicate_of_id, first.id)
+        job = SubmissionJob.objects.get(submission=first)
+        self.assertEqual(set(job.timings), {'extract', 'count', 'fingerprint', 'screen', 'index'})
+
+        copy.grade = 10
+        copy.save()
+        self.assertFalse(SubmissionJob.objects.filter(status='queued').exists())
+
+    @override_settings(SUBMISSION_DOCX_MAX_XML_BYTES=2000)
+    def test_oversized_document_fails_without_retry(self):
+        submission = AssignmentSubmission(assignment=self.assignment, student=User.objects.create_user('bomb'))
+        submission.submission_file.save('bomb.docx', self.docx('a' * 5000))
+        with self.assertLogs('accounts.ingestion', 'INFO') as logs:
+            run_pending()
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        submission.refresh_from_db()
+        self.assertEqual(submission.processing_status, 'failed')
+        job = SubmissionJob.objects.get(submission=submission)
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+
+    def test_requests_do_not_start_workers(self):
+        self.client.get('/api/courses/')
+        AssignmentSubmission.objects.create(
+            assignment=self.assignment, student=User.objects.create_user('unprocessed'), submission_text='text',
+        )
+        self.assertFalse([thread for thread in threading.enumerate() if thread.name.startswith('submission-ingest')])
+        self.assertEqual(SubmissionJob.objects.filter(status='queued').count(), 1)
+
+    def test_deleted_submission_leaves_the_index(self):
+        submission = AssignmentSubmission.objects.create(
+            assignment=self.assignment, student=User.objects.create_user('indexed'),
+            submission_text='photosynthesis',
+        )
+        run_pending()
+
+        def matches():
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'photosynthesis'")
+                return [row[0] for row in cursor.fetchall()]
+
+        self.assertEqual(matches(), [submission.pk])
+        submission.delete()
+        self.assertEqual(matches(), [])
+
+
+class BulkGradingTests(TestCase):
+    """Many submissions are graded and notified in a fixed number of queries"""
+
+    def setUp(self):
+        lecturer_user = User.objects.create_user('grading-lecturer')
+        course = Course.objects.create(
+            title='Grading', description='', duration='1 week',
+            lecturer=Lecturer.objects.create(user=lecturer_user),
+        )
+        module = CourseModule.objects.create(course=course, title='Module', description='', order=1)
+        lesson = Lesson.objects.create(module=module, title='Essay', content='', lesson_type='assignment', order=1)
+        self.assignment = Assignment.objects.create(
+            lesson=lesson, title='Essay', description='', instructions='', due_date=timezone.now(), max_points=50
+        )
+        self.submissions = [
+            AssignmentSubmission.objects.create(
+                assignment=self.assignment, student=User.objects.create_user(f'graded-{n}')
+            )
+            for n in range(30)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(lecturer_user, AuthClaims('key', lecturer_user.id, 'lecturer', True, 0, 0))
+        self.url = f'/api/assignments/{self.assignment.id}/grades/'
+
+    def test_grades_are_applied_and_notified(self):
+        grades = {str(s.id): {'grade': 40, 'feedback': 'Good'} for s in self.submissions}
+        with self.assertNumQueries(6):
+            response = self.client.post(self.url, {'grades': grades}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['graded'], response.json()['notified']), (30, 30))
+        self.assertEqual(
+            AssignmentSubmission.objects.filter(status='graded', grade=40, graded_by__isnull=False).count(), 30
+        )
+        self.assertEqual(Notification.objects.filter(notification_type='grade_posted').count(), 30)
+
+        response = self.client.post(self.url, grades, format='json')
+        self.assertEqual((response.json()['graded'], response.json()['unchanged']), (0, 30))
+        self.assertEqual(Notification.objects.count(), 30)
+
+    def test_invalid_grades_reject_the_whole_request(self):
+        first, second = self.submissions[:2]
+        lesson = Lesson.objects.create(
+            module=self.assignment.lesson.module, title='Other', content='', lesson_type='assignment', order=2
+        )
+        other = AssignmentSubmission.objects.create(
+            assignment=Assignment.objects.create(
+                lesson=lesson, title='Other', description='', instructions='', due_date=timezone.now()
+            ),
+            student=first.student,
+        )
+        response = self.client.post(self.url, {
+            str(first.id): {'grade': 10},
+            str(second.id): {'grade': 51},
+            str(other.id): {'grade': 5},
+            'x': {'grade': 'A'},
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {str(second.id), str(other.id), 'x'})
+        self.assertFalse(AssignmentSubmission.objects.filter(status='graded').exists())
+        self.assertFalse(Notification.objects.exists())
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class GradebookTests(TestCase):
+    """The gradebook matrix holds each student's latest grade and is cached until grades change"""
+
+    def setUp(self):
+        cache.clear()
+        lecturer_user = User.objects.create_user('gradebook-lecturer')
+        self.course = Course.objects.create(
+            title='Gradebook', description='', duration='1 week',
+            lecturer=Lecturer.objects.create(user=lecturer_user),
+        )
+        module = CourseModule.objects.create(course=self.course, title='Module', description='', order=1)
+        self.assignments = [
+            Assignment.objects.create(
+                lesson=Lesson.objects.create(
+                    module=module, title=f'Lesson {order}', content='', lesson_type='assignment', order=order
+                ),
+                title=f'Assignment {order}', description='', instructions='', due_date=timezone.now(),
+                max_points=points,
+            )
+            for order, points in ((1, 10), (2, 30))
+        ]
+        self.students = [User.objects.create_user(name) for name in ('ann', 'bob', 'cid')]
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=self.course)
+        self.client = APIClient()
+        self.client.force_authenticate(lecturer_user, AuthClaims('key', lecturer_user.id, 'lecturer', True, 0, 0))
+        self.url = f'/api/courses/{self.course.id}/gradebook/'
+
+    def grade(self, student, assignment, grade):
+        return AssignmentSubmission.objects.create(assignment=assignment, student=student, grade=grade)
+
+    def test_matrix_and_statistics(self):
+        ann, bob, cid = self.students
+        first, second = self.assignments
+        self.grade(ann, first, 2)
+        self.grade(ann, first, 10)  # the resubmission counts
+        self.grade(bob, first, 6)
+        self.grade(ann, second, 15)
+        AssignmentSubmission.objects.create(assignment=second, student=cid)  # not graded yet
+
+        data = self.client.get(self.url).json()
+        self.assertEqual([s['grades'] for s in data['students']], [[10.0, 15.0], [6.0, None], [None, None]])
+        first_stats = data['assignments'][0]['stats']
+        self.assertEqual((first_stats['count'], first_stats['mean'], first_stats['median']), (2, 8.0, 8.0))
+        self.assertEqual(first_stats['histogram'], [0, 0, 0, 0, 0, 0, 1, 0, 0, 1])
+        self.assertEqual(data['students'][0]['final'], {'current': 62.5, 'overall': 62.5})
+        self.assertEqual(data['students'][1]['final'], {'current': 60.0, 'overall': 15.0})
+        self.assertIsNone(data['students'][2]['final']['current'])
+        self.assertEqual(data['final_stats']['overall']['count'], 3)
+
+    def test_cached_until_grades_change(self):
+        submission = self.grade(self.students[0], self.assignments[0], 4)
+        self.client.get(self.url)
+        with self.assertNumQueries(1):  # only the course lookup for the permission check
+            etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/assignments/{self.assignments[0].id}/grades/', {submission.id: {'grade': 9}}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['students'][0]['grades'][0], 9.0)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
@@ -0,0 +1,252 @@
+"""
+Resumable chunked uploads.
+
+The protocol has three steps:
+
+1. ``POST uploads/`` declares the purpose, target, filename and size. It
+   returns a session id and the chunk size.
+2. ``PUT uploads/<id>/chunks/<n>/`` sends chunk ``n`` as the raw request body.
+3. ``POST uploads/<id>/complete/`` attaches the file to its lesson or
+   submission, or queues it as the profile picture (see accounts.avatars).
+
+Chunks must arrive in order. ``GET uploads/<id>/`` reports
+``next_chunk``, so an interrupted client resumes from the last
+acknowledged chunk. Re-sending an acknowledged chunk is a no-op.
+
+Request bodies are copied to a part file under ``UPLOAD_TEMP_DIR`` in
+small blocks and never held in memory. The SHA-256 of the file is kept up
+to date as chunks arrive. The running hash lives in this process, and if a
+chunk lands on another worker, that worker re-reads the bytes already
+stored once to catch up. On completion the part file is moved (not
+copied) into storage.
+"""
+
+import hashlib
+import os
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .avatars import AvatarBusy, AvatarError, accept_avatar
+from .models import AssignmentSubmission, LessonFile, Profile, UploadSession
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """A request that does not fit the session, with the HTTP status to answer"""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+class _PartFile(File):
+    # FileSystemStorage moves files that expose a temporary path instead of copying them
+    def temporary_file_path(self):
+        return self.name
+
+
+def temp_dir():
+    path = Path(getattr(settings, 'UPLOAD_TEMP_DIR', None) or Path(settings.MEDIA_ROOT) / '.uploads')
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def part_path(session):
+    return temp_dir() / f'{session.pk}.part'
+
+
+# session id -> (bytes hashed, hasher); only ever touched under _hashers_lock
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def _take_hasher(session, offset):
+    """The running SHA-256 of the first ``offset`` bytes of the part file"""
+    with _hashers_lock:
+        entry = _hashers.pop(session.pk, None)
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+    hasher = hashlib.sha256()
+    if offset:
+        with open(part_path(session), 'rb') as part:
+            remaining = offset
+            while remaining:
+                block = part.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+    return hasher
+
+
+def _keep_hasher(session, offset, hasher):
+    with _hashers_lock:
+        _hashers[session.pk] = (offset, hasher)
+
+
+def _forget_hasher(session):
+    with _hashers_lock:
+        _hashers.pop(session.pk, None)
+
+
+def start_upload(owner_id, purpose, target_id, filename, total_size):
+    max_size = getattr(settings, 'UPLOAD_MAX_SIZE', 2 * 1024 ** 3)
+    if total_size <= 0:
+        raise UploadError("size must be a positive number of bytes")
+    if total_size > max_size:
+        raise UploadError(f"Files may be at most {max_size} bytes", status=413)
+    session = UploadSession.objects.create(
+        owner_id=owner_id, purpose=purpose, target_id=target_id,
+        filename=os.path.basename(filename)[:255] or 'upload',
+        total_size=total_size, chunk_size=getattr(settings, 'UPLOAD_CHUNK_SIZE', 8 * 1024 ** 2),
+    )
+    part_path(session).touch()
+    return session
+
+
+def write_chunk(session, index, stream, content_length, expected_sha256=None):
+    """
+    Append chunk ``index`` read from ``stream``. Returns False when the chunk
+    had already been acknowledged and was ignored.
+    """
+    if session.completed_at is not None:
+        raise UploadError("Upload is already complete", status=409)
+    if index < session.received_chunks:
+        return False
+    if index > session.received_chunks:
+        raise UploadError("Chunks must be sent in order", status=409,
+                          next_chunk=session.received_chunks)
+
+    offset = index * session.chunk_size
+    expected = min(session.chunk_size, session.total_size - offset)
+    if content_length != expected:
+        raise UploadError(f"Chunk {index} must be {expected} bytes", next_chunk=index)
+
+    hasher = _take_hasher(session, offset)
+    chunk_hasher = hashlib.sha256() if expected_sha256 else None
+    received = 0
+    with open(part_path(session), 'r+b') as part:
+        # Drop whatever a failed earlier attempt at this chunk left behind
+        part.seek(offset)
+        part.truncate()
+        while received < expected:
+            block = stream.read(min(READ_BLOCK_SIZE, expected - received))
+            if not block:
+                break
+            part.write(block)
+            hasher.update(block)
+            if chunk_hasher is not None:
+                chunk_hasher.update(block)
+            received += len(block)
+        if received != expected or (
+            chunk_hasher is not None and chunk_hasher.hexdigest() != expected_sha256.lower()
+        ):
+            part.truncate(offset)
+            raise UploadError(f"Chunk {index} was incomplete or corrupted", next_chunk=index)
+
+    acknowledged = UploadSession.objects.filter(pk=session.pk, received_chunks=index).update(
+        received_chunks=index + 1, bytes_received=offset + received, updated_at=timezone.now()
+    )
+    if acknowledged:
+        _keep_hasher(session, offset + received, hasher)
+        session.received_chunks, session.bytes_received = index + 1, offset + received
+    return bool(acknowledged)
+
+
+def complete_upload(session, expected_sha256=None):
+    """
+    Verify the upload and attach it. Returns the LessonFile,
+    AssignmentSubmission or Profile it was stored on.
+    """
+    if session.completed_at is not None:
+        raise UploadError("Upload is already complete", status=409)
+    if session.bytes_received != session.total_size:
+        raise UploadError("Upload is missing chunks", status=409, next_chunk=session.received_chunks)
+
+    digest = _take_hasher(session, session.bytes_received).hexdigest()
+    if expected_sha256 and digest != expected_sha256.lower():
+        raise UploadError("Checksum does not match the uploaded data", sha256=digest)
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Claim the session so a repeated request cannot attach the file twice
+        if not UploadSession.objects.filter(pk=session.pk, completed_at__isnull=True).update(
+            completed_at=now, sha256=digest
+        ):
+            raise UploadError("Upload is already complete", status=409)
+        session.completed_at, session.sha256 = now, digest
+        with _PartFile(open(part_path(session), 'rb'), name=str(part_path(session))) as part:
+            part.sha256 = digest  # saves blob storage from hashing it again
+            stored = _attach(session, part)
+    return stored
+
+
+def _attach(session, part):
+    if session.purpose == 'lesson_file':
+        stored = LessonFile(lesson_id=session.target_id, filename=session.filename,
+                            file_size=session.bytes_received)
+        stored.file.save(session.filename, part, save=False)
+        stored.save()
+    elif session.purpose == 'submission':
+        # Replace the file of an ungraded submission; a graded one is kept
+        # as it was marked and the upload becomes a new submission
+        stored = (
+            AssignmentSubmission.objects.filter(
+                assignment_id=session.target_id, student_id=session.owner_id,
+                status='submitted', grade__isnull=True,
+            ).order_by('-submitted_at').first()
+            or AssignmentSubmission(assignment_id=session.target_id, student_id=session.owner_id)
+        )
+        stored.submission_file.save(session.filename, part, save=False)
+        stored.status = 'submitted'
+        stored.save()
+    else:
+        stored = Profile.objects.get(user_id=session.owner_id)
+        try:
+            accept_avatar(stored, part.temporary_file_path())
+        except AvatarError as e:
+            raise UploadError(str(e))
+        except AvatarBusy:
+            raise UploadError("Too many pictures are being processed, please retry", status=503)
+    return stored
+
+
+def describe(session):
+    return {
+        'upload_id': str(session.pk),
+        'purpose': session.purpose,
+        'filename': session.filename,
+        'total_size': session.total_size,
+        'chunk_size': session.chunk_size,
+        'chunk_count': session.chunk_count,
+        'next_chunk': session.received_chunks,
+        'bytes_received': session.bytes_received,
+        'completed': session.completed_at is not None,
+        'sha256': session.sha256 or None,
+    }
+
+
+def discard_upload(session):
+    _forget_hasher(session)
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def purge_stale_uploads(batch_size=500):
+    """Remove upload sessions (and part files) untouched for ``UPLOAD_SESSION_TTL``"""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 3600))
+    stale = list(UploadSession.objects.filter(updated_at__lt=cutoff)[:batch_size])
+    for session in stale:
+        discard_upload(session)
+    return len(stale)
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from .views import SignupView, LoginView, LogoutView, CreateLecturerView, AdminDashboardView, AdminDeleteUserView
 from . import views
+from . import async_views
 from .views import CourseListView, enroll
 
 urlpatterns = [
@@ -10,6 +11,10 @@ urlpatterns = [
 
     path('logout/', LogoutView.as_view(), name='logout'),
 
+    # Async login/signup (hashing offloaded to a bounded pool, see accounts.hashing)
+    path('login-async/', async_views.login_async, name='login_async'),
+    path('signup-async/', async_views.signup_async, name='signup_async'),
+
     path('create-lecturer/', CreateLecturerView.as_view(), name='create-lecturer'),
 
     # Admin Dashboard Views (Class-based)
@@ -19,6 +24,7 @@ urlpatterns = [
     path("courses/", CourseListView.as_view(), name="courses"),
 
     path('enroll/', views.enroll, name='enroll'),
+    path('courses/<int:course_id>/enroll/bulk/', views.bulk_enroll_course, name='bulk_enroll_course'),
 
     # CSRF Token endpoint
     path('csrf-token/', views.get_csrf_token, name='csrf_token'),
@@ -31,6 +37,7 @@ urlpatterns = [
     # Admin API Endpoints
     path('admin/stats/', views.admin_dashboard_stats, name='admin_stats'),
     path('admin/users/', views.admin_users, name='admin_users'),
+    path('admin/users/bulk/', views.admin_bulk_users, name='admin_bulk_users'),
     path('admin/users/<int:user_id>/', views.admin_user_detail, name='admin_user_detail'),
     path('admin/courses/', views.admin_courses, name='admin_courses'),
     path('admin/courses/<int:course_id>/', views.admin_course_detail, name='admin_course_detail'),
@@ -39,9 +46,24 @@ urlpatterns = [
     path('admin/recent-activity/', views.admin_recent_activity, name='admin_recent_activity'),
     
     # Course detail endpoints
+    path('courses/search/', views.course_search, name='course_search'),
+    path('courses/autocomplete/', views.course_autocomplete_view, name='course_autocomplete'),
     path('courses/<int:course_id>/', views.course_detail, name='course_detail'),
     path('courses/<int:course_id>/modules/', views.course_modules, name='course_modules'),
+    path('courses/<int:course_id>/outline/', views.course_outline, name='course_outline'),
     path('courses/<int:course_id>/assignments/', views.course_assignments, name='course_assignments'),
+    path('courses/<int:course_id>/gradebook/', views.course_gradebook, name='course_gradebook'),
+    path('assignments/<int:assignment_id>/grades/', views.bulk_grade_submissions, name='bulk_grade_submissions'),
+    path('lessons/<int:lesson_id>/complete/', views.lesson_completion, name='lesson_completion'),
+    path('lesson-files/<int:file_id>/download/', views.download_lesson_file, name='download_lesson_file'),
+    path('submissions/<int:submission_id>/download/', views.download_submission_file, name='download_submission_file'),
+    path('submissions/<int:submission_id>/processing/', views.submission_processing, name='submission_processing'),
+
+    # Resumable chunked uploads
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_status, name='upload_status'),
+    path('uploads/<uuid:upload_id>/chunks/<int:index>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.upload_complete, name='upload_complete'),
     
     # Lecturer endpoints
     path('lecturer/dashboard/', views.lecturer_dashboard_data, name='lecturer_dashboard_data'),
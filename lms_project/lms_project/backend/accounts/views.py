@@ -5,17 +5,47 @@ from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework import generics, permissions
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from django.views.decorators.csrf import csrf_exempt
-from .models import Profile, Course, Enrollment, Lecturer, Student, Notification, Assignment, AssignmentSubmission, CourseModule, Lesson
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from .authentication import (
+    AuthClaims, CachedTokenAuthentication, issue_login, request_role, token_cache
+)
+from .autocomplete import course_autocomplete
+from .downloads import serve_file
+from .enrollment import (
+    BulkEnrollError, bulk_enroll, enroll_student, parse_enrollment_request, waitlist_position
+)
+from .avatars import AvatarBusy, AvatarError, accept_avatar, avatar_urls, requested_avatar_size, user_avatar
+from .caching import (
+    cached_json_response, catalog_version, course_version, request_cache_name
+)
+from .gradebook import current_version as gradebook_cache_version, gradebook_data
+from .grading import GradingError, bulk_grade, parse_grades
+from .ingestion import ingestion_stats
+from .outline import FULL, PUBLISHED, build_outline, outline_cache_name
+from .pagination import InvalidCursor, KeysetPagination
+from .permissions import IsLecturer, IsLecturerOrSuperAdmin, IsSuperAdmin
+from .models import Profile, Course, Enrollment, Lecturer, Student, Notification, Assignment, AssignmentSubmission, CourseModule, Lesson, LessonFile, UploadSession
 from .plagiarism_checker import plagiarism_checker
+from .progress import progress_job_stats, record_completion
+from .rendering import rendered_content
+from .provisioning import BulkImportError, import_users, parse_import
+from .search import search_courses
+from .session_backend import session_write_stats
+from .storage import blob_stats
+from .uploads import UploadError, complete_upload, describe, discard_upload, start_upload, write_chunk
+from .sweeper import sweeper_stats
 from .serializers import CourseSerializer, EnrollmentSerializer
 import json
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +60,12 @@ def session_required(view_func):
         return view_func(request, *args, **kwargs)
     return wrapper
 
+def get_request_user(request):
+    """Return the authenticated caller (token or session), or None"""
+    if request.user.is_authenticated:
+        return request.user
+    return None
+
 # Signup for Students
 class SignupView(APIView):
     def post(self, request):
@@ -76,26 +112,12 @@ class LoginView(APIView):
 
         user = authenticate(username=username, password=password)
         if user:
-            # Ensure user has a profile, create one if missing
-            if not hasattr(user, 'profile'):
-                Profile.objects.create(user=user, role="student")
-            
-            # Create token for API authentication
-            token, _ = Token.objects.get_or_create(user=user)
-            
-            # Create session for web authentication
-            request.session['user_id'] = user.id
-            request.session['username'] = user.username
-            request.session['role'] = user.profile.role
-            request.session['is_authenticated'] = True
-            
-            # Ensure session is saved to get session key
-            request.session.save()
+            token, claims = issue_login(request, user)
             
             return Response({
                 "token": token.key,
                 "username": user.username,
-                "role": user.profile.role,
+                "role": claims.role,
                 "session_id": request.session.session_key,
                 "message": "Login successful"
             }, status=status.HTTP_200_OK)
@@ -109,15 +131,10 @@ class LogoutView(APIView):
         # Clear session data
         request.session.flush()
         
-        # If using token authentication, you can also delete the token
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Token '):
-            token_key = auth_header.split(' ')[1]
-            try:
-                token = Token.objects.get(key=token_key)
-                token.delete()
-            except Token.DoesNotExist:
-                pass
+        # If using token authentication, also delete the token and its cached claims
+        if isinstance(request.auth, AuthClaims):
+            Token.objects.filter(key=request.auth.key).delete()
+            token_cache.invalidate(request.auth.key)
         
         return Response({
             "message": "Logout successful",
@@ -128,25 +145,11 @@ class LogoutView(APIView):
 # Only Superadmin Can Create Lecturer Accounts
 class CreateLecturerView(APIView):
     def post(self, request):
-        try:
-            # Get token from Authorization header
-            auth_header = request.headers.get("Authorization", "")
-            if not auth_header.startswith("Token "):
-                return Response({"error": "Invalid authorization header"}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            token_key = auth_header.split(" ")[1]
-            token = Token.objects.get(key=token_key)
-        except (Token.DoesNotExist, IndexError, ValueError):
-            return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
-        except Exception as e:
-            logger.error(f"Error in CreateLecturerView token validation: {str(e)}")
-            return Response({"error": "Authentication error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # The token is resolved (and cached) by CachedTokenAuthentication
+        if not isinstance(request.auth, AuthClaims):
+            return Response({"error": "Invalid authorization header"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        # Ensure user has a profile, create one if missing
-        if not hasattr(token.user, 'profile'):
-            Profile.objects.create(user=token.user, role="student")
-            
-        if token.user.profile.role != "superadmin":
+        if request.auth.role != "superadmin":
             return Response({"error": "Only superadmin can create lecturers"}, status=status.HTTP_403_FORBIDDEN)
 
         try:
@@ -182,54 +185,33 @@ class CreateLecturerView(APIView):
 
 # Admin: list all users
 class AdminDashboardView(APIView):
-    authentication_classes = [TokenAuthentication]
-    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsSuperAdmin]
 
     def get(self, request):
-        # Ensure user has a profile, create one if missing
-        if not hasattr(request.user, 'profile'):
-            Profile.objects.create(user=request.user, role="student")
-            
-        # Only superadmin can access
-        if request.user.profile.role != 'superadmin':
-            return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
-
         users = User.objects.exclude(
-            profile__role='superadmin')  # exclude other admins
+            profile__role='superadmin').select_related('profile')  # exclude other admins
+        paginator = KeysetPagination(ordering=('id',))
+        page = paginator.paginate_queryset(users, request)
         user_list = []
-        for user in users:
-            # Ensure user has a profile, create one if missing
-            if not hasattr(user, 'profile'):
-                Profile.objects.create(user=user, role="student")
-            
+        for user in users if page is None else page:
             user_list.append({
                 'id': user.id,
                 'username': user.username,
                 'email': user.email,
-                'role': user.profile.role
+                'role': user.profile.role if hasattr(user, 'profile') else 'student'
             })
-        return Response(user_list, status=status.HTTP_200_OK)
+        return Response(paginator.get_response_data(user_list), status=status.HTTP_200_OK)
 
 # Admin: delete a user
 class AdminDeleteUserView(APIView):
-    authentication_classes = [TokenAuthentication]
-    permission_classes = [IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsSuperAdmin]
 
     def delete(self, request, user_id):
-        # Ensure user has a profile, create one if missing
-        if not hasattr(request.user, 'profile'):
-            Profile.objects.create(user=request.user, role="student")
-            
-        if request.user.profile.role != 'superadmin':
-            return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
-
         try:
-            user = User.objects.get(id=user_id)
-            # Ensure user has a profile, create one if missing
-            if not hasattr(user, 'profile'):
-                Profile.objects.create(user=user, role="student")
-                
-            if user.profile.role == 'superadmin':
+            user = User.objects.select_related('profile').get(id=user_id)
+            if hasattr(user, 'profile') and user.profile.role == 'superadmin':
                 return Response({'error': 'Cannot delete superadmin'}, status=status.HTTP_400_BAD_REQUEST)
             user.delete()
             return Response({'message': 'User deleted'}, status=status.HTTP_200_OK)
@@ -238,9 +220,19 @@ class AdminDeleteUserView(APIView):
 
 
 class CourseListView(generics.ListAPIView):
-    queryset = Course.objects.all()
+    queryset = Course.objects.with_catalog_stats()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        # Served from the versioned response cache (see accounts.caching)
+        return cached_json_response(
+            request,
+            request_cache_name('course_list', request),
+            catalog_version(),
+            _course_list_data(request, self.get_queryset()),
+        )
 
 # Enroll in a course
 @api_view(['POST'])
@@ -249,23 +241,32 @@ def enroll(request):
     course_id = request.data.get("course_id")
     if not course_id:
         return Response({"detail": "Course ID is required."}, status=400)
+    # Get user from session
+    user_id = request.session.get('user_id')
+    if not user_id:
+        return Response({"detail": "User not found in session."}, status=401)
     try:
-        course = Course.objects.get(id=course_id)
-        # Get user from session
-        user_id = request.session.get('user_id')
-        if not user_id:
-            return Response({"detail": "User not found in session."}, status=401)
-        
-        user = User.objects.get(id=user_id)
-        Enrollment.objects.create(student=user, course=course)
-        return Response({"message": "Enrolled successfully."})
+        # Seat claim and insert are atomic; repeat clicks get the existing row
+        outcome, row = enroll_student(int(course_id), user_id)
+    except (TypeError, ValueError):
+        return Response({"detail": "Course ID must be an integer."}, status=400)
     except Course.DoesNotExist:
         return Response({"detail": "Course not found."}, status=404)
-    except User.DoesNotExist:
-        return Response({"detail": "User not found."}, status=404)
     except Exception as e:
         return Response({"detail": f"Enrollment failed: {str(e)}"}, status=500)
 
+    if outcome == 'enrolled':
+        return Response({"message": "Enrolled successfully.", "enrollment_id": row.id, "status": outcome})
+    if outcome == 'existing':
+        return Response({"message": "Already enrolled.", "enrollment_id": row.id, "status": outcome})
+    if outcome == 'waitlisted':
+        return Response({
+            "message": "Course is full; you have been added to the waitlist.",
+            "status": outcome,
+            "waitlist_position": waitlist_position(row),
+        }, status=status.HTTP_202_ACCEPTED)
+    return Response({"detail": "Course is full."}, status=status.HTTP_409_CONFLICT)
+
 @csrf_exempt
 def enroll_course(request):
     if request.method == "POST":
@@ -273,6 +274,291 @@ def enroll_course(request):
         return JsonResponse({"message": "Enrolled successfully!"})
     return JsonResponse({"detail": "Method not allowed."}, status=405)
 
+@api_view(['POST'])
+@permission_classes([IsLecturerOrSuperAdmin])
+def bulk_enroll_course(request, course_id):
+    """Enroll a list (or CSV) of users into a course in batches"""
+    try:
+        course = Course.objects.select_related('lecturer').get(id=course_id)
+    except Course.DoesNotExist:
+        return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # Lecturers may only enroll students into their own courses
+    if request.auth.role == 'lecturer' and (
+        course.lecturer is None or course.lecturer.user_id != request.user.id
+    ):
+        return Response({"error": "You can only enroll students in your own courses"},
+                        status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        user_ids, unreadable = parse_enrollment_request(request)
+    except BulkEnrollError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        result = bulk_enroll(course, user_ids, unreadable)
+    except Exception as e:
+        logger.error(f"Bulk enrollment into course {course_id} failed: {str(e)}")
+        return Response({"error": f"Enrollment failed: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    result['course_id'] = course.id
+    return Response(result)
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([IsLecturerOrSuperAdmin])
+def course_gradebook(request, course_id):
+    """Grades of every student on every assignment, with per-assignment and final-grade statistics"""
+    course = Course.objects.select_related('lecturer').filter(id=course_id).first()
+    if course is None:
+        return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
+    if not _teaches_course(request, course):
+        return Response({"error": "You can only view gradebooks of your own courses"},
+                        status=status.HTTP_403_FORBIDDEN)
+    return cached_json_response(
+        request, f'gradebook.{course_id}', gradebook_cache_version(course_id),
+        lambda: (gradebook_data(course_id), None), private=True,
+    )
+
+
+@api_view(['POST'])
+@permission_classes([IsLecturerOrSuperAdmin])
+def bulk_grade_submissions(request, assignment_id):
+    """Grade many submissions of one assignment: ``{submission_id: {grade, feedback}}``"""
+    assignment = (
+        Assignment.objects.select_related('lesson__module__course__lecturer')
+        .filter(id=assignment_id).first()
+    )
+    if assignment is None:
+        return Response({"error": "Assignment not found"}, status=status.HTTP_404_NOT_FOUND)
+    if not _teaches_course(request, assignment.lesson.module.course):
+        return Response({"error": "You can only grade assignments in your own courses"},
+                        status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        grades, errors = parse_grades(request.data)
+    except GradingError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    result, errors = bulk_grade(assignment, grades, request.user.id, errors)
+    if errors:
+        return Response({"error": "No grades were saved", "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(result)
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def lesson_completion(request, lesson_id):
+    """Mark a lesson completed (POST) or not completed (DELETE) and return course progress"""
+    lesson = (
+        Lesson.objects.select_related('module')
+        .filter(id=lesson_id, is_published=True, module__is_published=True).first()
+    )
+    if lesson is None:
+        return Response({"error": "Lesson not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    enrollment = (
+        Enrollment.objects.select_related('course')
+        .filter(student_id=request.user.id, course_id=lesson.module.course_id,
+                status__in=('enrolled', 'completed')).first()
+    )
+    if enrollment is None:
+        return Response({"error": "You are not enrolled in this course"}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        changed, lessons_completed, percentage = record_completion(
+            enrollment, lesson.id, completed=request.method == 'POST'
+        )
+    except Exception as e:
+        logger.error(f"Recording completion of lesson {lesson_id} failed: {str(e)}")
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return Response({
+        'lesson_id': lesson.id,
+        'course_id': enrollment.course_id,
+        'completed': request.method == 'POST',
+        'changed': changed,
+        'lessons_completed': lessons_completed,
+        'total_lessons': enrollment.course.published_lessons,
+        'progress_percentage': percentage,
+    })
+
+def _teaches_course(request, course):
+    """True for admins and for the lecturer assigned to ``course``"""
+    role = request_role(request)
+    return role == 'superadmin' or (
+        role == 'lecturer' and course.lecturer is not None and course.lecturer.user_id == request.user.id
+    )
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([IsAuthenticated])
+def download_lesson_file(request, file_id):
+    """Lesson file for enrolled students (published lessons only) and the course's teachers"""
+    lesson_file = (
+        LessonFile.objects.select_related('lesson__module__course__lecturer')
+        .filter(id=file_id).first()
+    )
+    if lesson_file is None:
+        return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    lesson = lesson_file.lesson
+    course = lesson.module.course
+    if not _teaches_course(request, course):
+        allowed = lesson.is_published and lesson.module.is_published and Enrollment.objects.filter(
+            student_id=request.user.id, course=course, status__in=('enrolled', 'completed')
+        ).exists()
+        if not allowed:
+            return Response({"error": "You do not have access to this file"}, status=status.HTTP_403_FORBIDDEN)
+    return serve_file(request, lesson_file.file, lesson_file.filename)
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([IsAuthenticated])
+def download_submission_file(request, submission_id):
+    """Submitted file for its author and the course's teachers"""
+    submission = (
+        AssignmentSubmission.objects.select_related('assignment__lesson__module__course__lecturer')
+        .filter(id=submission_id).first()
+    )
+    if submission is None or not submission.submission_file:
+        return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    if submission.student_id != request.user.id and not _teaches_course(
+        request, submission.assignment.lesson.module.course
+    ):
+        return Response({"error": "You do not have access to this file"}, status=status.HTTP_403_FORBIDDEN)
+    # Stored names are content hashes; keep only the extension
+    extension = os.path.splitext(submission.submission_file.name)[1]
+    return serve_file(request, submission.submission_file, f'submission-{submission.pk}{extension}',
+                      as_attachment=True)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def submission_processing(request, submission_id):
+    """Ingestion status of a submission, for clients polling after an upload"""
+    submission = (
+        AssignmentSubmission.objects.select_related('assignment__lesson__module__course__lecturer')
+        .filter(id=submission_id).first()
+    )
+    if submission is None:
+        return Response({"error": "Submission not found"}, status=status.HTTP_404_NOT_FOUND)
+    teaches = _teaches_course(request, submission.assignment.lesson.module.course)
+    if submission.student_id != request.user.id and not teaches:
+        return Response({"error": "You do not have access to this submission"}, status=status.HTTP_403_FORBIDDEN)
+
+    job = submission.ingestion_jobs.order_by('-id').first()
+    data = {
+        'submission_id': submission.id,
+        'processing_status': submission.processing_status or None,
+        'word_count': submission.word_count,
+        'job': {
+            'status': job.status,
+            'attempts': job.attempts,
+            'timings': job.timings,
+            'error': job.error or None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        } if job is not None else None,
+    }
+    if teaches:
+        data['duplicate_of'] = submission.duplicate_of_id
+    return Response(data)
+
+# ==================== RESUMABLE UPLOADS (see accounts.uploads) ====================
+
+def _upload_error(error):
+    return Response({"error": str(error), **error.details}, status=error.status)
+
+def _upload_target_allowed(request, purpose, target_id):
+    """Whether the caller may attach an upload to ``target_id``"""
+    if purpose == 'lesson_file':
+        lesson = Lesson.objects.select_related('module__course__lecturer').filter(id=target_id).first()
+        return lesson is not None and _teaches_course(request, lesson.module.course)
+    if purpose == 'submission':
+        return Assignment.objects.filter(
+            id=target_id,
+            lesson__module__course__enrollment__student_id=request.user.id,
+            lesson__module__course__enrollment__status='enrolled',
+        ).exists()
+    return True
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_start(request):
+    """Open an upload session for a lesson file, submission or profile picture"""
+    purpose = request.data.get('purpose')
+    if purpose not in dict(UploadSession.PURPOSE_CHOICES):
+        return Response({"error": "purpose must be lesson_file, submission or profile_picture"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        total_size = int(request.data.get('size'))
+        target_id = int(request.data['target_id']) if purpose != 'profile_picture' else None
+    except (KeyError, TypeError, ValueError):
+        return Response({"error": "size and target_id must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+    filename = request.data.get('filename')
+    if not filename:
+        return Response({"error": "filename is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not _upload_target_allowed(request, purpose, target_id):
+        return Response({"error": "You cannot upload files here"}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        session = start_upload(request.user.id, purpose, target_id, filename, total_size)
+    except UploadError as e:
+        return _upload_error(e)
+    return Response(describe(session), status=status.HTTP_201_CREATED)
+
+def _own_upload(request, upload_id):
+    return UploadSession.objects.filter(id=upload_id, owner_id=request.user.id).first()
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def upload_status(request, upload_id):
+    """Where to resume an upload (GET), or abandon it (DELETE)"""
+    session = _own_upload(request, upload_id)
+    if session is None:
+        return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+    if request.method == 'DELETE':
+        discard_upload(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(describe(session))
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def upload_chunk(request, upload_id, index):
+    """Store chunk ``index``; the request body is the raw bytes"""
+    session = _own_upload(request, upload_id)
+    if session is None:
+        return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    try:
+        write_chunk(
+            session, index, request.stream, content_length,
+            expected_sha256=request.META.get('HTTP_X_CHUNK_SHA256'),
+        )
+    except UploadError as e:
+        return _upload_error(e)
+    return Response(describe(session))
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_complete(request, upload_id):
+    """Verify the checksum and attach the uploaded file"""
+    session = _own_upload(request, upload_id)
+    if session is None:
+        return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        stored = complete_upload(session, request.data.get('sha256'))
+    except UploadError as e:
+        return _upload_error(e)
+    data = describe(session)
+    if session.purpose == 'lesson_file':
+        data['lesson_file'] = {'id': stored.id, 'filename': stored.filename, 'file_size': stored.file_size}
+    elif session.purpose == 'submission':
+        data['submission'] = {'id': stored.id, 'status': stored.status,
+                              'processing_status': stored.processing_status}
+    else:
+        data['avatar_status'] = stored.avatar_status
+    return Response(data)
+
 # Check enrollment status
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -297,20 +583,22 @@ def enrollment_status(request, course_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def my_courses(request):
-    enrollments = Enrollment.objects.filter(student=request.user).select_related('course')
+    enrollments = Enrollment.objects.filter(student_id=request.user.id).select_related('course')
+    paginator = KeysetPagination(ordering=('-enrolled_at', '-id'))
+    page = paginator.paginate_queryset(enrollments, request)
     courses_data = []
     
-    for enrollment in enrollments:
+    for enrollment in enrollments if page is None else page:
         courses_data.append({
             'id': enrollment.course.id,
             'title': enrollment.course.title,
             'description': enrollment.course.description,
             'duration': enrollment.course.duration,
             'image': enrollment.course.image,
-            'enrolled_date': enrollment.enrolled_date
+            'enrolled_date': enrollment.enrolled_at
         })
     
-    return Response(courses_data)
+    return Response(paginator.get_response_data(courses_data))
 
 # Chatbot API Endpoint
 @api_view(['POST'])
@@ -320,11 +608,7 @@ def chatbot_api(request):
         user_message = request.data.get('message', '').lower()
         user = request.user
         
-        # Ensure user has a profile, create one if missing
-        if not hasattr(user, 'profile'):
-            Profile.objects.create(user=user, role="student")
-            
-        user_role = user.profile.role
+        user_role = request_role(request)
         
         # Get user's enrolled courses for personalized responses
         user_courses = Enrollment.objects.filter(student=user).select_related('course')
@@ -410,15 +694,11 @@ def chatbot_api(request):
 def chatbot_context(request):
     user = request.user
     
-    # Ensure user has a profile, create one if missing
-    if not hasattr(user, 'profile'):
-        Profile.objects.create(user=user, role="student")
-        
     user_courses = Enrollment.objects.filter(student=user).select_related('course')
     
     context = {
         'username': user.username,
-        'role': user.profile.role,
+        'role': request_role(request),
         'enrolled_courses': [
             {
                 'title': enrollment.course.title,
@@ -470,15 +750,77 @@ def admin_stats(request):
 def course_list(request):
     """Get all courses with lecturer information"""
     try:
-        courses = Course.objects.select_related('lecturer__user').all()
-        serializer = CourseSerializer(courses, many=True)
-        return Response(serializer.data)
+        return cached_json_response(
+            request,
+            request_cache_name('course_list', request),
+            catalog_version(),
+            _course_list_data(request, Course.objects.with_catalog_stats()),
+        )
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error fetching courses: {str(e)}"}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+def _course_list_data(request, courses):
+    def build():
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(courses, request)
+        items = list(courses if page is None else page)
+        serializer = CourseSerializer(items, many=True)
+        last_modified = max((course.updated_at for course in items), default=None)
+        return paginator.get_response_data(serializer.data), last_modified
+    return build
+
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_OFFSET = 1000
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def course_search(request):
+    """Full-text course search with difficulty/category filters and facets"""
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({"error": "Search query is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    difficulty = request.query_params.get('difficulty') or None
+    category = request.query_params.get('category') or None
+    try:
+        limit = int(request.query_params.get('limit', 20))
+        offset = int(request.query_params.get('offset', 0))
+    except ValueError:
+        return Response({"error": "limit and offset must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+    # Ranked results are paged by offset, so keep both bounded
+    limit = min(max(limit, 1), SEARCH_MAX_LIMIT)
+    offset = min(max(offset, 0), SEARCH_MAX_OFFSET)
+
+    try:
+        courses, total, facets = search_courses(query, difficulty, category, limit, offset)
+        return Response({
+            'query': query,
+            'count': total,
+            'results': CourseSerializer(courses, many=True).data,
+            'facets': facets,
+        })
+    except Exception as e:
+        return Response({"error": f"Error searching courses: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def course_autocomplete_view(request):
+    """Type-ahead suggestions for course titles and categories"""
+    query = request.query_params.get('q', '')
+    try:
+        limit = int(request.query_params.get('limit', 10))
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        return Response({'query': query, 'results': course_autocomplete.lookup(query, max(limit, 1))})
+    except Exception as e:
+        return Response({"error": f"Error fetching suggestions: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_student(request):
@@ -580,9 +922,11 @@ def admin_dashboard(request):
     
     try:
         users = User.objects.select_related('student', 'lecturer').all()
+        paginator = KeysetPagination(ordering=('id',))
+        page = paginator.paginate_queryset(users, request)
         
         user_data = []
-        for user in users:
+        for user in users if page is None else page:
             role = 'student' if hasattr(user, 'student') else \
                    'lecturer' if hasattr(user, 'lecturer') else \
                    'admin' if user.is_superuser else 'user'
@@ -594,8 +938,10 @@ def admin_dashboard(request):
                 'role': role
             })
         
-        return Response(user_data)
+        return Response(paginator.get_response_data(user_data))
     
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"error": f"Error fetching users: {str(e)}"}, 
@@ -866,22 +1212,9 @@ def get_csrf_token(request):
 def get_profile(request):
     """Get current user's profile data"""
     try:
-        # Try to get user from session first, then from token
-        user_id = request.session.get('user_id')
-        if user_id:
-            user = User.objects.get(id=user_id)
-        else:
-            # Fallback to token authentication
-            auth_header = request.headers.get('Authorization', '')
-            if not auth_header.startswith('Token '):
-                return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            token_key = auth_header.split(' ')[1]
-            try:
-                token = Token.objects.get(key=token_key)
-                user = token.user
-            except Token.DoesNotExist:
-                return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+        user = get_request_user(request)
+        if user is None:
+            return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         
         profile = user.profile
         
@@ -898,52 +1231,55 @@ def get_profile(request):
                 'category': enrollment.course.category,
                 'image': enrollment.course.image,
                 'enrolled_at': enrollment.enrolled_at.isoformat() if enrollment.enrolled_at else None,
-                'progress': enrollment.progress if hasattr(enrollment, 'progress') else 0
+                'progress': enrollment.progress_percentage,
+                'lessons_completed': enrollment.lessons_completed
             })
         
-        # Get user's assignments (simplified for now)
+        # Assignments of every enrolled course in one join, then this
+        # student's submissions for them in one IN query
+        assignments = (
+            Assignment.objects.filter(
+                lesson__module__course_id__in=[enrollment.course_id for enrollment in enrollments],
+                lesson__lesson_type='assignment',
+            )
+            .order_by('lesson__module__course_id', 'lesson__module__order', 'lesson__order', 'id')
+            .values('id', 'title', 'description', 'due_date', course_title=F('lesson__module__course__title'))
+        )
+        assignments = list(assignments)
+        submissions = {}
+        for submission in (
+            AssignmentSubmission.objects.filter(student=user, assignment_id__in=[a['id'] for a in assignments])
+            .order_by('submitted_at', 'id')
+            .values('id', 'assignment_id', 'submitted_at', 'grade', 'feedback')
+        ):
+            # The latest submission wins
+            submissions[submission['assignment_id']] = submission
+
         assignments_data = []
-        try:
-            # Get assignments from courses the user is enrolled in
-            enrolled_courses = Course.objects.filter(enrollment__student=user)
-            for course in enrolled_courses:
-                # Get assignments from course modules and lessons
-                from .models import CourseModule, Lesson
-                modules = CourseModule.objects.filter(course=course)
-                for module in modules:
-                    lessons = Lesson.objects.filter(module=module, lesson_type='assignment')
-                    for lesson in lessons:
-                        try:
-                            assignment = Assignment.objects.get(lesson=lesson)
-                            try:
-                                submission = AssignmentSubmission.objects.get(assignment=assignment, student=user)
-                                submission_data = {
-                                    'id': submission.id,
-                                    'submitted_at': submission.submitted_at.isoformat(),
-                                    'grade': submission.grade,
-                                    'feedback': submission.feedback,
-                                    'status': 'submitted'
-                                }
-                            except AssignmentSubmission.DoesNotExist:
-                                submission_data = {
-                                    'status': 'not_submitted',
-                                    'grade': None,
-                                    'feedback': None
-                                }
-                            
-                            assignments_data.append({
-                                'id': assignment.id,
-                                'title': assignment.title,
-                                'description': assignment.description,
-                                'due_date': assignment.due_date.isoformat() if assignment.due_date else None,
-                                'course_title': course.title,
-                                'submission': submission_data
-                            })
-                        except Assignment.DoesNotExist:
-                            continue
-        except Exception as e:
-            print(f"Assignment error: {e}")
-            assignments_data = []
+        for assignment in assignments:
+            submission = submissions.get(assignment['id'])
+            if submission is not None:
+                submission_data = {
+                    'id': submission['id'],
+                    'submitted_at': submission['submitted_at'].isoformat(),
+                    'grade': submission['grade'],
+                    'feedback': submission['feedback'],
+                    'status': 'submitted'
+                }
+            else:
+                submission_data = {
+                    'status': 'not_submitted',
+                    'grade': None,
+                    'feedback': None
+                }
+            assignments_data.append({
+                'id': assignment['id'],
+                'title': assignment['title'],
+                'description': assignment['description'],
+                'due_date': assignment['due_date'].isoformat() if assignment['due_date'] else None,
+                'course_title': assignment['course_title'],
+                'submission': submission_data
+            })
         
         # Get user's notifications
         notifications = Notification.objects.filter(user=user).order_by('-created_at')[:10]
@@ -972,6 +1308,8 @@ def get_profile(request):
                 'role': profile.role,
                 'bio': profile.bio if hasattr(profile, 'bio') else '',
                 'profile_picture': profile.profile_picture.url if hasattr(profile, 'profile_picture') and profile.profile_picture else None,
+                'avatar': avatar_urls(user.id, profile.avatar_key, requested_avatar_size(request, 256)),
+                'avatar_status': profile.avatar_status,
                 'phone': profile.phone if hasattr(profile, 'phone') else '',
                 'address': profile.address if hasattr(profile, 'address') else '',
                 'date_of_birth': profile.date_of_birth.isoformat() if hasattr(profile, 'date_of_birth') and profile.date_of_birth else None
@@ -997,22 +1335,9 @@ def get_profile(request):
 def update_profile(request):
     """Update current user's profile"""
     try:
-        # Try to get user from session first, then from token
-        user_id = request.session.get('user_id')
-        if user_id:
-            user = User.objects.get(id=user_id)
-        else:
-            # Fallback to token authentication
-            auth_header = request.headers.get('Authorization', '')
-            if not auth_header.startswith('Token '):
-                return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            token_key = auth_header.split(' ')[1]
-            try:
-                token = Token.objects.get(key=token_key)
-                user = token.user
-            except Token.DoesNotExist:
-                return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+        user = get_request_user(request)
+        if user is None:
+            return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         
         profile = user.profile
         
@@ -1048,34 +1373,28 @@ def update_profile(request):
 
 @api_view(['POST'])
 def upload_profile_picture(request):
-    """Upload profile picture"""
+    """Queue a new profile picture; the resized versions appear on the profile when ready"""
     try:
-        # Try to get user from session first, then from token
-        user_id = request.session.get('user_id')
-        if user_id:
-            user = User.objects.get(id=user_id)
-        else:
-            # Fallback to token authentication
-            auth_header = request.headers.get('Authorization', '')
-            if not auth_header.startswith('Token '):
-                return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            token_key = auth_header.split(' ')[1]
-            try:
-                token = Token.objects.get(key=token_key)
-                user = token.user
-            except Token.DoesNotExist:
-                return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+        user = get_request_user(request)
+        if user is None:
+            return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         
         profile = user.profile
         
         if 'profile_picture' in request.FILES:
-            profile.profile_picture = request.FILES['profile_picture']
-            profile.save()
+            try:
+                accept_avatar(profile, request.FILES['profile_picture'])
+            except AvatarError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            except AvatarBusy:
+                response = Response({"error": "Too many pictures are being processed, please retry"},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                response['Retry-After'] = '1'
+                return response
             return Response({
-                "message": "Profile picture uploaded successfully",
-                "profile_picture_url": profile.profile_picture.url
-            })
+                "message": "Profile picture is being processed",
+                "avatar_status": profile.avatar_status
+            }, status=status.HTTP_202_ACCEPTED)
         else:
             return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
     except User.DoesNotExist:
@@ -1086,29 +1405,9 @@ def upload_profile_picture(request):
 # ==================== ADMIN API ENDPOINTS ====================
 
 @api_view(['GET'])
+@permission_classes([IsSuperAdmin])
 def admin_dashboard_stats(request):
     """Get admin dashboard statistics"""
-    # Check admin access - try session first, then token
-    user_role = None
-    
-    # Try session authentication first
-    if request.session.get('role') == 'superadmin':
-        user_role = 'superadmin'
-    else:
-        # Fallback to token authentication
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Token '):
-            token_key = auth_header.split(' ')[1]
-            try:
-                token = Token.objects.get(key=token_key)
-                if hasattr(token.user, 'profile') and token.user.profile.role == 'superadmin':
-                    user_role = 'superadmin'
-            except Token.DoesNotExist:
-                pass
-    
-    if user_role != 'superadmin':
-        return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
-    
     try:
         stats = {
             'total_users': User.objects.count(),
@@ -1118,6 +1417,12 @@ def admin_dashboard_stats(request):
             'total_assignments': Assignment.objects.count(),
             'total_enrollments': Enrollment.objects.count(),
             'active_sessions': 0,  # This would need session tracking
+            'session_writes': session_write_stats(),
+            'expiry_sweeper': sweeper_stats(),
+            'autocomplete_index': course_autocomplete.stats(),
+            'progress_recompute': progress_job_stats(),
+            'media_blobs': blob_stats(),
+            'submission_ingestion': ingestion_stats(),
             'system_health': 95
         }
         return Response(stats)
@@ -1125,34 +1430,17 @@ def admin_dashboard_stats(request):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET', 'POST'])
+@permission_classes([IsSuperAdmin])
 def admin_users(request):
     """Admin user management"""
-    # Check admin access - try session first, then token
-    user_role = None
-    
-    # Try session authentication first
-    if request.session.get('role') == 'superadmin':
-        user_role = 'superadmin'
-    else:
-        # Fallback to token authentication
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Token '):
-            token_key = auth_header.split(' ')[1]
-            try:
-                token = Token.objects.get(key=token_key)
-                if hasattr(token.user, 'profile') and token.user.profile.role == 'superadmin':
-                    user_role = 'superadmin'
-            except Token.DoesNotExist:
-                pass
-    
-    if user_role != 'superadmin':
-        return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
-    
     if request.method == 'GET':
         try:
             users = User.objects.all().select_related('profile')
+            paginator = KeysetPagination(ordering=('id',))
+            page = paginator.paginate_queryset(users, request)
+            avatar_size = requested_avatar_size(request, 64)
             user_data = []
-            for user in users:
+            for user in users if page is None else page:
                 user_data.append({
                     'id': user.id,
                     'username': user.username,
@@ -1160,10 +1448,13 @@ def admin_users(request):
                     'first_name': user.first_name,
                     'last_name': user.last_name,
                     'role': user.profile.role if hasattr(user, 'profile') else 'student',
+                    'avatar': user_avatar(user, avatar_size),
                     'is_active': user.is_active,
                     'date_joined': user.date_joined
                 })
-            return Response({'users': user_data})
+            return Response(paginator.get_response_data(user_data, key='users'))
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
@@ -1219,30 +1510,25 @@ def admin_users(request):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([IsSuperAdmin])
+def admin_bulk_users(request):
+    """Bulk import users from a CSV file or JSON list; streams an NDJSON report"""
+    try:
+        rows = parse_import(request)
+    except BulkImportError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    report = (json.dumps(result, cls=DjangoJSONEncoder) + '\n' for result in import_users(rows))
+    response = StreamingHttpResponse(report, content_type='application/x-ndjson')
+    # Let proxies pass each chunk's results through as soon as they are ready
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['PUT', 'DELETE'])
+@permission_classes([IsSuperAdmin])
 def admin_user_detail(request, user_id):
     """Admin user detail operations"""
-    # Check admin access - try session first, then token
-    user_role = None
-    
-    # Try session authentication first
-    if request.session.get('role') == 'superadmin':
-        user_role = 'superadmin'
-    else:
-        # Fallback to token authentication
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Token '):
-            token_key = auth_header.split(' ')[1]
-            try:
-                token = Token.objects.get(key=token_key)
-                if hasattr(token.user, 'profile') and token.user.profile.role == 'superadmin':
-                    user_role = 'superadmin'
-            except Token.DoesNotExist:
-                pass
-    
-    if user_role != 'superadmin':
-        return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
-    
     try:
         user = User.objects.get(id=user_id)
     except User.DoesNotExist:
@@ -1261,10 +1547,10 @@ def admin_user_detail(request, user_id):
             
             user.save()
             
-            # Update profile role
-            if hasattr(user, 'profile'):
-                user.profile.role = data.get('role', user.profile.role)
-                user.profile.save()
+            # Update profile role; the Profile post_save signal refreshes
+            # the cached token and session claims for this user
+            if data.get('role'):
+                Profile.objects.update_or_create(user=user, defaults={'role': data['role']})
             
             return Response({"message": "User updated successfully"})
             
@@ -1279,34 +1565,18 @@ def admin_user_detail(request, user_id):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET', 'POST'])
+@permission_classes([IsSuperAdmin])
 def admin_courses(request):
     """Admin course management"""
-    # Check admin access - try session first, then token
-    user_role = None
-    
-    # Try session authentication first
-    if request.session.get('role') == 'superadmin':
-        user_role = 'superadmin'
-    else:
-        # Fallback to token authentication
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Token '):
-            token_key = auth_header.split(' ')[1]
-            try:
-                token = Token.objects.get(key=token_key)
-                if hasattr(token.user, 'profile') and token.user.profile.role == 'superadmin':
-                    user_role = 'superadmin'
-            except Token.DoesNotExist:
-                pass
-    
-    if user_role != 'superadmin':
-        return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
-    
     if request.method == 'GET':
         try:
-            courses = Course.objects.all().select_related('lecturer')
+            courses = Course.objects.select_related('lecturer__user').annotate(
+                enrollment_count=Count('enrollment')
+            )
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(courses, request)
             course_data = []
-            for course in courses:
+            for course in courses if page is None else page:
                 course_data.append({
                     'id': course.id,
                     'title': course.title,
@@ -1316,10 +1586,12 @@ def admin_courses(request):
                     'category': course.category,
                     'lecturer': course.lecturer.user.get_full_name() if course.lecturer else 'Unassigned',
                     'lecturer_id': course.lecturer.id if course.lecturer else None,
-                    'enrollments': Enrollment.objects.filter(course=course).count(),
+                    'enrollments': course.enrollment_count,
                     'created_at': course.created_at
                 })
-            return Response({'courses': course_data})
+            return Response(paginator.get_response_data(course_data, key='courses'))
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
@@ -1363,29 +1635,9 @@ def admin_courses(request):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['PUT', 'DELETE'])
+@permission_classes([IsSuperAdmin])
 def admin_course_detail(request, course_id):
     """Admin course detail operations"""
-    # Check admin access - try session first, then token
-    user_role = None
-    
-    # Try session authentication first
-    if request.session.get('role') == 'superadmin':
-        user_role = 'superadmin'
-    else:
-        # Fallback to token authentication
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Token '):
-            token_key = auth_header.split(' ')[1]
-            try:
-                token = Token.objects.get(key=token_key)
-                if hasattr(token.user, 'profile') and token.user.profile.role == 'superadmin':
-                    user_role = 'superadmin'
-            except Token.DoesNotExist:
-                pass
-    
-    if user_role != 'superadmin':
-        return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
-    
     try:
         course = Course.objects.get(id=course_id)
     except Course.DoesNotExist:
@@ -1408,7 +1660,11 @@ def admin_course_detail(request, course_id):
                     return Response({"error": "Lecturer not found"}, 
                                   status=status.HTTP_400_BAD_REQUEST)
             
-            course.save()
+            # Counters (seats, published lessons) are only moved by conditional
+            # UPDATEs; writing back the values read above would undo those
+            course.save(update_fields=[
+                'title', 'description', 'duration', 'difficulty', 'category', 'lecturer', 'updated_at',
+            ])
             return Response({"message": "Course updated successfully"})
             
         except Exception as e:
@@ -1422,29 +1678,9 @@ def admin_course_detail(request, course_id):
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
+@permission_classes([IsSuperAdmin])
 def admin_analytics(request):
     """Admin analytics data"""
-    # Check admin access - try session first, then token
-    user_role = None
-    
-    # Try session authentication first
-    if request.session.get('role') == 'superadmin':
-        user_role = 'superadmin'
-    else:
-        # Fallback to token authentication
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Token '):
-            token_key = auth_header.split(' ')[1]
-            try:
-                token = Token.objects.get(key=token_key)
-                if hasattr(token.user, 'profile') and token.user.profile.role == 'superadmin':
-                    user_role = 'superadmin'
-            except Token.DoesNotExist:
-                pass
-    
-    if user_role != 'superadmin':
-        return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
-    
     try:
         from datetime import datetime, timedelta
         from django.utils import timezone
@@ -1504,6 +1740,12 @@ def admin_analytics(request):
 @api_view(['GET'])
 def course_detail(request, course_id):
     """Get detailed course information"""
+    return cached_json_response(
+        request, f'course_detail.{course_id}', course_version(course_id),
+        lambda: _course_detail_data(course_id),
+    )
+
+def _course_detail_data(course_id):
     try:
         course = Course.objects.select_related('lecturer__user').get(id=course_id)
         
@@ -1523,10 +1765,13 @@ def course_detail(request, course_id):
                     'username': course.lecturer.user.username if course.lecturer else ''
                 }
             } if course.lecturer else None,
+            'seat_capacity': course.seat_capacity,
+            'seats_taken': course.seats_taken,
+            'waitlist_enabled': course.waitlist_enabled,
             'created_at': course.created_at.isoformat() if course.created_at else None
         }
         
-        return Response(course_data)
+        return course_data, course.updated_at
     except Course.DoesNotExist:
         return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
@@ -1534,24 +1779,40 @@ def course_detail(request, course_id):
 
 @api_view(['GET'])
 def course_modules(request, course_id):
-    """Get course modules and lessons"""
+    """Get course modules and lessons; ``?content=full`` adds the rendered lesson bodies"""
+    full = request.query_params.get('content') == 'full'
+    return cached_json_response(
+        request, f'course_modules.{course_id}' + ('.full' if full else ''), course_version(course_id),
+        lambda: _course_modules_data(course_id, full),
+    )
+
+def _course_modules_data(course_id, full=False):
     try:
         course = Course.objects.get(id=course_id)
         modules = CourseModule.objects.filter(course=course).prefetch_related('lessons').order_by('order')
         
+        last_modified = course.updated_at
         modules_data = []
         for module in modules:
+            last_modified = max(last_modified, module.updated_at)
             lessons_data = []
             for lesson in module.lessons.all():
-                lessons_data.append({
+                last_modified = max(last_modified, lesson.updated_at)
+                content_html, content_excerpt = rendered_content(lesson)
+                lesson_data = {
                     'id': lesson.id,
                     'title': lesson.title,
-                    'description': lesson.content,
+                    # Kept for older clients; it used to carry the raw content
+                    'description': content_excerpt,
+                    'excerpt': content_excerpt,
                     'lesson_type': lesson.lesson_type,
                     'duration': f"{lesson.duration_minutes} minutes",
                     'order': lesson.order,
                     'is_published': lesson.is_published
-                })
+                }
+                if full:
+                    lesson_data['content_html'] = content_html
+                lessons_data.append(lesson_data)
             
             modules_data.append({
                 'id': module.id,
@@ -1562,84 +1823,75 @@ def course_modules(request, course_id):
                 'lessons': lessons_data
             })
         
-        return Response({'modules': modules_data})
+        return {'modules': modules_data}, last_modified
     except Course.DoesNotExist:
         return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+def course_outline(request, course_id):
+    """Module and lesson tree; drafts are included for the course's lecturer and admins"""
+    full = False
+    if isinstance(request.auth, AuthClaims):
+        full = request.auth.role == 'superadmin' or (
+            request.auth.role == 'lecturer'
+            and Course.objects.filter(id=course_id, lecturer__user_id=request.user.id).exists()
+        )
+    variant = FULL if full else PUBLISHED
+
+    def build():
+        result = build_outline(course_id, published_only=not full)
+        if result is None:
+            return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
+        return result
+
+    # Drafts are for the course's teachers only; keep them out of shared caches
+    response = cached_json_response(
+        request, outline_cache_name(course_id, variant), course_version(course_id), build, private=full,
+    )
+    patch_vary_headers(response, ('Authorization', 'Cookie'))
+    return response
+
 @api_view(['GET'])
 def course_assignments(request, course_id):
     """Get course assignments"""
     try:
-        course = Course.objects.get(id=course_id)
+        if not Course.objects.filter(id=course_id).exists():
+            return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        # Get assignments from course modules and lessons
         assignments = []
-        modules = CourseModule.objects.filter(course=course)
-        for module in modules:
-            lessons = Lesson.objects.filter(module=module, lesson_type='assignment')
-            for lesson in lessons:
-                try:
-                    assignment = Assignment.objects.get(lesson=lesson)
-                    assignments.append({
-                        'id': assignment.id,
-                        'title': assignment.title,
-                        'description': assignment.description,
-                        'due_date': assignment.due_date.isoformat() if assignment.due_date else None,
-                        'max_points': assignment.max_points,
-                        'instructions': assignment.instructions,
-                        'is_published': assignment.is_published,
-                        'created_at': assignment.created_at.isoformat()
-                    })
-                except Assignment.DoesNotExist:
-                    continue
+        for assignment in (
+            Assignment.objects.filter(lesson__module__course_id=course_id, lesson__lesson_type='assignment')
+            .order_by('lesson__module__order', 'lesson__order', 'id')
+            .values('id', 'title', 'description', 'due_date', 'max_points', 'instructions',
+                    'is_published', 'created_at')
+        ):
+            assignments.append({
+                'id': assignment['id'],
+                'title': assignment['title'],
+                'description': assignment['description'],
+                'due_date': assignment['due_date'].isoformat() if assignment['due_date'] else None,
+                'max_points': assignment['max_points'],
+                'instructions': assignment['instructions'],
+                'is_published': assignment['is_published'],
+                'created_at': assignment['created_at'].isoformat()
+            })
         
         return Response({'assignments': assignments})
-    except Course.DoesNotExist:
-        return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
+@permission_classes([IsLecturer])
 def lecturer_dashboard_data(request):
     """Get lecturer dashboard data including courses, students, and assignments"""
     try:
-        # Get user from session or token
-        user = None
-        user_id = request.session.get('user_id')
-        
-        if user_id:
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                pass
-        
-        # Fallback to token authentication
-        if not user:
-            auth_header = request.headers.get('Authorization', '')
-            if auth_header.startswith('Token '):
-                token_key = auth_header.split(' ')[1]
-                try:
-                    token = Token.objects.get(key=token_key)
-                    user = token.user
-                except Token.DoesNotExist:
-                    return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        if not user:
-            return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        # Check if user is a lecturer
-        try:
-            profile = user.profile
-            if profile.role != 'lecturer':
-                return Response({"error": "Lecturer access required"}, status=status.HTTP_403_FORBIDDEN)
-        except Profile.DoesNotExist:
-            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        user = request.user
         
         # Get lecturer instance
         try:
-            lecturer = Lecturer.objects.get(user=user)
+            lecturer = Lecturer.objects.get(user_id=user.id)
         except Lecturer.DoesNotExist:
             return Response({"error": "Lecturer profile not found"}, status=status.HTTP_404_NOT_FOUND)
         
@@ -1746,54 +1998,26 @@ def lecturer_dashboard_data(request):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
+@permission_classes([IsLecturer])
 def lecturer_courses(request):
     """Get courses taught by the lecturer"""
     try:
-        # Get user from session or token
-        user = None
-        user_id = request.session.get('user_id')
-        
-        if user_id:
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                pass
-        
-        # Fallback to token authentication
-        if not user:
-            auth_header = request.headers.get('Authorization', '')
-            if auth_header.startswith('Token '):
-                token_key = auth_header.split(' ')[1]
-                try:
-                    token = Token.objects.get(key=token_key)
-                    user = token.user
-                except Token.DoesNotExist:
-                    return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        if not user:
-            return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        # Check if user is a lecturer
-        try:
-            profile = user.profile
-            if profile.role != 'lecturer':
-                return Response({"error": "Lecturer access required"}, status=status.HTTP_403_FORBIDDEN)
-        except Profile.DoesNotExist:
-            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        user = request.user
         
         # Get lecturer instance
         try:
-            lecturer = Lecturer.objects.get(user=user)
+            lecturer = Lecturer.objects.get(user_id=user.id)
         except Lecturer.DoesNotExist:
             return Response({"error": "Lecturer profile not found"}, status=status.HTTP_404_NOT_FOUND)
         
         # Get lecturer's courses with detailed information
         courses = Course.objects.filter(lecturer=lecturer).select_related('lecturer__user')
+        avatar_size = requested_avatar_size(request, 64)
         courses_data = []
         
         for course in courses:
             # Get enrollment count and student details
-            enrollments = Enrollment.objects.filter(course=course).select_related('student')
+            enrollments = Enrollment.objects.filter(course=course).select_related('student__profile')
             enrollment_count = enrollments.count()
             
             # Get assignment count
@@ -1812,6 +2036,7 @@ def lecturer_courses(request):
                     'username': enrollment.student.username,
                     'first_name': enrollment.student.first_name,
                     'last_name': enrollment.student.last_name,
+                    'avatar': user_avatar(enrollment.student, avatar_size),
                     'enrolled_at': enrollment.enrolled_at.isoformat() if enrollment.enrolled_at else None
                 })
             
@@ -1835,101 +2060,83 @@ def lecturer_courses(request):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
+@permission_classes([IsLecturer])
 def lecturer_assignments(request):
     """Get assignments for lecturer's courses"""
     try:
-        # Get user from session or token
-        user = None
-        user_id = request.session.get('user_id')
-        
-        if user_id:
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                pass
-        
-        # Fallback to token authentication
-        if not user:
-            auth_header = request.headers.get('Authorization', '')
-            if auth_header.startswith('Token '):
-                token_key = auth_header.split(' ')[1]
-                try:
-                    token = Token.objects.get(key=token_key)
-                    user = token.user
-                except Token.DoesNotExist:
-                    return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        if not user:
-            return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-        
-        # Check if user is a lecturer
-        try:
-            profile = user.profile
-            if profile.role != 'lecturer':
-                return Response({"error": "Lecturer access required"}, status=status.HTTP_403_FORBIDDEN)
-        except Profile.DoesNotExist:
-            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        user = request.user
         
         # Get lecturer instance
         try:
-            lecturer = Lecturer.objects.get(user=user)
+            lecturer = Lecturer.objects.get(user_id=user.id)
         except Lecturer.DoesNotExist:
             return Response({"error": "Lecturer profile not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        # Get assignments from lecturer's courses
+        # Get assignments from lecturer's courses, with their submission
+        # counts computed in the same grouped query
+        assignments = Assignment.objects.filter(
+            lesson__module__course__lecturer=lecturer,
+            lesson__lesson_type='assignment',
+        ).select_related('lesson__module__course').annotate(
+            submission_count=Count('submissions'),
+            graded_count=Count('submissions', filter=Q(submissions__grade__isnull=False)),
+        ).order_by(
+            'lesson__module__course_id', 'lesson__module__order', 'id'
+        )
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(assignments, request)
+        assignments = list(assignments if page is None else page)
+        avatar_size = requested_avatar_size(request, 64)
+
+        # The latest five submissions of every assignment in one window query
+        recent_submissions = {}
+        for submission in AssignmentSubmission.objects.filter(
+            assignment_id__in=[assignment.id for assignment in assignments]
+        ).annotate(
+            recency=Window(
+                RowNumber(), partition_by=F('assignment_id'),
+                order_by=[F('submitted_at').desc(), F('id').desc()],
+            )
+        ).filter(recency__lte=5).select_related('student__profile').order_by('assignment_id', 'recency'):
+            recent_submissions.setdefault(submission.assignment_id, []).append({
+                'id': submission.id,
+                'student': {
+                    'id': submission.student.id,
+                    'username': submission.student.username,
+                    'first_name': submission.student.first_name,
+                    'last_name': submission.student.last_name,
+                    'avatar': user_avatar(submission.student, avatar_size)
+                },
+                'submitted_at': submission.submitted_at.isoformat() if submission.submitted_at else None,
+                'grade': submission.grade,
+                'feedback': submission.feedback,
+                'is_graded': submission.grade is not None
+            })
+
         assignments_data = []
-        courses = Course.objects.filter(lecturer=lecturer)
-        
-        for course in courses:
-            modules = CourseModule.objects.filter(course=course)
-            for module in modules:
-                lessons = Lesson.objects.filter(module=module, lesson_type='assignment')
-                assignments = Assignment.objects.filter(lesson__in=lessons)
-                
-                for assignment in assignments:
-                    # Get submission details
-                    submissions = AssignmentSubmission.objects.filter(assignment=assignment).select_related('student')
-                    submission_count = submissions.count()
-                    
-                    # Get graded and ungraded counts
-                    graded_count = submissions.filter(grade__isnull=False).count()
-                    ungraded_count = submission_count - graded_count
-                    
-                    submissions_data = []
-                    for submission in submissions[:5]:  # Get recent 5 submissions
-                        submissions_data.append({
-                            'id': submission.id,
-                            'student': {
-                                'id': submission.student.id,
-                                'username': submission.student.username,
-                                'first_name': submission.student.first_name,
-                                'last_name': submission.student.last_name
-                            },
-                            'submitted_at': submission.submitted_at.isoformat() if submission.submitted_at else None,
-                            'grade': submission.grade,
-                            'feedback': submission.feedback,
-                            'is_graded': submission.grade is not None
-                        })
-                    
-                    assignments_data.append({
-                        'id': assignment.id,
-                        'title': assignment.title,
-                        'description': assignment.description,
-                        'due_date': assignment.due_date.isoformat() if assignment.due_date else None,
-                        'max_points': assignment.max_points,
-                        'instructions': assignment.instructions,
-                        'is_published': assignment.is_published,
-                        'course_title': course.title,
-                        'course_id': course.id,
-                        'submission_count': submission_count,
-                        'graded_count': graded_count,
-                        'ungraded_count': ungraded_count,
-                        'recent_submissions': submissions_data,
-                        'created_at': assignment.created_at.isoformat()
-                    })
+        for assignment in assignments:
+            course = assignment.lesson.module.course
+            assignments_data.append({
+                'id': assignment.id,
+                'title': assignment.title,
+                'description': assignment.description,
+                'due_date': assignment.due_date.isoformat() if assignment.due_date else None,
+                'max_points': assignment.max_points,
+                'instructions': assignment.instructions,
+                'is_published': assignment.is_published,
+                'course_title': course.title,
+                'course_id': course.id,
+                'submission_count': assignment.submission_count,
+                'graded_count': assignment.graded_count,
+                'ungraded_count': assignment.submission_count - assignment.graded_count,
+                'recent_submissions': recent_submissions.get(assignment.id, []),
+                'created_at': assignment.created_at.isoformat()
+            })
         
-        return Response({'assignments': assignments_data})
+        return Response(paginator.get_response_data(assignments_data, key='assignments'))
         
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -1937,27 +2144,7 @@ def lecturer_assignments(request):
 def check_plagiarism(request):
     """Check text for plagiarism"""
     try:
-        # Get user from session or token
-        user = None
-        user_id = request.session.get('user_id')
-        
-        if user_id:
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                pass
-        
-        # Fallback to token authentication
-        if not user:
-            auth_header = request.headers.get('Authorization', '')
-            if auth_header.startswith('Token '):
-                token_key = auth_header.split(' ')[1]
-                try:
-                    token = Token.objects.get(key=token_key)
-                    user = token.user
-                except Token.DoesNotExist:
-                    return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
-        
+        user = get_request_user(request)
         if not user:
             return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         
@@ -1988,37 +2175,14 @@ def check_plagiarism(request):
 def check_assignment_plagiarism(request, assignment_id):
     """Check assignment submission for plagiarism"""
     try:
-        # Get user from session or token
-        user = None
-        user_id = request.session.get('user_id')
-        
-        if user_id:
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                pass
-        
-        # Fallback to token authentication
-        if not user:
-            auth_header = request.headers.get('Authorization', '')
-            if auth_header.startswith('Token '):
-                token_key = auth_header.split(' ')[1]
-                try:
-                    token = Token.objects.get(key=token_key)
-                    user = token.user
-                except Token.DoesNotExist:
-                    return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
-        
+        user = get_request_user(request)
         if not user:
             return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         
         # Check if user is lecturer or student
-        try:
-            profile = user.profile
-            if profile.role not in ['lecturer', 'student']:
-                return Response({"error": "Access denied"}, status=status.HTTP_403_FORBIDDEN)
-        except Profile.DoesNotExist:
-            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        role = request_role(request)
+        if role not in ['lecturer', 'student']:
+            return Response({"error": "Access denied"}, status=status.HTTP_403_FORBIDDEN)
         
         # Get assignment
         try:
@@ -2040,7 +2204,7 @@ def check_assignment_plagiarism(request, assignment_id):
             plagiarism_score = report.get("percent", 0)
             
             # Create notification for lecturer if student submitted
-            if profile.role == 'student':
+            if role == 'student':
                 try:
                     lecturer = assignment.lesson.module.course.lecturer
                     if lecturer:
@@ -2071,27 +2235,7 @@ def check_assignment_plagiarism(request, assignment_id):
 def get_plagiarism_status(request, text_id):
     """Get plagiarism check status"""
     try:
-        # Get user from session or token
-        user = None
-        user_id = request.session.get('user_id')
-        
-        if user_id:
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                pass
-        
-        # Fallback to token authentication
-        if not user:
-            auth_header = request.headers.get('Authorization', '')
-            if auth_header.startswith('Token '):
-                token_key = auth_header.split(' ')[1]
-                try:
-                    token = Token.objects.get(key=token_key)
-                    user = token.user
-                except Token.DoesNotExist:
-                    return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
-        
+        user = get_request_user(request)
         if not user:
             return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         
@@ -2116,27 +2260,7 @@ def get_plagiarism_status(request, text_id):
 def get_plagiarism_report(request, text_id):
     """Get plagiarism report"""
     try:
-        # Get user from session or token
-        user = None
-        user_id = request.session.get('user_id')
-        
-        if user_id:
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                pass
-        
-        # Fallback to token authentication
-        if not user:
-            auth_header = request.headers.get('Authorization', '')
-            if auth_header.startswith('Token '):
-                token_key = auth_header.split(' ')[1]
-                try:
-                    token = Token.objects.get(key=token_key)
-                    user = token.user
-                except Token.DoesNotExist:
-                    return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
-        
+        user = get_request_user(request)
         if not user:
             return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         
@@ -2157,28 +2281,10 @@ def get_plagiarism_report(request, text_id):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
+@permission_classes([IsSuperAdmin])
 def admin_recent_activity(request):
     """Get recent activity for admin dashboard"""
     try:
-        # Check if user is admin
-        user_role = None
-        if request.session.get('role') == 'superadmin':
-            user_role = 'superadmin'
-        else:
-            # Fallback to token authentication
-            auth_header = request.headers.get('Authorization', '')
-            if auth_header.startswith('Token '):
-                token_key = auth_header.split(' ')[1]
-                try:
-                    token = Token.objects.get(key=token_key)
-                    if hasattr(token.user, 'profile') and token.user.profile.role == 'superadmin':
-                        user_role = 'superadmin'
-                except Token.DoesNotExist:
-                    pass
-        
-        if user_role != 'superadmin':
-            return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
-        
         from datetime import datetime, timedelta
         from django.utils import timezone
         
@@ -2233,24 +2339,8 @@ def admin_recent_activity(request):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET', 'POST'])
+@permission_classes([IsSuperAdmin])
 def admin_settings(request):
-    if request.session.get('role') == 'superadmin':
-        user_role = 'superadmin'
-    else:
-        # Fallback to token authentication
-        auth_header = request.headers.get('Authorization', '')
-        if auth_header.startswith('Token '):
-            token_key = auth_header.split(' ')[1]
-            try:
-                token = Token.objects.get(key=token_key)
-                if hasattr(token.user, 'profile') and token.user.profile.role == 'superadmin':
-                    user_role = 'superadmin'
-            except Token.DoesNotExist:
-                pass
-    
-    if user_role != 'superadmin':
-        return Response({"error": "Admin access required"}, status=status.HTTP_403_FORBIDDEN)
-    
     if request.method == 'GET':
         # Return default settings (in a real app, these would be stored in database)
         settings = {
@@ -10,11 +10,16 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Running under ``manage.py test``: background threads stay off (see the
+# *_ENABLED settings below) and tests run that work themselves
+TESTING = sys.argv[1:2] == ['test']
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -122,6 +127,24 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files. Lesson files and submissions are not published under
+# MEDIA_URL; they are served by the authorized download views (see
+# accounts.downloads), which can hand the transfer to the web server:
+#   'x-accel'    nginx, with an `internal` location FILE_DOWNLOAD_ACCEL_PREFIX
+#                aliased to MEDIA_ROOT
+#   'x-sendfile' Apache mod_xsendfile or lighttpd
+#   None         Django sends the file itself
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+FILE_DOWNLOAD_OFFLOAD = None
+FILE_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Resumable chunked uploads (see accounts.uploads)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # bytes per PUT; the last chunk may be shorter
+UPLOAD_MAX_SIZE = 2 * 1024 ** 3  # 2 GB
+UPLOAD_SESSION_TTL = 24 * 3600  # unfinished uploads idle this long are swept
+UPLOAD_TEMP_DIR = None  # defaults to MEDIA_ROOT/.uploads; keep it on the same filesystem
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -155,13 +178,124 @@ CORS_EXPOSE_HEADERS = [
 # DRF settings for token authentication
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
+        'accounts.authentication.SessionClaimsAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
 }
 
+# Keyset pagination for list endpoints (see accounts.pagination)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+# Requests without ?page_size= or ?cursor= get the full unpaginated list as
+# before; turn off once every client follows next_cursor.
+API_LEGACY_UNPAGINATED = True
+
+# Bulk enrollment (courses/<id>/enroll/bulk/)
+BULK_ENROLL_MAX_ROWS = 20000
+BULK_ENROLL_CHUNK_SIZE = 500  # rows per transaction and cache update
+
+# Bulk grading (assignments/<id>/grades/, see accounts.grading)
+BULK_GRADE_MAX_ROWS = 5000
+BULK_GRADE_BATCH_SIZE = 500  # rows per UPDATE / INSERT statement
+
+# Course gradebook statistics (see accounts.gradebook)
+GRADEBOOK_PERCENTILES = (10, 25, 75, 90)
+GRADEBOOK_HISTOGRAM_BINS = 10  # equal bins from 0 to 100 % of max points
+
+# In-memory course autocomplete index (see accounts.autocomplete)
+AUTOCOMPLETE_TOP_K = 10
+AUTOCOMPLETE_MAX_COURSES = 200000  # bounds the index's memory
+AUTOCOMPLETE_REFRESH_INTERVAL = 600  # seconds; picks up other processes' changes
+
+# Password hashing pool used by the async login/signup views
+PASSWORD_HASH_WORKERS = 4
+PASSWORD_HASH_MAX_PENDING = 64  # beyond this, answer 503 instead of queueing
+PASSWORD_HASH_PROCESSES = None  # bulk import process pool, None = one per CPU
+
+# Bulk user import (admin/users/bulk/)
+BULK_IMPORT_MAX_ROWS = 10000
+BULK_IMPORT_CHUNK_SIZE = 500  # rows hashed and inserted per transaction
+
+# Cached token claims (see accounts.authentication.TokenCache)
+AUTH_TOKEN_CACHE_MAX_ENTRIES = 10000
+AUTH_TOKEN_CACHE_TTL = 300  # 5 minutes in seconds
+
+# API token expiry with sliding renewal
+AUTH_TOKEN_TTL = 7 * 24 * 3600  # 7 days in seconds
+AUTH_TOKEN_RENEW_AFTER = 3600  # renew at most once an hour per token
+
+# Background purge of expired sessions and tokens (see accounts.sweeper)
+SWEEPER_ENABLED = not TESTING
+SWEEPER_INTERVAL = 300  # seconds between runs
+SWEEPER_BATCH_SIZE = 500
+SWEEPER_MAX_BATCHES = 20  # per table and run
+SWEEPER_BATCH_PAUSE = 0.05  # seconds between batches
+
+# Background recompute of course progress after lesson changes (see accounts.progress)
+PROGRESS_RECOMPUTE_ENABLED = not TESTING
+PROGRESS_RECOMPUTE_INTERVAL = 60  # seconds between runs
+PROGRESS_RECOMPUTE_BATCH_SIZE = 1000  # enrollments updated per statement
+PROGRESS_RECOMPUTE_MAX_COURSES = 100  # per run
+
+# Deduplicated media storage and background collection of unreferenced blobs
+# (see accounts.storage)
+BLOB_GC_ENABLED = not TESTING
+BLOB_GC_INTERVAL = 3600  # seconds between runs
+BLOB_GC_GRACE = 3600  # seconds a blob stays after its last reference goes
+BLOB_GC_BATCH_SIZE = 500  # blobs removed per run
+
+# Profile picture processing (see accounts.avatars)
+AVATAR_SIZES = (32, 64, 256)  # square px, each written as WebP and JPEG
+AVATAR_WORKERS = 2
+AVATAR_MAX_PENDING = 16  # beyond this, answer 503 instead of queueing
+AVATAR_MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+AVATAR_MAX_PIXELS = 40_000_000  # rejected before decoding
+AVATAR_JPEG_QUALITY = 85
+AVATAR_WEBP_QUALITY = 80
+
+# Rendered lesson content (see accounts.rendering)
+LESSON_EXCERPT_LENGTH = 200  # characters returned instead of full bodies
+
+# Background text extraction and screening of submissions (see accounts.ingestion)
+SUBMISSION_INGEST_ENABLED = not TESTING
+SUBMISSION_INGEST_WORKERS = 2  # threads per process
+SUBMISSION_INGEST_POLL_INTERVAL = 5  # seconds idle workers wait for new jobs
+SUBMISSION_INGEST_LEASE = 300  # seconds before a running job is assumed lost
+SUBMISSION_INGEST_MAX_ATTEMPTS = 3
+SUBMISSION_INGEST_RETRY_DELAY = 30  # seconds, doubled on every retry
+SUBMISSION_TEXT_MAX_CHARS = 1_000_000
+SUBMISSION_DOCX_MAX_XML_BYTES = 50 * 1024 ** 2  # uncompressed document.xml; guards against zip bombs
+
+# Cache Configuration
+# Sessions and cached responses use file caches so every worker process on
+# the host sees the same entries; point these aliases at a shared backend
+# when running on more than one host.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'sessions',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # Rendered course/catalog responses and their version tokens
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# Versioned response cache (see accounts.caching)
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_TIMEOUT = 3600  # entries also go stale as soon as a version bumps
+
 # Session Configuration
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_ENGINE = 'accounts.session_backend'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_REFRESH_THRESHOLD = 300  # only re-persist a sliding expiry after 5 minutes
 SESSION_COOKIE_NAME = 'lms_sessionid'
 SESSION_COOKIE_AGE = 3600  # 1 hour in seconds
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False